@@ -1,8 +1,26 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from database import Database
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, send_file
+from database import Database, rango_mes
+from reportes import generar_pdfs_logs, exportar_csv, exportar_ndjson
+from instrumentacion import configurar_slow_query_log
+from modelos import a_json
+from sesiones import AlmacenSesionesMySQL, CacheSesiones, SesionesServidor
+from vencimientos import BarredorVencimientos
+from retencion import ArchivoLogs
+from importacion import ImportacionError, ImportacionEnCurso, importar_miembros
 from config import Config
 from datetime import datetime, timedelta
+from flask.cli import AppGroup
+import click
+import io
+import itertools
+import migraciones
+import retencion
 import os
+import secrets
+import shutil
+import tempfile
+import time
+import zipfile
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -10,6 +28,42 @@ app.config.from_object(Config)
 # Inicializar base de datos
 db = Database()
 
+configurar_slow_query_log(Config.SLOW_QUERY_LOG)
+
+barredor_vencimientos = BarredorVencimientos(db, intervalo=Config.VENCIMIENTO_INTERVALO, lote=Config.VENCIMIENTO_LOTE)
+archivo_logs = ArchivoLogs(Config.LOG_ARCHIVO_DIR)
+
+almacen_sesiones = None
+if Config.SESSION_BACKEND == 'mysql':
+    almacen_sesiones = CacheSesiones(AlmacenSesionesMySQL(db), max_entradas=Config.SESION_CACHE_MAX,
+                                     ttl=Config.SESION_CACHE_TTL)
+    app.session_interface = SesionesServidor(almacen_sesiones, intervalo_purga=Config.SESION_PURGA_INTERVALO)
+
+# Cada petición usa una sola conexión del pool, tomada en la primera consulta.
+# Después de escribir, la sesión lee del primario durante un tiempo para ver
+# sus propios cambios aunque la réplica vaya atrasada.
+@app.before_request
+def reservar_conexion():
+    barredor_vencimientos.start()
+    db.bind_request(request.endpoint, primario_hasta=session.get('leer_primario_hasta'))
+
+@app.after_request
+def recordar_escritura(response):
+    if db.replica is not None and db.escritura_en_peticion():
+        session['leer_primario_hasta'] = time.time() + Config.LECTURA_PRIMARIO_TRAS_ESCRITURA
+    return response
+
+@app.after_request
+def agregar_server_timing(response):
+    valor = db.metricas.server_timing()
+    if valor:
+        response.headers['Server-Timing'] = valor
+    return response
+
+@app.teardown_request
+def liberar_conexion(exc):
+    db.release_request()
+
 # === DECORADOR PARA PROTEGER RUTAS ===
 def login_required(f):
     from functools import wraps
@@ -33,6 +87,38 @@ def role_required(*roles):
         return decorated_function
     return decorator
 
+# === RESPUESTAS JSON ===
+
+def respuesta_json(datos, status=200):
+    """Respuesta JSON codificada con msgspec (acepta modelos, listas y diccionarios)"""
+    return Response(a_json(datos), status=status, mimetype='application/json')
+
+
+def respuesta_fila(tabla, fila_id, cargar):
+    """Responde una fila como JSON con su ETag, o 304 si el cliente ya la tiene.
+    
+    Si el ETag de la fila está en la caché de ETags y coincide con If-None-Match,
+    se responde sin consultar la tabla.
+    """
+    etag = db.etags.get(tabla, fila_id)
+    if etag is not None and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    fila = cargar(fila_id)
+    if not fila:
+        return jsonify({'error': 'No encontrado'}), 404
+    response = respuesta_json(fila)
+    etag = db.etag_fila(tabla, fila)
+    if etag is not None:
+        db.etags.set(tabla, fila_id, etag)
+        response.set_etag(etag)
+        # El navegador guarda la respuesta pero la revalida cada vez
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.make_conditional(request)
+    return response
+
 # === RUTAS DE AUTENTICACIÓN ===
 
 @app.route('/')
@@ -50,21 +136,23 @@ def login():
         user = db.verificar_usuario(username, password)
         
         if user:
-            session['user_id'] = user['id']
-            session['username'] = user['username']
-            session['nombre'] = user['nombre_completo']
-            session['rol'] = user['rol']
+            if almacen_sesiones is not None:
+                session.regenerar()
+            session['user_id'] = user.id
+            session['username'] = user.username
+            session['nombre'] = user.nombre_completo
+            session['rol'] = user.rol
             
             # Registrar login en el log
             db.registrar_log(
-                usuario_id=user['id'],
+                usuario_id=user.id,
                 accion='LOGIN',
                 tabla_afectada='usuarios_sistema',
                 detalles=f"Usuario {username} inició sesión",
                 ip_address=request.remote_addr
             )
             
-            flash(f'Bienvenido {user["nombre_completo"]}!', 'success')
+            flash(f'Bienvenido {user.nombre_completo}!', 'success')
             return redirect(url_for('dashboard'))
         else:
             flash('Usuario o contraseña incorrectos', 'danger')
@@ -92,19 +180,57 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    stats = db.obtener_estadisticas()
-    asistencias_hoy = db.obtener_asistencias_hoy()
-    planes = db.obtener_planes()
-    return render_template('dashboard.html', stats=stats, asistencias=asistencias_hoy, planes=planes)
+    datos = db.en_paralelo(
+        stats=db.obtener_estadisticas,
+        asistencias=db.obtener_asistencias_hoy,
+        planes=db.obtener_planes,
+        por_vencer=db.obtener_membresias_por_vencer
+    )
+    return render_template('dashboard.html', dias_aviso=Config.VENCIMIENTO_AVISO_DIAS, **datos)
 
 # === GESTIÓN DE MIEMBROS ===
 
+ESTADOS_MIEMBRO = ('activo', 'suspendido', 'inactivo')
+
+def filtros_miembros():
+    """Lee los parámetros de paginación y filtrado de la lista de miembros"""
+    cursor = request.args.get('cursor', type=int)
+    limite = request.args.get('limite', Config.MIEMBROS_POR_PAGINA, type=int)
+    limite = max(1, min(limite, Config.MAX_POR_PAGINA))
+    estado = request.args.get('estado')
+    if estado not in ESTADOS_MIEMBRO:
+        estado = None
+    orden = 'asc' if request.args.get('orden') == 'asc' else 'desc'
+    return {'cursor': cursor, 'limite': limite, 'estado': estado, 'orden': orden}
+
 @app.route('/miembros')
 @login_required
 def miembros():
-    miembros = db.obtener_miembros()
+    filtros = filtros_miembros()
+    pagina = db.obtener_miembros_pagina(**filtros)
     planes = db.obtener_planes()
-    return render_template('miembros.html', miembros=miembros, planes=planes)
+    return render_template('miembros.html', miembros=pagina['miembros'], siguiente=pagina['siguiente'],
+                           filtros=filtros, planes=planes)
+
+@app.route('/api/miembros')
+@login_required
+def api_miembros():
+    filtros = filtros_miembros()
+    pagina = db.obtener_miembros_pagina(**filtros)
+    return respuesta_json({
+        'miembros': pagina['miembros'],
+        'siguiente': pagina['siguiente'],
+        'limite': filtros['limite']
+    })
+
+@app.route('/api/miembros/buscar')
+@login_required
+def api_buscar_miembros():
+    q = request.args.get('q', '').strip()
+    limite = max(1, min(request.args.get('limite', 10, type=int), 50))
+    if not q:
+        return respuesta_json([])
+    return respuesta_json(db.buscar_miembros(q, limite))
 
 @app.route('/miembros/crear', methods=['POST'])
 @login_required
@@ -134,6 +260,29 @@ def crear_miembro():
     
     return redirect(url_for('miembros'))
 
+@app.route('/api/miembros/importar', methods=['POST'])
+@login_required
+@role_required('administrador', 'encargado')
+def api_importar_miembros():
+    # Archivo de formulario (multipart) o el CSV directamente como cuerpo de la petición
+    if 'archivo' in request.files:
+        archivo = request.files['archivo'].stream
+    elif request.mimetype in ('text/csv', 'application/octet-stream'):
+        archivo = io.BufferedReader(request.stream)
+    else:
+        return jsonify({'error': 'Se esperaba un archivo CSV ("archivo" o cuerpo text/csv)'}), 400
+    solo_validar = request.values.get('solo_validar') in ('1', 'true', 'on')
+    try:
+        resumen = importar_miembros(db, archivo, usuario_id=session['user_id'], ip_address=request.remote_addr,
+                                    lote=Config.IMPORTACION_LOTE, max_errores=Config.IMPORTACION_MAX_ERRORES,
+                                    solo_validar=solo_validar)
+    except ImportacionEnCurso as e:
+        return jsonify({'error': str(e)}), 409
+    except (ImportacionError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e) if isinstance(e, ImportacionError) else 'El archivo no está en UTF-8'}), 400
+    resumen['solo_validar'] = solo_validar
+    return jsonify(resumen)
+
 @app.route('/miembros/editar/<int:id>', methods=['POST'])
 @login_required
 @role_required('administrador', 'encargado')
@@ -177,7 +326,7 @@ def eliminar_miembro(id):
                 accion='DELETE',
                 tabla_afectada='miembros',
                 registro_id=id,
-                detalles=f"Eliminado miembro: {miembro['nombre']} {miembro['apellido']}",
+                detalles=f"Eliminado miembro: {miembro.nombre} {miembro.apellido}",
                 ip_address=request.remote_addr
             )
             flash('Miembro eliminado exitosamente', 'success')
@@ -197,8 +346,7 @@ def asignar_membresia():
     monto_pagado = request.form.get('monto_pagado')
     
     # Obtener información del plan
-    planes = db.obtener_planes()
-    plan = next((p for p in planes if p['id'] == int(plan_id)), None)
+    plan = db.obtener_plan(plan_id)
     
     if plan:
         fecha_inicio = datetime.now()
@@ -233,8 +381,7 @@ def asignar_membresia():
 @login_required
 def asistencias():
     asistencias = db.obtener_asistencias(200)
-    miembros = db.obtener_miembros()
-    return render_template('asistencias.html', asistencias=asistencias, miembros=miembros)
+    return render_template('asistencias.html', asistencias=asistencias)
 
 @app.route('/asistencias/registrar', methods=['POST'])
 @login_required
@@ -252,7 +399,7 @@ def registrar_asistencia():
             accion='CREATE',
             tabla_afectada='asistencias',
             registro_id=asistencia_id,
-            detalles=f"Registrada {tipo} de {miembro['nombre']} {miembro['apellido']}",
+            detalles=f"Registrada {tipo} de {miembro.nombre} {miembro.apellido}",
             ip_address=request.remote_addr
         )
         flash(f'{tipo.capitalize()} registrada exitosamente', 'success')
@@ -261,6 +408,87 @@ def registrar_asistencia():
     
     return redirect(url_for('asistencias'))
 
+@app.route('/api/asistencias/batch', methods=['POST'])
+@login_required
+@role_required('administrador', 'encargado')
+def api_registrar_asistencias_lote():
+    datos = request.get_json(silent=True) or {}
+    eventos = datos.get('eventos')
+    if not isinstance(eventos, list) or not eventos:
+        return jsonify({'error': 'Se esperaba una lista "eventos" no vacía'}), 400
+    if len(eventos) > Config.CHECKIN_LOTE_MAX:
+        return jsonify({'error': f'Máximo {Config.CHECKIN_LOTE_MAX} eventos por lote'}), 413
+    
+    ahora = datetime.now()
+    minimo = ahora - timedelta(hours=Config.CHECKIN_MAX_ANTIGUEDAD_HORAS)
+    maximo = ahora + timedelta(minutes=5)
+    resultados = [None] * len(eventos)
+    candidatos = []
+    
+    # Validación de formato de cada evento
+    for i, evento in enumerate(eventos):
+        if not isinstance(evento, dict):
+            resultados[i] = {'indice': i, 'ok': False, 'error': 'Evento inválido'}
+            continue
+        try:
+            miembro_id = int(evento.get('miembro_id'))
+        except (TypeError, ValueError):
+            resultados[i] = {'indice': i, 'ok': False, 'error': 'miembro_id inválido'}
+            continue
+        tipo = evento.get('tipo', 'entrada')
+        if tipo not in ('entrada', 'salida'):
+            resultados[i] = {'indice': i, 'ok': False, 'error': 'tipo debe ser entrada o salida'}
+            continue
+        fecha_hora = ahora
+        if evento.get('fecha_hora'):
+            try:
+                fecha_hora = datetime.fromisoformat(evento['fecha_hora'])
+            except (TypeError, ValueError):
+                resultados[i] = {'indice': i, 'ok': False, 'error': 'fecha_hora inválida'}
+                continue
+            if fecha_hora.tzinfo is not None:
+                fecha_hora = fecha_hora.astimezone().replace(tzinfo=None)
+            if not minimo <= fecha_hora <= maximo:
+                resultados[i] = {'indice': i, 'ok': False, 'error': 'fecha_hora fuera del rango permitido'}
+                continue
+        candidatos.append((i, (miembro_id, tipo, fecha_hora)))
+    
+    # Validación de todos los miembros del lote con una sola consulta
+    activos = db.filtrar_miembros_activos([evento[0] for _, evento in candidatos])
+    if activos is None:
+        return jsonify({'error': 'Error al validar los miembros'}), 500
+    validos = []
+    for i, evento in candidatos:
+        if evento[0] in activos:
+            validos.append((i, evento))
+        else:
+            resultados[i] = {'indice': i, 'ok': False, 'error': 'Miembro inexistente o no activo'}
+    
+    # Inserción de todos los eventos válidos en una sola transacción
+    if validos:
+        ids = db.registrar_asistencias_lote([evento for _, evento in validos])
+        for posicion, (i, _) in enumerate(validos):
+            if ids is None:
+                resultados[i] = {'indice': i, 'ok': False, 'error': 'Error al registrar asistencia'}
+            else:
+                resultados[i] = {'indice': i, 'ok': True, 'asistencia_id': ids[posicion]}
+        if ids:
+            db.registrar_log(
+                usuario_id=session['user_id'],
+                accion='CREATE',
+                tabla_afectada='asistencias',
+                registro_id=ids[0],
+                detalles=f"Registro por lotes: {len(ids)} asistencias (ids {ids[0]}-{ids[-1]})",
+                ip_address=request.remote_addr
+            )
+    
+    registrados = sum(1 for r in resultados if r['ok'])
+    return jsonify({
+        'registrados': registrados,
+        'rechazados': len(resultados) - registrados,
+        'resultados': resultados
+    }), 200 if registrados or not validos else 500
+
 # === GESTIÓN DE USUARIOS ===
 
 @app.route('/usuarios')
@@ -306,9 +534,14 @@ def editar_usuario(id):
     email = request.form.get('email')
     activo = request.form.get('activo') == '1'
     
+    anterior = db.obtener_usuario(id)
     resultado = db.actualizar_usuario(id, nombre_completo, rol, email, activo)
     
     if resultado is not None:
+        if almacen_sesiones is not None and (not activo or anterior is None or anterior.rol != rol):
+            # Un usuario desactivado o con otro rol pierde sus sesiones abiertas
+            # de inmediato, en todos los workers
+            almacen_sesiones.revocar_usuario(id)
         db.registrar_log(
             usuario_id=session['user_id'],
             accion='UPDATE',
@@ -338,12 +571,14 @@ def eliminar_usuario(id):
         resultado = db.eliminar_usuario(id)
         
         if resultado is not None:
+            if almacen_sesiones is not None:
+                almacen_sesiones.revocar_usuario(id)
             db.registrar_log(
                 usuario_id=session['user_id'],
                 accion='DELETE',
                 tabla_afectada='usuarios_sistema',
                 registro_id=id,
-                detalles=f"Eliminado usuario: {usuario['username']}",
+                detalles=f"Eliminado usuario: {usuario.username}",
                 ip_address=request.remote_addr
             )
             flash('Usuario eliminado exitosamente', 'success')
@@ -356,31 +591,122 @@ def eliminar_usuario(id):
 @login_required
 @role_required('administrador')
 def api_obtener_usuario(id):
-    usuario = db.obtener_usuario(id)
-    return jsonify(usuario) if usuario else jsonify({'error': 'No encontrado'}), 404
+    return respuesta_fila('usuarios_sistema', id, db.obtener_usuario)
 
 # === LOG DE ACTIVIDADES ===
 
+ACCIONES_LOG = ('CREATE', 'UPDATE', 'DELETE', 'LOGIN', 'LOGOUT', 'EXPORT')
+
+TABLAS_LOG = ('miembros', 'membresias', 'asistencias', 'clases', 'inscripciones_clases', 'pagos',
+              'planes', 'usuarios_sistema', 'log_actividades')
+
+def cursor_logs(siguiente):
+    """Codifica el cursor (fecha_hora, id) de la siguiente página como texto para la URL"""
+    return f"{siguiente[0].isoformat()}_{siguiente[1]}" if siguiente else None
+
+def filtros_logs():
+    """Lee los filtros y la paginación del log; los valores inválidos se ignoran"""
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            fecha, log_id = request.args['cursor'].rsplit('_', 1)
+            cursor = (datetime.fromisoformat(fecha), int(log_id))
+        except ValueError:
+            cursor = None
+    limite = request.args.get('limite', Config.LOGS_POR_PAGINA, type=int)
+    limite = max(1, min(limite, Config.MAX_POR_PAGINA))
+    accion = request.args.get('accion')
+    tabla = request.args.get('tabla_afectada')
+    fechas = {}
+    for campo in ('desde', 'hasta'):
+        try:
+            fechas[campo] = datetime.strptime(request.args.get(campo, ''), '%Y-%m-%d').date()
+        except ValueError:
+            fechas[campo] = None
+    # "hasta" incluye el día completo
+    hasta = fechas['hasta'] + timedelta(days=1) if fechas['hasta'] else None
+    return {
+        'cursor': cursor,
+        'limite': limite,
+        'usuario_id': request.args.get('usuario_id', type=int),
+        'accion': accion if accion in ACCIONES_LOG else None,
+        'tabla_afectada': tabla if tabla in TABLAS_LOG else None,
+        'registro_id': request.args.get('registro_id', type=int),
+        'desde': fechas['desde'],
+        'hasta': hasta,
+    }
+
 @app.route('/logs')
 @login_required
 @role_required('administrador', 'encargado')
 def logs():
-    logs = db.obtener_logs(500)
-    return render_template('logs.html', logs=logs)
+    filtros = filtros_logs()
+    pagina = db.obtener_logs_pagina(**filtros)
+    usuarios = sorted(db.obtener_mapa_usuarios().values(), key=lambda u: u['username'])
+    # Los filtros de la URL tal como se recibieron, para los enlaces de paginación
+    parametros = {k: v for k, v in request.args.items() if k != 'cursor' and v}
+    return render_template('logs.html', logs=pagina['logs'], siguiente=cursor_logs(pagina['siguiente']),
+                           filtros=filtros, parametros=parametros, usuarios=usuarios,
+                           acciones=ACCIONES_LOG, tablas=TABLAS_LOG)
+
+@app.route('/api/logs')
+@login_required
+@role_required('administrador', 'encargado')
+def api_logs():
+    filtros = filtros_logs()
+    pagina = db.obtener_logs_pagina(**filtros)
+    return respuesta_json({
+        'logs': pagina['logs'],
+        'siguiente': cursor_logs(pagina['siguiente']),
+        'limite': filtros['limite']
+    })
 
 # === API ENDPOINTS (para peticiones AJAX) ===
 
 @app.route('/api/miembro/<int:id>')
 @login_required
 def api_obtener_miembro(id):
-    miembro = db.obtener_miembro(id)
-    return jsonify(miembro) if miembro else jsonify({'error': 'No encontrado'}), 404
+    return respuesta_fila('miembros', id, db.obtener_miembro)
+
+@app.route('/api/membresias/por-vencer')
+@login_required
+def api_membresias_por_vencer():
+    dias = request.args.get('dias', type=int)
+    return respuesta_json(db.obtener_membresias_por_vencer(dias))
 
 @app.route('/api/estadisticas')
 @login_required
 def api_estadisticas():
     stats = db.obtener_estadisticas()
-    return jsonify(stats)
+    # La edad cambia en cada llamada; el cliente la calcula con generado_en
+    # (en UTC, con zona horaria) para que el cuerpo (y su ETag) solo cambie
+    # con el snapshot
+    stats.pop('edad_segundos', None)
+    response = respuesta_json(stats)
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/sistema/pool')
+@login_required
+@role_required('administrador')
+def api_estado_pool():
+    estado = db.pool.stats()
+    if db.replica is not None:
+        estado['replica'] = db.replica.stats()
+    return jsonify(estado)
+
+@app.route('/api/sistema/consultas')
+@login_required
+@role_required('administrador')
+def api_metricas_consultas():
+    return jsonify(db.metricas.resumen())
+
+@app.route('/api/sistema/vencimientos')
+@login_required
+@role_required('administrador')
+def api_barrido_vencimientos():
+    return jsonify(barredor_vencimientos.stats())
 
 # === MANEJO DE ERRORES ===
 
@@ -398,8 +724,7 @@ def internal_server_error(e):
 @login_required
 def clases():
     clases = db.obtener_clases()
-    miembros = db.obtener_miembros()
-    return render_template('clases.html', clases=clases, miembros=miembros)
+    return render_template('clases.html', clases=clases)
 
 @app.route('/clases/crear', methods=['POST'])
 @login_required
@@ -466,41 +791,88 @@ def inscribir_clase():
     miembro_id = request.form.get('miembro_id')
     clase_id = request.form.get('clase_id')
     
-    inscripcion_id = db.inscribir_miembro_clase(miembro_id, clase_id)
+    inscripcion_id, estado = db.inscribir_miembro_clase(miembro_id, clase_id)
     
-    if inscripcion_id:
+    if estado == 'ya_inscrito':
+        flash('El miembro ya está inscrito o en lista de espera para esta clase', 'info')
+    elif inscripcion_id:
+        en_espera = estado == 'espera'
         db.registrar_log(
             usuario_id=session['user_id'],
             accion='CREATE',
             tabla_afectada='inscripciones_clases',
             registro_id=inscripcion_id,
-            detalles=f"Inscrito miembro ID {miembro_id} a clase ID {clase_id}",
+            detalles=f"{'En lista de espera' if en_espera else 'Inscrito'} miembro ID {miembro_id} a clase ID {clase_id}",
             ip_address=request.remote_addr
         )
-        flash('Miembro inscrito a la clase exitosamente', 'success')
+        if en_espera:
+            flash('La clase está llena: el miembro quedó en lista de espera', 'warning')
+        else:
+            flash('Miembro inscrito a la clase exitosamente', 'success')
     else:
         flash('Error al inscribir a la clase', 'danger')
     
     return redirect(url_for('clases'))
 
+@app.route('/clases/inscripciones/cancelar/<int:id>', methods=['POST'])
+@login_required
+@role_required('administrador', 'encargado')
+def cancelar_inscripcion(id):
+    resultado = db.cancelar_inscripcion(id)
+    
+    if resultado is not None:
+        clase_id, promovidas = resultado
+        db.registrar_log(
+            usuario_id=session['user_id'],
+            accion='DELETE',
+            tabla_afectada='inscripciones_clases',
+            registro_id=id,
+            detalles=f"Cancelada inscripción ID {id} de clase ID {clase_id}",
+            ip_address=request.remote_addr
+        )
+        for promovida in promovidas:
+            db.registrar_log(
+                usuario_id=session['user_id'],
+                accion='UPDATE',
+                tabla_afectada='inscripciones_clases',
+                registro_id=promovida['id'],
+                detalles=f"Promovido de lista de espera miembro ID {promovida['miembro_id']} a clase ID {clase_id}",
+                ip_address=request.remote_addr
+            )
+        mensaje = 'Inscripción cancelada'
+        if promovidas:
+            mensaje += f"; {len(promovidas)} miembro(s) de la lista de espera tomaron el lugar"
+        flash(mensaje, 'success')
+    else:
+        flash('Error al cancelar la inscripción', 'danger')
+    
+    return redirect(url_for('clases'))
+
 @app.route('/api/clase/<int:id>')
 @login_required
 def api_obtener_clase(id):
-    query = "SELECT * FROM clases WHERE id = %s"
-    result = db.execute_query(query, (id,))
-    clase = result[0] if result else None
-    return jsonify(clase) if clase else jsonify({'error': 'No encontrado'}), 404
+    return respuesta_fila('clases', id, db.obtener_clase)
+
+@app.route('/api/clase/<int:id>/inscripciones')
+@login_required
+def api_inscripciones_clase(id):
+    inscripciones = db.obtener_inscripciones_clase(id)
+    if inscripciones is None:
+        return respuesta_json({'error': 'No se pudieron obtener las inscripciones'}, 500)
+    return respuesta_json(inscripciones)
 
 # === GESTIÓN DE PAGOS ===
 
 @app.route('/pagos')
 @login_required
 def pagos():
-    pagos = db.obtener_pagos(200)
-    miembros = db.obtener_miembros()
-    ingresos = db.obtener_ingresos_totales()
-    planes = db.obtener_planes()
-    return render_template('pagos.html', pagos=pagos, miembros=miembros, ingresos=ingresos, planes=planes)
+    datos = db.en_paralelo(
+        pagos=(db.obtener_pagos, 200),
+        ingresos=db.obtener_ingresos_totales,
+        planes=db.obtener_planes
+    )
+    # Cada formulario lleva su propia clave: reenviarlo no registra el pago dos veces
+    return render_template('pagos.html', clave_pago=secrets.token_urlsafe(24), **datos)
 
 @app.route('/pagos/registrar', methods=['POST'])
 @login_required
@@ -512,22 +884,30 @@ def registrar_pago():
     metodo_pago = request.form.get('metodo_pago')
     referencia = request.form.get('referencia')
     notas = request.form.get('notas')
+    clave = request.form.get('clave_idempotencia') or request.headers.get('Idempotency-Key') or None
+    
+    if clave is not None and len(clave) > 64:
+        flash('Clave de idempotencia inválida', 'danger')
+        return redirect(url_for('pagos'))
     
     # Verificar si existe un pago duplicado
-    if db.verificar_pago_duplicado(miembro_id, concepto, float(monto)):
-        flash('⚠️ ADVERTENCIA: Ya existe un pago similar registrado en las últimas 24 horas. Verifica antes de continuar.', 'warning')
+    if db.verificar_pago_duplicado(miembro_id, concepto, float(monto), clave):
+        flash(f'⚠️ ADVERTENCIA: Ya existe un pago similar registrado en las últimas {Config.PAGO_DUPLICADO_HORAS} horas. Verifica antes de continuar.', 'warning')
         return redirect(url_for('pagos'))
     
-    pago_id = db.registrar_pago(miembro_id, concepto, monto, metodo_pago, session['user_id'], referencia, notas)
+    pago_id, nuevo = db.registrar_pago(miembro_id, concepto, monto, metodo_pago, session['user_id'], referencia, notas,
+                                       clave_idempotencia=clave)
     
-    if pago_id:
+    if pago_id and not nuevo:
+        flash('Este pago ya se había registrado', 'info')
+    elif pago_id:
         miembro = db.obtener_miembro(miembro_id)
         db.registrar_log(
             usuario_id=session['user_id'],
             accion='CREATE',
             tabla_afectada='pagos',
             registro_id=pago_id,
-            detalles=f"Registrado pago de ${monto} - {concepto} de {miembro['nombre']} {miembro['apellido']}",
+            detalles=f"Registrado pago de ${monto} - {concepto} de {miembro.nombre} {miembro.apellido}",
             ip_address=request.remote_addr
         )
         flash('Pago registrado exitosamente', 'success')
@@ -578,7 +958,7 @@ def eliminar_pago(id):
                 accion='DELETE',
                 tabla_afectada='pagos',
                 registro_id=id,
-                detalles=f"Eliminado pago: {pago['concepto']} - ${pago['monto']}",
+                detalles=f"Eliminado pago: {pago.concepto} - ${pago.monto}",
                 ip_address=request.remote_addr
             )
             flash('Pago eliminado exitosamente', 'success')
@@ -591,95 +971,263 @@ def eliminar_pago(id):
 @login_required
 @role_required('administrador', 'encargado')
 def api_obtener_pago(id):
-    pago = db.obtener_pago(id)
-    return jsonify(pago) if pago else jsonify({'error': 'No encontrado'}), 404
+    return respuesta_fila('pagos', id, db.obtener_pago)
 
 # === DESCARGAR LOGS EN PDF ===
 
+def rango_fechas_peticion():
+    """Lee 'desde' y 'hasta' (YYYY-MM-DD, ambos inclusive) de la petición.
+    
+    Devuelve el rango semiabierto [desde, hasta + 1 día); por defecto el mes actual.
+    Devuelve None si alguna fecha es inválida.
+    """
+    inicio, fin = rango_mes()
+    try:
+        if request.args.get('desde'):
+            inicio = datetime.strptime(request.args['desde'], '%Y-%m-%d').date()
+        if request.args.get('hasta'):
+            fin = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() + timedelta(days=1)
+    except ValueError:
+        return None
+    if fin <= inicio:
+        return None
+    return inicio, fin
+
 @app.route('/logs/descargar-pdf')
 @login_required
 @role_required('administrador')
 def descargar_logs_pdf():
-    from reportlab.lib.pagesizes import letter, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.units import inch
-    from io import BytesIO
-    from flask import make_response
-    
-    # Obtener logs
-    logs = db.obtener_logs(500)
-    
-    # Crear PDF en memoria
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-    elements = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title = Paragraph("<b>Registro de Actividades del Sistema - FitGym Pro</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Información
-    info = Paragraph(f"Generado el: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}<br/>Usuario: {session['nombre']}", styles['Normal'])
-    elements.append(info)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Datos de la tabla
-    data = [['ID', 'Fecha/Hora', 'Usuario', 'Acción', 'Tabla', 'Detalles', 'IP']]
-    
-    for log in logs:
-        data.append([
-            str(log['id']),
-            log['fecha_hora'].strftime('%d/%m/%Y %H:%M'),
-            log['username'],
-            log['accion'],
-            log['tabla_afectada'],
-            (log['detalles'][:40] + '...') if log['detalles'] and len(log['detalles']) > 40 else (log['detalles'] or '-'),
-            log['ip_address'] or '-'
-        ])
-    
-    # Crear tabla
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    elements.append(table)
-    
-    # Construir PDF
-    doc.build(elements)
-    
-    # Preparar respuesta
-    buffer.seek(0)
-    response = make_response(buffer.read())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=logs_fitgym_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
+    rango = rango_fechas_peticion()
+    if rango is None:
+        flash('Rango de fechas inválido', 'danger')
+        return redirect(url_for('logs'))
+    desde, hasta = rango
+    usuario_id = request.args.get('usuario_id', type=int)
+    accion = request.args.get('accion') or None
+    
+    filtros_texto = f"Del {desde.strftime('%d/%m/%Y')} al {(hasta - timedelta(days=1)).strftime('%d/%m/%Y')}"
+    if usuario_id:
+        filtros_texto += f" - Usuario ID {usuario_id}"
+    if accion:
+        filtros_texto += f" - Acción {accion}"
+    
+    # reportlab guarda en memoria cada página hasta cerrar el PDF, así que cada
+    # archivo lleva a lo sumo LOGS_PDF_MAX_FILAS filas; si hacen falta más
+    # partes se entregan juntas en un zip
+    partes = []
+    
+    def nueva_parte():
+        partes.append(tempfile.TemporaryFile())
+        return partes[-1]
+    
+    nombre = f'logs_fitgym_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    try:
+        # Los meses archivados son anteriores a todo lo que sigue en la base
+        bloques = itertools.chain(
+            archivo_logs.buscar(desde, hasta, usuario_id, accion),
+            db.iterar_logs(desde, hasta, usuario_id, accion, chunk_size=Config.EXPORT_CHUNK_SIZE)
+        )
+        filas = generar_pdfs_logs(bloques, nueva_parte, filtros_texto, session['nombre'],
+                                  Config.LOGS_PDF_MAX_FILAS)
+        if len(partes) == 1:
+            archivo = partes.pop()
+            mimetype, descarga = 'application/pdf', f'{nombre}.pdf'
+        else:
+            archivo = tempfile.TemporaryFile()
+            try:
+                with zipfile.ZipFile(archivo, 'w') as zip_partes:
+                    for i, parte in enumerate(partes, 1):
+                        parte.seek(0)
+                        with zip_partes.open(f'{nombre}_parte{i}.pdf', 'w') as destino:
+                            shutil.copyfileobj(parte, destino)
+            except Exception:
+                archivo.close()
+                raise
+            mimetype, descarga = 'application/zip', f'{nombre}.zip'
+    finally:
+        for parte in partes:
+            parte.close()
+    archivo.seek(0)
+    total = sum(filas)
     
     # Registrar descarga en log
     db.registrar_log(
         usuario_id=session['user_id'],
         accion='EXPORT',
         tabla_afectada='log_actividades',
-        detalles='Exportación de logs a PDF',
+        detalles=f'Exportación de logs a PDF: {total} registros en {len(filas)} archivo(s) ({filtros_texto})',
+        ip_address=request.remote_addr
+    )
+    
+    return send_file(archivo, mimetype=mimetype, as_attachment=True, download_name=descarga)
+
+# === EXPORTACIONES CSV / NDJSON ===
+
+FORMATOS_EXPORTACION = {
+    'csv': (exportar_csv, 'text/csv', 'csv'),
+    'ndjson': (exportar_ndjson, 'application/x-ndjson', 'ndjson'),
+}
+
+@app.route('/export/<tabla>')
+@login_required
+@role_required('administrador', 'encargado')
+def exportar(tabla):
+    iteradores = {
+        'pagos': db.iterar_pagos,
+        'asistencias': db.iterar_asistencias,
+        'miembros': db.iterar_miembros,
+    }
+    if tabla not in iteradores:
+        return jsonify({'error': 'No encontrado'}), 404
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({'error': 'Formato no soportado, use csv o ndjson'}), 400
+    rango = rango_fechas_peticion()
+    if rango is None:
+        return jsonify({'error': 'Rango de fechas inválido'}), 400
+    desde, hasta = rango
+    
+    db.registrar_log(
+        usuario_id=session['user_id'],
+        accion='EXPORT',
+        tabla_afectada=tabla,
+        detalles=f"Exportación de {tabla} a {formato.upper()} del {desde} al {hasta - timedelta(days=1)}",
         ip_address=request.remote_addr
     )
     
+    # El generador lee con un cursor sin búfer y su propia conexión del pool,
+    # así que la respuesta empieza a salir antes de terminar la consulta
+    generar, mimetype, extension = FORMATOS_EXPORTACION[formato]
+    bloques = iteradores[tabla](desde, hasta, chunk_size=Config.EXPORT_CHUNK_SIZE)
+    response = Response(generar(bloques, Database.COLUMNAS_EXPORTACION[tabla]), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename={tabla}_{desde:%Y%m%d}_{hasta - timedelta(days=1):%Y%m%d}.{extension}'
+    )
+    response.headers['X-Accel-Buffering'] = 'no'
     return response
 
+# === COMANDOS DE LÍNEA DE COMANDOS ===
+
+db_cli = AppGroup('db', help='Administración del esquema de la base de datos')
+
+@db_cli.command('migrar')
+@click.option('--hasta', type=int, default=None, help='Aplicar solo hasta esta versión')
+def cli_migrar(hasta):
+    """Crea o actualiza el esquema aplicando las migraciones pendientes"""
+    migraciones.migrar(db, hasta=hasta, salida=click.echo)
+
+@db_cli.command('estado')
+def cli_estado_migraciones():
+    """Muestra qué migraciones están aplicadas"""
+    for version, descripcion, aplicada in migraciones.estado(db):
+        marca = 'x' if aplicada else ' '
+        click.echo(f"[{marca}] {version:>3}  {descripcion}")
+
+@db_cli.command('purgar-sesiones')
+def cli_purgar_sesiones():
+    """Elimina las sesiones expiradas"""
+    if almacen_sesiones is None:
+        click.echo("Las sesiones no se guardan en la base de datos (SESSION_BACKEND)")
+        return
+    click.echo(f"{almacen_sesiones.purgar_expiradas()} sesiones expiradas eliminadas")
+
+@db_cli.command('vencer-membresias')
+@click.option('--lote', type=int, default=Config.VENCIMIENTO_LOTE, show_default=True, help='Membresías por transacción')
+def cli_vencer_membresias(lote):
+    """Marca como vencidas las membresías activas cuyo fecha_fin ya pasó"""
+    barredor_vencimientos.lote = lote
+    vencidas = barredor_vencimientos.ejecutar()
+    if vencidas is None:
+        click.echo("No se hizo el barrido: otro proceso lo está haciendo o hubo un error")
+        raise SystemExit(1)
+    click.echo(f"{vencidas} membresías vencidas")
+    por_vencer = db.obtener_membresias_por_vencer()
+    click.echo(f"{len(por_vencer)} membresías vencen en los próximos {Config.VENCIMIENTO_AVISO_DIAS} días")
+
+@db_cli.command('importar-miembros')
+@click.argument('archivo', type=click.File('rb'))
+@click.option('--usuario', required=True, help='Usuario del sistema al que se atribuye la importación en el log')
+@click.option('--lote', type=int, default=Config.IMPORTACION_LOTE, show_default=True, help='Miembros por transacción')
+@click.option('--solo-validar', is_flag=True, help='Validar el archivo sin insertar nada')
+def cli_importar_miembros(archivo, usuario, lote, solo_validar):
+    """Importa miembros desde un CSV (columnas nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion)"""
+    usuario_id = next((u['id'] for u in db.obtener_mapa_usuarios().values() if u['username'] == usuario), None)
+    if usuario_id is None:
+        click.echo(f"No existe el usuario {usuario}")
+        raise SystemExit(2)
+    inicio = time.perf_counter()
+    try:
+        resumen = importar_miembros(db, archivo, usuario_id=usuario_id, lote=lote, max_errores=None,
+                                    solo_validar=solo_validar)
+    except (ImportacionError, UnicodeDecodeError) as e:
+        click.echo(f"No se pudo importar: {e}")
+        raise SystemExit(2)
+    for error in resumen['errores']:
+        click.echo(f"Línea {error['linea']}: {error['error']}")
+    verbo = 'válidos' if solo_validar else 'importados'
+    click.echo(f"{resumen['filas']} filas leídas, {resumen['importados']} miembros {verbo}, "
+               f"{resumen['rechazados']} rechazadas en {time.perf_counter() - inicio:.2f}s")
+    if resumen['rechazados']:
+        raise SystemExit(1)
+
+@db_cli.command('retener-logs')
+@click.option('--meses', type=int, default=Config.LOG_RETENCION_MESES, show_default=True,
+              help='Meses del log de actividades que se conservan en la base')
+def cli_retener_logs(meses):
+    """Crea las particiones futuras del log y archiva en disco los meses fuera de la retención"""
+    archivados = retencion.retener_logs(db, Config.LOG_ARCHIVO_DIR, retencion_meses=meses,
+                                        meses_adelante=Config.LOG_PARTICIONES_ADELANTE, salida=click.echo)
+    estado = archivo_logs.stats()
+    click.echo(f"{len(archivados)} meses archivados; el archivo tiene {estado['meses']} meses y {estado['filas']} filas")
+
+@db_cli.command('buscar-logs-archivados')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Primer día (AAAA-MM-DD)')
+@click.option('--hasta', type=click.DateTime(formats=['%Y-%m-%d']), required=True, help='Último día (AAAA-MM-DD)')
+@click.option('--usuario-id', type=int, default=None, help='Solo las acciones de este usuario')
+@click.option('--accion', default=None, help='Solo esta acción (CREATE, LOGIN, ...)')
+def cli_buscar_logs_archivados(desde, hasta, usuario_id, accion):
+    """Escribe en NDJSON las entradas archivadas del log que cumplen los filtros"""
+    columnas = ['id', 'fecha_hora', 'usuario_id', 'username', 'accion', 'tabla_afectada',
+                'registro_id', 'detalles', 'ip_address']
+    bloques = archivo_logs.buscar(desde, hasta + timedelta(days=1), usuario_id, accion)
+    for lineas in exportar_ndjson(bloques, columnas):
+        click.echo(lineas.decode('utf-8'), nl=False)
+
+@db_cli.command('reconciliar-ingresos')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Primer día a revisar (AAAA-MM-DD)')
+@click.option('--hasta', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help='Último día a revisar (AAAA-MM-DD)')
+@click.option('--solo-revisar', is_flag=True, help='Informar las diferencias sin reconstruir el acumulado')
+def cli_reconciliar_ingresos(desde, hasta, solo_revisar):
+    """Compara el acumulado diario de ingresos con los pagos y lo reconstruye si difiere"""
+    resultado = db.reconciliar_ingresos(
+        desde=desde.date() if desde else None,
+        hasta=hasta.date() if hasta else None,
+        reconstruir=not solo_revisar
+    )
+    if resultado is None:
+        click.echo("No se pudo leer el acumulado o los pagos")
+        raise SystemExit(2)
+    for d in resultado['diferencias']:
+        click.echo(f"{d['dia']} {d['metodo_pago']} {d['concepto']!r}: "
+                   f"esperado {d['total_esperado']} ({d['pagos_esperados']} pagos), "
+                   f"guardado {d['total_guardado']} ({d['pagos_guardados']} pagos)")
+    click.echo(f"{resultado['grupos']} grupos revisados, {len(resultado['diferencias'])} con diferencias")
+    if resultado['reconstruido']:
+        click.echo("Acumulado reconstruido")
+    elif resultado['diferencias']:
+        raise SystemExit(1)
+
+@db_cli.command('revisar')
+def cli_revisar_consultas():
+    """Ejecuta EXPLAIN sobre las consultas de Database y señala recorridos completos"""
+    hallazgos = migraciones.revisar_consultas(db)
+    for metodo, tabla, tipo, filas, extra in hallazgos:
+        click.echo(f"{metodo}: tabla={tabla} tipo={tipo} filas={filas} {extra}")
+    if hallazgos:
+        raise SystemExit(1)
+    click.echo("Ninguna consulta recorre tablas completas")
 
+app.cli.add_command(db_cli)
 
 if __name__ == '__main__':
     app.run(host=Config.HOST, port=Config.PORT, debug=Config.DEBUG)
\ No newline at end of file
@@ -0,0 +1,7 @@
+"""Benchmarks reproducibles de FitGym Pro.
+
+Uso:
+    python -m benchmarks sembrar --escala 0.01      # genera datos sintéticos en la base configurada
+    python -m benchmarks ejecutar --salida r.json   # mide las rutas principales
+    python -m benchmarks comparar base.json r.json  # compara dos ejecuciones
+"""
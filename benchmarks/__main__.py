@@ -0,0 +1,65 @@
+import argparse
+import json
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks de FitGym Pro')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('sembrar', help='Genera un gimnasio sintético en la base configurada')
+    p.add_argument('--escala', type=float, default=0.01,
+                   help='Fracción de 100k miembros / 10M asistencias / 1M pagos y logs (default 0.01)')
+    p.add_argument('--semilla', type=int, default=42)
+    p.add_argument('--dias', type=int, default=365, help='Días de historia a generar')
+
+    p = sub.add_parser('ejecutar', help='Mide las rutas principales')
+    p.add_argument('--peticiones', type=int, default=200, help='Peticiones por escenario')
+    p.add_argument('--concurrencia', type=int, default=4)
+    p.add_argument('--calentamiento', type=int, default=5)
+    p.add_argument('--semilla', type=int, default=42)
+    p.add_argument('--escenario', action='append', dest='escenarios', help='Solo este escenario (repetible)')
+    p.add_argument('--salida', help='Archivo JSON de resultados (por defecto stdout)')
+
+    p = sub.add_parser('comparar', help='Compara dos archivos de resultados')
+    p.add_argument('base')
+    p.add_argument('nuevo')
+
+    args = parser.parse_args(argv)
+
+    if args.comando == 'sembrar':
+        from app import db
+        from benchmarks.generador import sembrar
+        conteos = sembrar(db, escala=args.escala, semilla=args.semilla, dias=args.dias,
+                          salida=lambda m: print(m, file=sys.stderr))
+        print(json.dumps(conteos, indent=2))
+        db.disconnect()
+
+    elif args.comando == 'ejecutar':
+        from benchmarks.carga import ESCENARIOS, ejecutar
+        if args.escenarios and not set(args.escenarios) <= set(ESCENARIOS):
+            parser.error(f"Escenarios válidos: {', '.join(ESCENARIOS)}")
+        resultados = ejecutar(args.escenarios, args.peticiones, args.concurrencia, args.calentamiento,
+                              args.semilla, salida=lambda m: print(m, file=sys.stderr))
+        texto = json.dumps(resultados, indent=2, default=str)
+        if args.salida:
+            with open(args.salida, 'w') as f:
+                f.write(texto + '\n')
+        else:
+            print(texto)
+
+    elif args.comando == 'comparar':
+        from benchmarks.carga import comparar
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.nuevo) as f:
+            nuevo = json.load(f)
+        for nombre, metricas in comparar(base, nuevo).items():
+            print(nombre)
+            for metrica, valores in metricas.items():
+                cambio = '' if valores['cambio_pct'] is None else f"{valores['cambio_pct']:+.1f}%"
+                print(f"  {metrica:<24} {valores['base']:>10} -> {valores['nuevo']:>10}  {cambio}")
+
+
+if __name__ == '__main__':
+    main()
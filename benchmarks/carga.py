@@ -0,0 +1,177 @@
+"""Generador de carga sobre las rutas reales de la aplicación.
+
+Cada hilo usa su propio cliente de pruebas de Flask con la sesión del usuario
+bench_admin ya iniciada, así que se mide todo el camino de la petición
+(decoradores, consultas, plantillas) sin el ruido de la red.
+"""
+import random
+import re
+import resource
+import subprocess
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+_RE_CONSULTAS = re.compile(r'desc="(\d+) consultas"')
+
+
+def _escenarios(ids_miembros):
+    hoy = date.today()
+    semana = {'desde': (hoy - timedelta(days=7)).isoformat(), 'hasta': hoy.isoformat()}
+    return {
+        'dashboard': lambda rnd: ('GET', '/dashboard', None),
+        'miembros': lambda rnd: ('GET', '/miembros', None),
+        'pagos': lambda rnd: ('GET', '/pagos', None),
+        'asistencias_registrar': lambda rnd: (
+            'POST', '/asistencias/registrar', {'miembro_id': rnd.choice(ids_miembros), 'tipo': 'entrada'}
+        ),
+        'logs_pdf': lambda rnd: ('GET', '/logs/descargar-pdf?' + '&'.join(f'{k}={v}' for k, v in semana.items()), None),
+    }
+
+
+ESCENARIOS = ['dashboard', 'miembros', 'pagos', 'asistencias_registrar', 'logs_pdf']
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not valores:
+        return None
+    indice = max(0, min(len(valores) - 1, int(round(p / 100 * len(valores) + 0.5)) - 1))
+    return valores[indice]
+
+
+def rss_pico_mb():
+    # ru_maxrss viene en KB en Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _cliente(app, usuario):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = usuario['id']
+        sesion['username'] = usuario['username']
+        sesion['nombre'] = usuario['nombre_completo']
+        sesion['rol'] = usuario['rol']
+    return cliente
+
+
+def ejecutar_escenario(app, usuario, generar, peticiones, concurrencia, semilla):
+    """Lanza ``peticiones`` peticiones repartidas en ``concurrencia`` hilos"""
+    latencias = []
+    consultas = []
+    errores = [0]
+    lock = threading.Lock()
+    pendientes = iter(range(peticiones))
+
+    def trabajador(n):
+        rnd = random.Random(semilla + n)
+        cliente = _cliente(app, usuario)
+        while True:
+            with lock:
+                if next(pendientes, None) is None:
+                    return
+            metodo, ruta, datos = generar(rnd)
+            inicio = time.perf_counter()
+            respuesta = cliente.open(ruta, method=metodo, data=datos)
+            respuesta.get_data()
+            duracion = (time.perf_counter() - inicio) * 1000
+            coincidencia = _RE_CONSULTAS.search(respuesta.headers.get('Server-Timing', ''))
+            with lock:
+                latencias.append(duracion)
+                if coincidencia:
+                    consultas.append(int(coincidencia.group(1)))
+                if respuesta.status_code >= 400:
+                    errores[0] += 1
+
+    hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(concurrencia)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'peticiones': len(latencias),
+        'errores': errores[0],
+        'duracion_s': round(total, 3),
+        'throughput_rps': round(len(latencias) / total, 2) if total else None,
+        'p50_ms': round(percentil(latencias, 50), 2) if latencias else None,
+        'p95_ms': round(percentil(latencias, 95), 2) if latencias else None,
+        'p99_ms': round(percentil(latencias, 99), 2) if latencias else None,
+        'max_ms': round(latencias[-1], 2) if latencias else None,
+        'consultas_por_peticion': round(sum(consultas) / len(consultas), 2) if consultas else None,
+        'rss_pico_mb': rss_pico_mb(),
+    }
+
+
+def ejecutar(escenarios=None, peticiones=200, concurrencia=4, calentamiento=5, semilla=42, salida=print):
+    """Mide cada escenario y devuelve los resultados listos para guardarse como JSON"""
+    from app import app, db
+
+    usuarios = db.execute_query(
+        "SELECT id, username, nombre_completo, rol FROM usuarios_sistema WHERE username = %s", ('bench_admin',)
+    )
+    if not usuarios:
+        raise RuntimeError("No existe el usuario bench_admin; ejecute primero 'python -m benchmarks sembrar'")
+    usuario = usuarios[0]
+    ids_miembros = [row['id'] for row in db.execute_query(
+        "SELECT id FROM miembros WHERE estado = 'activo' ORDER BY id LIMIT 5000"
+    ) or []]
+    conteos = {tabla: db.execute_query(f"SELECT COUNT(*) AS total FROM {tabla}")[0]['total']
+               for tabla in ('miembros', 'asistencias', 'pagos', 'log_actividades')}
+    definiciones = _escenarios(ids_miembros)
+
+    resultados = {}
+    for nombre in escenarios or ESCENARIOS:
+        generar = definiciones[nombre]
+        if calentamiento:
+            ejecutar_escenario(app, usuario, generar, calentamiento, 1, semilla)
+        resultados[nombre] = ejecutar_escenario(app, usuario, generar, peticiones, concurrencia, semilla)
+        r = resultados[nombre]
+        salida(f"{nombre:<24} p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms "
+               f"{r['throughput_rps']} req/s {r['consultas_por_peticion']} consultas/pet")
+    db.log_writer.flush(timeout=30)
+
+    return {
+        'meta': {
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit_actual(),
+            'peticiones': peticiones,
+            'concurrencia': concurrencia,
+            'semilla': semilla,
+            'filas': conteos,
+            'pool': db.pool.stats(),
+        },
+        'escenarios': resultados,
+        'rss_pico_mb': rss_pico_mb(),
+    }
+
+
+METRICAS_COMPARABLES = ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'consultas_por_peticion', 'rss_pico_mb']
+
+
+def comparar(base, nuevo):
+    """Diferencia porcentual por escenario y métrica entre dos resultados"""
+    diferencias = {}
+    for nombre, metricas in nuevo['escenarios'].items():
+        anteriores = base['escenarios'].get(nombre)
+        if not anteriores:
+            continue
+        diferencias[nombre] = {}
+        for metrica in METRICAS_COMPARABLES:
+            antes, despues = anteriores.get(metrica), metricas.get(metrica)
+            if antes is None or despues is None:
+                continue
+            cambio = round((despues - antes) / antes * 100, 1) if antes else None
+            diferencias[nombre][metrica] = {'base': antes, 'nuevo': despues, 'cambio_pct': cambio}
+    return diferencias
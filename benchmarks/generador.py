@@ -0,0 +1,263 @@
+"""Generador de un gimnasio sintético con distribuciones realistas.
+
+Las cantidades de ESCALA_COMPLETA se multiplican por ``escala``; con la misma
+semilla se generan exactamente los mismos datos.
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import migraciones
+
+ESCALA_COMPLETA = {
+    'miembros': 100_000,
+    'asistencias': 10_000_000,
+    'pagos': 1_000_000,
+    'log_actividades': 1_000_000,
+    'clases': 40,
+}
+
+PLANES = [
+    # nombre, duracion_dias, precio, peso en la población
+    ('Mensual', 30, 499.00, 0.45),
+    ('Trimestral', 90, 1299.00, 0.25),
+    ('Semestral', 180, 2399.00, 0.12),
+    ('Anual', 365, 4299.00, 0.10),
+    ('VIP', 30, 999.00, 0.05),
+    ('Multi-Sucursal', 30, 799.00, 0.03),
+]
+
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Carmen', 'Juan', 'Lucía', 'Pedro', 'Sofía', 'Diego',
+           'Valeria', 'Jorge', 'Fernanda', 'Carlos', 'Daniela', 'Miguel', 'Paula', 'Andrés']
+APELLIDOS = ['García', 'Hernández', 'López', 'Martínez', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+             'Ramírez', 'Cruz', 'Flores', 'Gómez', 'Morales', 'Vázquez', 'Reyes', 'Jiménez']
+METODOS_PAGO = [('efectivo', 0.45), ('tarjeta', 0.40), ('transferencia', 0.12), ('otro', 0.03)]
+ACCIONES = [('CREATE', 0.45), ('UPDATE', 0.20), ('LOGIN', 0.15), ('LOGOUT', 0.12), ('DELETE', 0.05), ('EXPORT', 0.03)]
+TABLAS = ['miembros', 'asistencias', 'pagos', 'membresias', 'clases', 'usuarios_sistema']
+
+LOTE = 5000
+
+
+def _elegir(rnd, opciones):
+    return rnd.choices([o[0] for o in opciones], weights=[o[-1] for o in opciones])[0]
+
+
+def _hora_pico(rnd):
+    """Horas de entrada concentradas temprano en la mañana y al salir del trabajo"""
+    if rnd.random() < 0.45:
+        return rnd.gauss(7.0, 1.0)
+    if rnd.random() < 0.8:
+        return rnd.gauss(19.0, 1.5)
+    return rnd.uniform(9, 17)
+
+
+def _insertar(conn, query, filas):
+    cursor = conn.cursor()
+    total = 0
+    for i in range(0, len(filas), LOTE):
+        cursor.executemany(query, filas[i:i + LOTE])
+        conn.commit()
+        total += len(filas[i:i + LOTE])
+    cursor.close()
+    return total
+
+
+def _insertar_generado(conn, query, generador, total, salida, nombre):
+    """Inserta filas de un generador en lotes sin mantenerlas todas en memoria"""
+    cursor = conn.cursor()
+    lote = []
+    hechas = 0
+    for fila in generador:
+        lote.append(fila)
+        if len(lote) >= LOTE:
+            cursor.executemany(query, lote)
+            conn.commit()
+            hechas += len(lote)
+            lote = []
+            if hechas % (LOTE * 20) == 0:
+                salida(f"  {nombre}: {hechas}/{total}")
+    if lote:
+        cursor.executemany(query, lote)
+        conn.commit()
+        hechas += len(lote)
+    cursor.close()
+    return hechas
+
+
+def sembrar(db, escala=0.01, semilla=42, dias=365, salida=print):
+    """Crea el esquema y llena la base con datos sintéticos. Devuelve los conteos generados"""
+    rnd = random.Random(semilla)
+    n = {tabla: max(1, int(cantidad * escala)) for tabla, cantidad in ESCALA_COMPLETA.items()}
+    n['clases'] = ESCALA_COMPLETA['clases']
+    hoy = date.today()
+    inicio = hoy - timedelta(days=dias)
+
+    migraciones.migrar(db, salida=salida)
+    conn = db.pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM miembros")
+        if cursor.fetchone()[0]:
+            raise RuntimeError("La base ya tiene miembros; use una base vacía para sembrar")
+        cursor.close()
+
+        salida("Usuarios y planes")
+        _insertar(conn, """
+            INSERT INTO usuarios_sistema (username, password, nombre_completo, rol, email)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [
+            ('bench_admin', 'bench', 'Benchmark Admin', 'administrador', 'admin@bench.local'),
+            ('bench_recepcion', 'bench', 'Benchmark Recepción', 'encargado', 'recepcion@bench.local'),
+        ])
+        _insertar(conn, """
+            INSERT INTO planes (nombre, descripcion, duracion_dias, precio, beneficios)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(nombre, f'Plan {nombre}', duracion, precio, 'Acceso a pesas|Regaderas|Casillero')
+              for nombre, duracion, precio, _ in PLANES])
+
+        salida(f"Miembros: {n['miembros']}")
+        estados = [('activo', 0.78), ('inactivo', 0.17), ('suspendido', 0.05)]
+        miembros = []
+        for i in range(n['miembros']):
+            nombre = rnd.choice(NOMBRES)
+            apellido = rnd.choice(APELLIDOS)
+            inscripcion = inicio + timedelta(days=int(rnd.triangular(0, dias, dias * 0.3)))
+            miembros.append((
+                nombre, apellido,
+                f"{nombre.lower()}.{apellido.lower()}{i}@ejemplo.mx",
+                f"55{rnd.randint(10000000, 99999999)}",
+                date(rnd.randint(1960, 2008), rnd.randint(1, 12), rnd.randint(1, 28)),
+                inscripcion, _elegir(rnd, estados)
+            ))
+        _insertar(conn, """
+            INSERT INTO miembros (nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion, estado)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, miembros)
+        del miembros
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, estado, fecha_inscripcion FROM miembros ORDER BY id")
+        info_miembros = cursor.fetchall()
+        cursor.execute("SELECT id, duracion_dias, precio FROM planes ORDER BY id")
+        planes = cursor.fetchall()
+        cursor.execute("SELECT id FROM usuarios_sistema WHERE username IN ('bench_admin', 'bench_recepcion')")
+        usuarios = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        ids_miembros = [row[0] for row in info_miembros]
+        pesos_planes = [p[-1] for p in PLANES]
+
+        salida("Membresías")
+        membresias = []
+        for miembro_id, estado, inscripcion in info_miembros:
+            plan_id, duracion, precio = rnd.choices(planes, weights=pesos_planes)[0]
+            fecha = inscripcion
+            while fecha <= hoy:
+                fin = fecha + timedelta(days=duracion)
+                activa = estado == 'activo' and fin >= hoy
+                membresias.append((miembro_id, plan_id, fecha, fin, precio, 'activa' if activa else 'vencida'))
+                # Alrededor de un 70% renueva
+                if rnd.random() > 0.7:
+                    break
+                fecha = fin + timedelta(days=int(rnd.expovariate(1 / 5)))
+        _insertar(conn, """
+            INSERT INTO membresias (miembro_id, plan_id, fecha_inicio, fecha_fin, monto_pagado, estado)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, membresias)
+        n['membresias'] = len(membresias)
+        del membresias
+
+        salida("Clases e inscripciones")
+        clases = [(f"Clase {i + 1}", 'Clase sintética', rnd.choice(NOMBRES), rnd.choice([45, 60, 90]),
+                   rnd.choice([10, 15, 20, 30]), f"{rnd.randint(6, 20):02d}:00", 'Lunes,Miércoles,Viernes')
+                  for i in range(n['clases'])]
+        _insertar(conn, """
+            INSERT INTO clases (nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, clases)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, cupo_maximo FROM clases ORDER BY id")
+        info_clases = cursor.fetchall()
+        cursor.close()
+        inscripciones = []
+        for clase_id, cupo in info_clases:
+            # Las clases populares se llenan; las demás quedan a medias
+            ocupacion = min(cupo, int(cupo * rnd.betavariate(2, 1.2)))
+            for miembro_id in rnd.sample(ids_miembros, min(ocupacion, len(ids_miembros))):
+                inscripciones.append((miembro_id, clase_id))
+        _insertar(conn, "INSERT INTO inscripciones_clases (miembro_id, clase_id) VALUES (%s, %s)", inscripciones)
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE clases c SET inscritos = (SELECT COUNT(*) FROM inscripciones_clases ic
+                                             WHERE ic.clase_id = c.id AND ic.estado = 'activa')
+        """)
+        cursor.close()
+        conn.commit()
+
+        salida(f"Asistencias: {n['asistencias']}")
+        # Pocos miembros van casi diario y muchos van poco (distribución de Pareto)
+        pesos = [rnd.paretovariate(1.2) for _ in ids_miembros]
+
+        def generar_asistencias():
+            restantes = n['asistencias']
+            while restantes > 0:
+                bloque = min(restantes, LOTE)
+                for miembro_id in rnd.choices(ids_miembros, weights=pesos, k=bloque):
+                    dia = inicio + timedelta(days=rnd.randrange(dias + 1))
+                    hora = min(max(_hora_pico(rnd), 5.0), 22.9)
+                    entrada = datetime.combine(dia, datetime.min.time()) + timedelta(hours=hora)
+                    yield (miembro_id, entrada, 'entrada')
+                restantes -= bloque
+
+        n['asistencias'] = _insertar_generado(conn, """
+            INSERT INTO asistencias (miembro_id, fecha_hora, tipo) VALUES (%s, %s, %s)
+        """, generar_asistencias(), n['asistencias'], salida, 'asistencias')
+
+        salida(f"Pagos: {n['pagos']}")
+        precios = {plan_id: precio for plan_id, _, precio in planes}
+        nombres_planes = {row[0]: PLANES[i][0] for i, row in enumerate(planes)}
+
+        def generar_pagos():
+            for _ in range(n['pagos']):
+                miembro_id = rnd.choice(ids_miembros)
+                if rnd.random() < 0.85:
+                    plan_id = rnd.choices(list(precios), weights=pesos_planes)[0]
+                    concepto, monto = f"Membresía {nombres_planes[plan_id]}", precios[plan_id]
+                else:
+                    concepto, monto = rnd.choice([('Clase Extra', 100), ('Producto', rnd.randint(50, 800))])
+                fecha = datetime.combine(inicio + timedelta(days=rnd.randrange(dias + 1)), datetime.min.time()) \
+                    + timedelta(hours=rnd.uniform(6, 22))
+                estado = 'completado' if rnd.random() < 0.97 else 'cancelado'
+                yield (miembro_id, concepto, monto, _elegir(rnd, METODOS_PAGO), fecha, estado, rnd.choice(usuarios))
+
+        n['pagos'] = _insertar_generado(conn, """
+            INSERT INTO pagos (miembro_id, concepto, monto, metodo_pago, fecha_pago, estado, usuario_registro_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, generar_pagos(), n['pagos'], salida, 'pagos')
+
+        salida(f"Log de actividades: {n['log_actividades']}")
+
+        def generar_logs():
+            for _ in range(n['log_actividades']):
+                accion = _elegir(rnd, ACCIONES)
+                tabla = 'usuarios_sistema' if accion in ('LOGIN', 'LOGOUT') else rnd.choice(TABLAS)
+                fecha = datetime.combine(inicio + timedelta(days=rnd.randrange(dias + 1)), datetime.min.time()) \
+                    + timedelta(seconds=rnd.randrange(86400))
+                yield (rnd.choice(usuarios), accion, tabla, rnd.randint(1, len(ids_miembros)),
+                       f"{accion} sintético en {tabla}", f"10.0.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}", fecha)
+
+        n['log_actividades'] = _insertar_generado(conn, """
+            INSERT INTO log_actividades (usuario_id, accion, tabla_afectada, registro_id, detalles, ip_address, fecha_hora)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, generar_logs(), n['log_actividades'], salida, 'log_actividades')
+
+        cursor = conn.cursor()
+        cursor.execute("ANALYZE TABLE miembros, membresias, asistencias, pagos, log_actividades, inscripciones_clases")
+        cursor.fetchall()
+        cursor.close()
+        conn.commit()
+    finally:
+        db.pool.release(conn)
+    # Los pagos se insertaron directamente: el acumulado diario se calcula al final
+    resultado = db.reconciliar_ingresos()
+    if resultado is not None:
+        salida(f"Acumulado de ingresos: {resultado['grupos']} grupos")
+    return n
@@ -0,0 +1,140 @@
+import atexit
+import queue
+import threading
+import time
+
+from mysql.connector import Error
+
+
+class LogWriter:
+    """Escribe el log de actividades en segundo plano y por lotes.
+
+    ``registrar`` solo encola la entrada. Un hilo trabajador junta hasta
+    ``batch_size`` entradas (o lo que haya tras ``flush_interval`` segundos) y
+    las inserta con ``executemany`` en una sola transacción. La cola está
+    acotada: si se llena porque la base de datos va lenta, ``registrar`` espera
+    hasta ``put_timeout`` segundos y después escribe la entrada de forma
+    síncrona en lugar de descartarla.
+    """
+
+    QUERY = """
+        INSERT INTO log_actividades
+        (usuario_id, accion, tabla_afectada, registro_id, detalles, ip_address, fecha_hora)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+
+    def __init__(self, pool, max_queue=10000, batch_size=200, flush_interval=1.0, put_timeout=0.5, retries=3):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._atexit = False
+        self.escritas = 0
+        self.sincronas = 0
+        self.fallidas = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.stop)
+                    self._atexit = True
+
+    def registrar(self, entrada):
+        """Encola una entrada (tupla con los valores de QUERY)"""
+        if self._stopping.is_set():
+            self._escribir([entrada])
+            return
+        self.start()
+        try:
+            self._queue.put(entrada, timeout=self.put_timeout)
+        except queue.Full:
+            # Contrapresión: mejor frenar esta petición que perder la entrada
+            self.sincronas += 1
+            self._escribir([entrada])
+
+    def _siguiente_lote(self):
+        lote = []
+        try:
+            lote.append(self._queue.get(timeout=self.flush_interval))
+        except queue.Empty:
+            return lote
+        limite = time.monotonic() + self.flush_interval
+        while len(lote) < self.batch_size:
+            restante = limite - time.monotonic()
+            try:
+                if restante <= 0:
+                    lote.append(self._queue.get_nowait())
+                else:
+                    lote.append(self._queue.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            lote = self._siguiente_lote()
+            if lote:
+                self._escribir(lote)
+                for _ in lote:
+                    self._queue.task_done()
+
+    def _escribir(self, lote):
+        for intento in range(1, self.retries + 1):
+            conn = None
+            broken = False
+            try:
+                conn = self.pool.acquire()
+                cursor = conn.cursor()
+                cursor.executemany(self.QUERY, lote)
+                conn.commit()
+                cursor.close()
+                self.escritas += len(lote)
+                return True
+            except Error as e:
+                print(f"Error al escribir el log de actividades (intento {intento}): {e}")
+                if conn is not None:
+                    try:
+                        conn.rollback()
+                    except Error:
+                        pass
+                    broken = not conn.is_connected()
+            finally:
+                if conn is not None:
+                    self.pool.release(conn, discard=broken)
+            if intento < self.retries:
+                time.sleep(min(0.1 * 2 ** intento, 2))
+        self.fallidas += len(lote)
+        return False
+
+    def flush(self, timeout=None):
+        """Espera a que se escriban todas las entradas encoladas"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        fin = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if fin is not None and time.monotonic() >= fin:
+                return
+            time.sleep(0.01)
+
+    def stop(self, timeout=10):
+        """Detiene el trabajador después de vaciar la cola"""
+        self._stopping.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            'pendientes': self._queue.qsize(),
+            'escritas': self.escritas,
+            'sincronas': self.sincronas,
+            'fallidas': self.fallidas,
+        }
@@ -0,0 +1,232 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+
+def normalizar(texto):
+    """Pasa a minúsculas y quita acentos para comparar sin distinguirlos"""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+class IndiceMiembros:
+    """Índice de prefijos en memoria para buscar miembros por nombre, apellido, email o teléfono.
+
+    Los términos se guardan en una lista ordenada, así que una búsqueda por
+    prefijo es un rango obtenido con bisect. El índice se carga completo la
+    primera vez (y cada ``ttl`` segundos, para ver cambios hechos por otros
+    workers) y se actualiza de forma incremental con cada alta, edición o baja.
+
+    Solo un hilo recarga a la vez y lo hace fuera del candado: mientras tanto
+    los demás siguen buscando en el índice anterior, y los cambios
+    incrementales que llegan durante la carga se anotan y se vuelven a aplicar
+    sobre el índice nuevo.
+    """
+
+    CAMPOS = ('id', 'nombre', 'apellido', 'email', 'telefono', 'estado')
+
+    def __init__(self, cargar, ttl=300):
+        self._cargar = cargar
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._recarga_terminada = threading.Condition(self._lock)
+        # Lista de cambios (agregar/eliminar) mientras hay una recarga en curso
+        self._pendientes = None
+        self._docs = {}
+        self._terminos_por_id = {}
+        self._postings = {}
+        self._claves = []
+        self._cargado_en = None
+
+    def _terminos(self, doc):
+        terminos = set()
+        for campo in ('nombre', 'apellido'):
+            terminos.update(re.findall(r'\w+', normalizar(doc.get(campo))))
+        email = normalizar(doc.get('email'))
+        if email:
+            terminos.add(email)
+            terminos.update(re.findall(r'\w+', email.split('@')[0]))
+        telefono = re.sub(r'\D', '', doc.get('telefono') or '')
+        if telefono:
+            terminos.add(telefono)
+            # Los últimos dígitos son lo que se suele dictar en recepción
+            if len(telefono) > 4:
+                terminos.add(telefono[-4:])
+        return terminos
+
+    def _indexar(self, doc, nuevas=None):
+        # Con ``nuevas`` los términos nuevos se juntan ahí y el llamador ordena una vez al final
+        miembro_id = doc['id']
+        self._docs[miembro_id] = {campo: doc.get(campo) for campo in self.CAMPOS}
+        terminos = self._terminos(doc)
+        self._terminos_por_id[miembro_id] = terminos
+        for termino in terminos:
+            ids = self._postings.get(termino)
+            if ids is None:
+                self._postings[termino] = {miembro_id}
+                if nuevas is None:
+                    self._claves.insert(bisect_left(self._claves, termino), termino)
+                else:
+                    nuevas.append(termino)
+            else:
+                ids.add(miembro_id)
+
+    def _desindexar(self, miembro_id):
+        self._docs.pop(miembro_id, None)
+        for termino in self._terminos_por_id.pop(miembro_id, ()):
+            ids = self._postings.get(termino)
+            if ids is None:
+                continue
+            ids.discard(miembro_id)
+            if not ids:
+                del self._postings[termino]
+                pos = bisect_left(self._claves, termino)
+                if pos < len(self._claves) and self._claves[pos] == termino:
+                    del self._claves[pos]
+
+    def _construir(self, filas):
+        docs = {}
+        terminos_por_id = {}
+        postings = {}
+        for fila in filas:
+            miembro_id = fila['id']
+            docs[miembro_id] = {campo: fila.get(campo) for campo in self.CAMPOS}
+            terminos = self._terminos(fila)
+            terminos_por_id[miembro_id] = terminos
+            for termino in terminos:
+                postings.setdefault(termino, set()).add(miembro_id)
+        return docs, terminos_por_id, postings, sorted(postings)
+
+    def recargar(self, esperar=True):
+        """Reconstruye el índice completo desde la base de datos.
+
+        Si otro hilo ya está recargando, espera a que termine (o, sin
+        ``esperar``, vuelve enseguida) y devuelve True si hay un índice cargado.
+        Si recarga este hilo, devuelve True solo si obtuvo las filas; si no, se
+        conserva el índice anterior.
+        """
+        with self._lock:
+            if self._pendientes is not None:
+                if not esperar:
+                    return self._cargado_en is not None
+                while self._pendientes is not None:
+                    self._recarga_terminada.wait()
+                return self._cargado_en is not None
+            self._pendientes = []
+        nuevo = None
+        try:
+            filas = self._cargar()
+            if filas is not None:
+                nuevo = self._construir(filas)
+        finally:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, None
+                if nuevo is not None:
+                    self._docs, self._terminos_por_id, self._postings, self._claves = nuevo
+                    # Las altas, ediciones y bajas hechas durante la carga pueden faltar en ella
+                    for operacion, valor in pendientes:
+                        if operacion == 'agregar':
+                            self._agregar(valor)
+                        else:
+                            self._desindexar(valor)
+                    self._cargado_en = time.monotonic()
+                self._recarga_terminada.notify_all()
+        return nuevo is not None
+
+    def _asegurar_cargado(self):
+        cargado_en = self._cargado_en
+        if cargado_en is not None and time.monotonic() - cargado_en <= self.ttl:
+            return
+        # Sin índice hay que esperar la carga; con uno vencido basta con que un
+        # hilo lo recargue mientras los demás siguen usando el anterior
+        self.recargar(esperar=cargado_en is None)
+
+    def _agregar(self, docs):
+        nuevas = []
+        for doc in docs:
+            self._desindexar(doc['id'])
+            self._indexar(doc, nuevas)
+        # Un término nuevo pudo quedar vacío otra vez si el mismo id venía repetido
+        nuevas = {termino for termino in nuevas if termino in self._postings}
+        if nuevas:
+            self._claves.extend(nuevas)
+            self._claves.sort()
+
+    def agregar(self, doc):
+        """Agrega o reemplaza un miembro en el índice"""
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append(('agregar', [doc]))
+            if self._cargado_en is None:
+                return
+            self._desindexar(doc['id'])
+            self._indexar(doc)
+
+    def agregar_varios(self, docs):
+        """Agrega miembros nuevos en bloque, ordenando los términos una sola vez"""
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append(('agregar', docs))
+            if self._cargado_en is None:
+                return
+            self._agregar(docs)
+
+    def eliminar(self, miembro_id):
+        """Quita un miembro del índice"""
+        with self._lock:
+            if self._pendientes is not None:
+                self._pendientes.append(('eliminar', miembro_id))
+            self._desindexar(miembro_id)
+
+    def buscar_contacto(self, email=None, telefono=None):
+        """Devuelve el id de un miembro con exactamente ese email o ese teléfono, o None"""
+        self._asegurar_cargado()
+        email = normalizar(email).strip()
+        telefono = re.sub(r'\D', '', telefono or '')
+        with self._lock:
+            for campo, valor in (('email', email), ('telefono', telefono)):
+                if not valor:
+                    continue
+                # El término también puede venir de otro campo (los últimos dígitos de un teléfono)
+                for miembro_id in self._postings.get(valor, ()):
+                    guardado = self._docs[miembro_id].get(campo)
+                    if campo == 'email':
+                        guardado = normalizar(guardado)
+                    else:
+                        guardado = re.sub(r'\D', '', guardado or '')
+                    if guardado == valor:
+                        return miembro_id
+        return None
+
+    def _ids_con_prefijo(self, prefijo):
+        ids = set()
+        pos = bisect_left(self._claves, prefijo)
+        while pos < len(self._claves) and self._claves[pos].startswith(prefijo):
+            ids |= self._postings[self._claves[pos]]
+            pos += 1
+        return ids
+
+    def buscar(self, q, limite=10):
+        """Devuelve los miembros cuyos términos empiezan con todas las palabras de la búsqueda"""
+        self._asegurar_cargado()
+        palabras = []
+        for palabra in normalizar(q).split():
+            digitos = re.sub(r'\D', '', palabra)
+            if '@' not in palabra and len(digitos) >= 3 and len(digitos) >= len(palabra) - 2:
+                palabra = digitos
+            palabras.append(palabra)
+        if not palabras:
+            return []
+        with self._lock:
+            ids = None
+            # Las palabras más largas suelen ser más selectivas
+            for palabra in sorted(palabras, key=len, reverse=True):
+                encontrados = self._ids_con_prefijo(palabra)
+                ids = encontrados if ids is None else ids & encontrados
+                if not ids:
+                    return []
+            docs = [self._docs[i] for i in ids]
+        docs.sort(key=lambda d: (normalizar(d['nombre']), normalizar(d['apellido']), d['id']))
+        return docs[:limite]
@@ -0,0 +1,198 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+class SnapshotCache:
+    """Guarda el resultado de una función costosa durante ``ttl`` segundos.
+
+    Solo un hilo recalcula a la vez; los demás esperan y reutilizan el mismo
+    resultado. Las escrituras pueden invalidarlo o modificarlo en sitio.
+    """
+
+    def __init__(self, loader, ttl=30):
+        self._loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # (valor, instante de carga, fecha de generación en UTC). Se reemplaza entera:
+        # los lectores sin candado la copian a una variable local y así nunca
+        # ven el valor de una carga con la hora de otra (o ya invalidada).
+        self._entry = None
+
+    def _fresh_entry(self):
+        entry = self._entry
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry
+        return None
+
+    def _load(self):
+        entry = self._fresh_entry()
+        if entry is not None:
+            return entry
+        with self._lock:
+            entry = self._fresh_entry()
+            if entry is None:
+                value = self._loader()
+                if value is None:
+                    return self._entry
+                entry = self._entry = (value, time.monotonic(), datetime.now(timezone.utc))
+            return entry
+
+    def get(self):
+        """Devuelve el valor en caché, recalculándolo si expiró"""
+        entry = self._load()
+        return entry[0] if entry is not None else None
+
+    def get_entry(self):
+        """Devuelve ``(valor, generado_en, edad)`` de una misma carga, o None si no hay valor"""
+        entry = self._load()
+        if entry is None:
+            return None
+        return entry[0], entry[2], time.monotonic() - entry[1]
+
+    @property
+    def generated_at(self):
+        entry = self._entry
+        return entry[2] if entry is not None else None
+
+    def age(self):
+        """Segundos transcurridos desde que se calculó el valor"""
+        entry = self._entry
+        if entry is None:
+            return None
+        return time.monotonic() - entry[1]
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+    def update(self, fn):
+        """Aplica ``fn`` al valor en caché (si existe) sin recalcularlo"""
+        with self._lock:
+            if self._entry is not None:
+                fn(self._entry[0])
+
+
+class VersionedCache:
+    """Caché de proceso que se invalida cuando cambia un contador de versión compartido.
+
+    ``version_loader`` lee el contador (por ejemplo de la tabla cache_versiones),
+    pero como mucho una vez cada ``check_interval`` segundos. Así todos los
+    workers de gunicorn ven los cambios de los demás sin recargar los datos en
+    cada petición. Si el contador no se puede leer, los datos se recargan al
+    cumplir ``max_age`` segundos. La revisión y la recarga se hacen sin el
+    candado: mientras tanto los demás hilos siguen con el valor actual.
+    """
+
+    def __init__(self, loader, version_loader, check_interval=5, max_age=300):
+        self._loader = loader
+        self._version_loader = version_loader
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # (valor, versión, instante de carga); se reemplaza entera
+        self._entry = None
+        self._checked_at = 0.0
+        # Cambia con cada invalidate: una carga que empezó antes no se guarda
+        self._generation = 0
+
+    def get(self):
+        """Devuelve el valor, revisando la versión (y recargando) fuera del candado"""
+        ahora = time.monotonic()
+        entry = self._entry
+        if entry is not None and ahora - self._checked_at < self.check_interval:
+            return entry[0]
+        # Se marca la revisión antes de hacerla para que los demás hilos sigan
+        # con el valor actual en lugar de consultar la versión a la vez
+        self._checked_at = ahora
+        generation = self._generation
+        version = self._version_loader()
+        if entry is not None:
+            if version is None and ahora - entry[2] <= self.max_age:
+                return entry[0]
+            if version is not None and version == entry[1]:
+                return entry[0]
+        value = self._loader()
+        if value is None:
+            return entry[0] if entry is not None else None
+        with self._lock:
+            if self._generation == generation:
+                self._entry = (value, version, ahora)
+        return value
+
+    def invalidate(self):
+        """Fuerza la recarga en el próximo acceso de este proceso"""
+        with self._lock:
+            self._generation += 1
+            self._entry = None
+
+
+class ETagCache:
+    """Últimos ETag emitidos por fila, para responder If-None-Match sin leer la fila.
+
+    Guarda hasta ``max_entradas`` ETag por ``(tabla, id)`` (LRU). Las escrituras
+    de este proceso invalidan su entrada con ``invalidar``; las de otros workers
+    se detectan con ``version_loader``, que devuelve ``{tabla: generación}`` y se
+    consulta como mucho cada ``check_interval`` segundos. Cuando cambia la
+    generación de una tabla se olvidan sus ETag y los de las tablas que
+    dependen de ella (``dependencias``). Si las generaciones no se pueden leer,
+    ``get`` no devuelve nada y la fila se lee normalmente.
+    """
+
+    def __init__(self, version_loader, check_interval=5, max_entradas=5000, dependencias=None):
+        self._version_loader = version_loader
+        self.check_interval = check_interval
+        self.max_entradas = max_entradas
+        self.dependencias = dependencias or {}
+        self._lock = threading.Lock()
+        self._etags = OrderedDict()
+        self._generaciones = None
+        self._checked_at = 0.0
+
+    def _olvidar_tabla(self, tabla):
+        afectadas = {tabla} | {t for t, deps in self.dependencias.items() if tabla in deps}
+        for clave in [c for c in self._etags if c[0] in afectadas]:
+            del self._etags[clave]
+
+    def _revisar_generaciones(self):
+        ahora = time.monotonic()
+        if self._generaciones is not None and ahora - self._checked_at < self.check_interval:
+            return True
+        generaciones = self._version_loader()
+        self._checked_at = ahora
+        if generaciones is None:
+            self._etags.clear()
+            self._generaciones = None
+            return False
+        anteriores = self._generaciones or {}
+        for tabla in set(anteriores) | set(generaciones):
+            if anteriores.get(tabla) != generaciones.get(tabla):
+                self._olvidar_tabla(tabla)
+        self._generaciones = generaciones
+        return True
+
+    def get(self, tabla, fila_id):
+        with self._lock:
+            if not self._revisar_generaciones():
+                return None
+            etag = self._etags.get((tabla, fila_id))
+            if etag is not None:
+                self._etags.move_to_end((tabla, fila_id))
+            return etag
+
+    def set(self, tabla, fila_id, etag):
+        with self._lock:
+            self._etags[(tabla, fila_id)] = etag
+            self._etags.move_to_end((tabla, fila_id))
+            while len(self._etags) > self.max_entradas:
+                self._etags.popitem(last=False)
+
+    def invalidar(self, tabla, fila_id):
+        """Olvida el ETag de una fila (y los de las tablas que dependen de su tabla)"""
+        with self._lock:
+            self._etags.pop((tabla, fila_id), None)
+            for dependiente, deps in self.dependencias.items():
+                if tabla in deps:
+                    for clave in [c for c in self._etags if c[0] == dependiente]:
+                        del self._etags[clave]
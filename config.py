@@ -13,12 +13,104 @@ class Config:
         'port': int(os.getenv('DB_PORT', 3306))
     }
     
+    # Configuración del pool de conexiones
+    DB_POOL_CONFIG = {
+        'min_size': int(os.getenv('DB_POOL_MIN', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX', 10)),
+        'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', 30)),
+        'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', 300))
+    }
+    
+    # Réplica de lectura (opcional): los SELECT van a la réplica y las escrituras
+    # al primario. Se desactiva si DB_REPLICA_HOST no está definido.
+    DB_REPLICA_CONFIG = {
+        'host': os.getenv('DB_REPLICA_HOST'),
+        'user': os.getenv('DB_REPLICA_USER', os.getenv('DB_USER', 'root')),
+        'password': os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD', '')),
+        'database': os.getenv('DB_NAME', 'gimnasio'),
+        'port': int(os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT', 3306)))
+    } if os.getenv('DB_REPLICA_HOST') else None
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+    REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    # Segundos que una sesión sigue leyendo del primario después de escribir
+    LECTURA_PRIMARIO_TRAS_ESCRITURA = float(os.getenv('LECTURA_PRIMARIO_TRAS_ESCRITURA', 10))
+
+    # Escritura del log de actividades en segundo plano
+    LOG_WRITER_CONFIG = {
+        'max_queue': int(os.getenv('LOG_QUEUE_MAX', 10000)),
+        'batch_size': int(os.getenv('LOG_BATCH_SIZE', 200)),
+        'flush_interval': float(os.getenv('LOG_FLUSH_INTERVAL', 1.0))
+    }
+    
+    # Hilos para las lecturas independientes que una ruta lanza a la vez (1 para desactivar)
+    PARALELO_HILOS = int(os.getenv('PARALELO_HILOS', 4))
+    
+    # Retención del log de actividades: meses que se conservan en la base,
+    # particiones mensuales creadas por adelantado y directorio del archivo
+    LOG_RETENCION_MESES = int(os.getenv('LOG_RETENCION_MESES', 12))
+    LOG_PARTICIONES_ADELANTE = int(os.getenv('LOG_PARTICIONES_ADELANTE', 3))
+    LOG_ARCHIVO_DIR = os.getenv('LOG_ARCHIVO_DIR', os.path.join('archivo', 'logs'))
+    
+    # Filas por bloque al leer exportaciones con cursor sin búfer
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+    # Filas por archivo en el PDF del log; reportlab mantiene en memoria todas
+    # las páginas de un PDF (~0.7 KB por fila) y las exportaciones más grandes
+    # se parten en varios PDF dentro de un zip
+    LOGS_PDF_MAX_FILAS = int(os.getenv('LOGS_PDF_MAX_FILAS', 5000))
+    
+    # Instrumentación de consultas
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')  # archivo; si no se define va a stderr
+    
     # Configuración de Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'clave-super-secreta-cambiar-en-produccion')
-    SESSION_TYPE = 'filesystem'
     PERMANENT_SESSION_LIFETIME = 3600  # 1 hora
     
+    # Sesiones: 'mysql' (tabla sesiones, compartida entre workers) o 'cookie'
+    # (cookie firmada de Flask, sin estado en el servidor)
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'mysql')
+    SESION_CACHE_MAX = int(os.getenv('SESION_CACHE_MAX', 10000))
+    SESION_CACHE_TTL = float(os.getenv('SESION_CACHE_TTL', 5))
+    SESION_PURGA_INTERVALO = int(os.getenv('SESION_PURGA_INTERVALO', 600))
+    
     # Configuración de la aplicación
     DEBUG = os.getenv('DEBUG', 'False') == 'True'
     HOST = '0.0.0.0'
-    PORT = int(os.getenv('PORT', 5000))
\ No newline at end of file
+    PORT = int(os.getenv('PORT', 5000))
+    
+    # Paginación
+    MIEMBROS_POR_PAGINA = int(os.getenv('MIEMBROS_POR_PAGINA', 50))
+    LOGS_POR_PAGINA = int(os.getenv('LOGS_POR_PAGINA', 100))
+    MAX_POR_PAGINA = 200
+    
+    # Búsqueda de miembros (segundos antes de recargar el índice completo)
+    INDICE_MIEMBROS_TTL = int(os.getenv('INDICE_MIEMBROS_TTL', 300))
+    
+    # Cada cuántos segundos se revisa si otro worker cambió un catálogo en caché
+    CACHE_VERSION_CHECK = int(os.getenv('CACHE_VERSION_CHECK', 5))
+    
+    # Registro de asistencias por lotes (kioscos)
+    CHECKIN_LOTE_MAX = int(os.getenv('CHECKIN_LOTE_MAX', 500))
+    CHECKIN_MAX_ANTIGUEDAD_HORAS = int(os.getenv('CHECKIN_MAX_ANTIGUEDAD_HORAS', 24))
+    
+    # Importación de miembros desde CSV: filas por transacción y errores
+    # que se devuelven en el resumen
+    IMPORTACION_LOTE = int(os.getenv('IMPORTACION_LOTE', 1000))
+    IMPORTACION_MAX_ERRORES = int(os.getenv('IMPORTACION_MAX_ERRORES', 1000))
+    
+    # Aviso de pago duplicado: ventana en horas y cada cuántos segundos se
+    # recargan desde la base los pagos recientes de otros workers
+    PAGO_DUPLICADO_HORAS = int(os.getenv('PAGO_DUPLICADO_HORAS', 24))
+    PAGOS_RECIENTES_TTL = int(os.getenv('PAGOS_RECIENTES_TTL', 60))
+    
+    # Vencimiento de membresías: cada cuántos segundos se barren las vencidas
+    # dentro de la aplicación (0 para hacerlo solo con "flask db vencer-membresias"),
+    # filas por transacción y días de anticipación de la lista "por vencer"
+    VENCIMIENTO_INTERVALO = int(os.getenv('VENCIMIENTO_INTERVALO', 3600))
+    VENCIMIENTO_LOTE = int(os.getenv('VENCIMIENTO_LOTE', 500))
+    VENCIMIENTO_AVISO_DIAS = int(os.getenv('VENCIMIENTO_AVISO_DIAS', 7))
+    POR_VENCER_TTL = int(os.getenv('POR_VENCER_TTL', 300))
+    
+    # Segundos que se reutiliza el snapshot de estadísticas del dashboard
+    ESTADISTICAS_TTL = int(os.getenv('ESTADISTICAS_TTL', 30))
\ No newline at end of file
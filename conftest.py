@@ -0,0 +1,5 @@
+"""Configuración de pytest.
+
+Al estar en la raíz del proyecto, pytest agrega este directorio a sys.path y
+los tests importan los módulos de la aplicación directamente.
+"""
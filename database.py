@@ -1,59 +1,409 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
 from mysql.connector import Error
 from config import Config
-from datetime import datetime
+from pool import ConnectionPool
+from replica import Replica
+from busqueda import IndiceMiembros
+from cache import SnapshotCache, VersionedCache, ETagCache
+from bitacora import LogWriter
+from instrumentacion import MetricasConsultas
+from modelos import (Miembro, Membresia, Pago, Clase, InscripcionClase, Asistencia, LogActividad,
+                     UsuarioSistema, convertir, convertir_una)
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+
+# Clave única repetida (INSERT con una clave de idempotencia ya usada)
+ER_DUP_ENTRY = 1062
+
+# Rangos semiabiertos [inicio, fin) para filtrar fechas sin envolver la columna
+# en DATE()/MONTH()/YEAR(), de modo que MySQL pueda usar los índices
+
+def rango_dia(dia=None):
+    dia = dia or date.today()
+    return dia, dia + timedelta(days=1)
+
+def rango_mes(dia=None):
+    inicio = (dia or date.today()).replace(day=1)
+    return inicio, (inicio + timedelta(days=32)).replace(day=1)
+
+def rango_anio(dia=None):
+    anio = (dia or date.today()).year
+    return date(anio, 1, 1), date(anio + 1, 1, 1)
 
 class Database:
     def __init__(self):
         self.config = Config.DB_CONFIG
-        self.connection = None
+        self.pool = ConnectionPool(self.config, **Config.DB_POOL_CONFIG)
+        self.replica = None
+        if Config.DB_REPLICA_CONFIG:
+            self.replica = Replica(Config.DB_REPLICA_CONFIG, Config.DB_POOL_CONFIG,
+                                   max_lag=Config.REPLICA_MAX_LAG, check_interval=Config.REPLICA_CHECK_INTERVAL)
+        self._local = threading.local()
+        self._ejecutor = None
+        self._ejecutor_lock = threading.Lock()
+        self.metricas = MetricasConsultas(umbral_lento_ms=Config.SLOW_QUERY_MS)
+        self.log_writer = LogWriter(self.pool, **Config.LOG_WRITER_CONFIG)
+        self._crear_caches()
+    
+    def _crear_caches(self):
+        """Crea las cachés en memoria de esta instancia (todas vacías)"""
+        self.indice_miembros = IndiceMiembros(self.obtener_miembros_busqueda, ttl=Config.INDICE_MIEMBROS_TTL)
+        self.estadisticas = SnapshotCache(self._calcular_estadisticas, ttl=Config.ESTADISTICAS_TTL)
+        self.catalogo_planes = VersionedCache(
+            self._cargar_catalogo_planes,
+            lambda: self.obtener_version_cache('planes'),
+            check_interval=Config.CACHE_VERSION_CHECK
+        )
+        self.mapa_usuarios = VersionedCache(
+            self._cargar_mapa_usuarios,
+            lambda: self.obtener_version_cache('usuarios'),
+            check_interval=Config.CACHE_VERSION_CHECK
+        )
+        self.pagos_recientes = SnapshotCache(self._cargar_pagos_recientes, ttl=Config.PAGOS_RECIENTES_TTL)
+        self.por_vencer = SnapshotCache(self._cargar_membresias_por_vencer, ttl=Config.POR_VENCER_TTL)
+        # El JSON de un pago incluye el nombre del miembro
+        self.etags = ETagCache(self._leer_generaciones_filas, check_interval=Config.CACHE_VERSION_CHECK,
+                               dependencias={'pagos': ('miembros',)})
     
     def connect(self):
-        """Establece conexión con la base de datos"""
+        """Abre las conexiones mínimas del pool"""
         try:
-            self.connection = mysql.connector.connect(**self.config)
-            if self.connection.is_connected():
-                return True
+            self.pool.fill()
+            return True
         except Error as e:
             print(f"Error al conectar a MySQL: {e}")
             return False
     
     def disconnect(self):
-        """Cierra la conexión con la base de datos"""
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
+        """Vacía el log pendiente y cierra todas las conexiones del pool"""
+        self.log_writer.stop()
+        self.pool.close()
+        if self.replica is not None:
+            self.replica.close()
+    
+    # === MANEJO DE CONEXIONES POR PETICIÓN ===
+    
+    def bind_request(self, endpoint=None, primario_hasta=None):
+        """Marca el hilo actual para reutilizar una sola conexión durante la petición.
+        
+        La conexión se toma del pool de forma perezosa en la primera consulta y se
+        devuelve en release_request(). Las consultas de la petición se miden y se
+        etiquetan con ``endpoint``. Hasta el instante ``primario_hasta`` (epoch) las
+        lecturas no van a la réplica, para que quien acaba de escribir vea sus cambios.
+        """
+        self._local.bound = True
+        self._local.connection = None
+        self._local.replica_connection = None
+        self._local.primario_hasta = primario_hasta
+        self._local.escribio = False
+        self.metricas.iniciar(endpoint)
+    
+    def release_request(self):
+        """Devuelve al pool las conexiones reservadas por la petición actual"""
+        self.metricas.terminar()
+        conn = getattr(self._local, 'connection', None)
+        replica_conn = getattr(self._local, 'replica_connection', None)
+        self._local.bound = False
+        self._local.connection = None
+        self._local.replica_connection = None
+        self._local.primario_hasta = None
+        self._local.escribio = False
+        if conn is not None:
+            self.pool.release(conn)
+        if replica_conn is not None:
+            self.replica.pool.release(replica_conn)
+    
+    def escritura_en_peticion(self):
+        """Indica si la petición actual ejecutó alguna escritura"""
+        return getattr(self._local, 'escribio', False)
+    
+    def _leer_de_replica(self, query):
+        """Decide si una lectura puede ir a la réplica"""
+        if self.replica is None or getattr(self._local, 'escribio', False):
+            return False
+        primario_hasta = getattr(self._local, 'primario_hasta', None)
+        if primario_hasta is not None and time.time() < primario_hasta:
+            return False
+        sql = query.lstrip()[:6].upper()
+        if sql != 'SELECT' or 'FOR UPDATE' in query.upper():
+            return False
+        return self.replica.disponible()
+    
+    def _checkout(self, replica=False):
+        """Obtiene la conexión para una consulta. Devuelve (conexion, propia)"""
+        pool = self.replica.pool if replica else self.pool
+        atributo = 'replica_connection' if replica else 'connection'
+        if getattr(self._local, 'bound', False):
+            conn = getattr(self._local, atributo)
+            if conn is None:
+                conn = pool.acquire()
+                setattr(self._local, atributo, conn)
+            return conn, False
+        return pool.acquire(), True
     
-    def execute_query(self, query, params=None, commit=False):
-        """Ejecuta una consulta SQL"""
+    def _checkin(self, conn, owned, broken=False, replica=False):
+        pool = self.replica.pool if replica else self.pool
+        if owned:
+            pool.release(conn, discard=broken)
+        elif broken:
+            # La conexión de la petición se rompió: se descarta y la siguiente
+            # consulta tomará otra del pool
+            setattr(self._local, 'replica_connection' if replica else 'connection', None)
+            pool.release(conn, discard=True)
+    
+    def _ejecutar(self, query, params, commit, replica=False, filas_afectadas=False):
+        """Ejecuta una consulta en el primario o la réplica. Devuelve (resultado, error)"""
         try:
-            if not self.connection or not self.connection.is_connected():
-                self.connect()
-            
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if commit:
-                self.connection.commit()
-                return cursor.lastrowid
-            else:
-                result = cursor.fetchall()
+            conn, owned = self._checkout(replica)
+        except Error as e:
+            return None, e
+        broken = False
+        inicio = time.perf_counter()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(query, params or ())
+                if commit:
+                    conn.commit()
+                    return (cursor.rowcount if filas_afectadas else cursor.lastrowid), None
+                return cursor.fetchall(), None
+            finally:
                 cursor.close()
-                return result
+                self.metricas.registrar(query, params, time.perf_counter() - inicio)
         except Error as e:
-            print(f"Error en la consulta: {e}")
-            if commit:
-                self.connection.rollback()
+            try:
+                if commit:
+                    conn.rollback()
+            except Error:
+                pass
+            broken = not conn.is_connected()
+            return None, e
+        finally:
+            self._checkin(conn, owned, broken, replica)
+    
+    def execute_query(self, query, params=None, commit=False, primario=False):
+        """Ejecuta una consulta SQL.
+        
+        Las escrituras van siempre al primario; los SELECT van a la réplica si hay
+        una configurada y disponible (y ``primario`` es falso), y si falla se
+        repiten en el primario.
+        """
+        if commit:
+            if getattr(self._local, 'bound', False):
+                self._local.escribio = True
+        elif not primario and self._leer_de_replica(query):
+            resultado, error = self._ejecutar(query, params, commit, replica=True)
+            if error is None:
+                self.replica.lecturas += 1
+                return resultado
+            self.replica.marcar_caida(str(error))
+            print(f"Error en la réplica, se repite en el primario: {error}")
+        resultado, error = self._ejecutar(query, params, commit)
+        if error is not None:
+            print(f"Error en la consulta: {error}")
+        return resultado
+    
+    def execute_update(self, query, params=None):
+        """Ejecuta una escritura y devuelve el número de filas afectadas (None si falla)"""
+        if getattr(self._local, 'bound', False):
+            self._local.escribio = True
+        resultado, error = self._ejecutar(query, params, True, filas_afectadas=True)
+        if error is not None:
+            print(f"Error en la consulta: {error}")
+        return resultado
+    
+    def en_transaccion(self, funcion):
+        """Ejecuta varias sentencias en el primario como una sola transacción.
+        
+        ``funcion`` recibe ``ejecutar(query, params=None, varios=False)``, que
+        devuelve el cursor (de diccionario) de cada sentencia; con ``varios`` los
+        ``params`` son una lista de tuplas y se usa ``executemany``. Si todo sale bien se confirma y se
+        devuelve lo que devuelva ``funcion``; si falla alguna sentencia se
+        revierte todo y se devuelve None.
+        """
+        if getattr(self._local, 'bound', False):
+            self._local.escribio = True
+        try:
+            conn, owned = self._checkout()
+        except Error as e:
+            print(f"Error en la transacción: {e}")
+            return None
+        broken = False
+        # Con búfer, para poder leer una fila y seguir ejecutando en el mismo cursor
+        cursor = conn.cursor(dictionary=True, buffered=True)
+        
+        def ejecutar(query, params=None, varios=False):
+            inicio = time.perf_counter()
+            try:
+                if varios:
+                    cursor.executemany(query, params)
+                else:
+                    cursor.execute(query, params or ())
+            finally:
+                self.metricas.registrar(query, params, time.perf_counter() - inicio, varios=varios)
+            return cursor
+        
+        try:
+            resultado = funcion(ejecutar)
+            conn.commit()
+            return resultado
+        except Error as e:
+            print(f"Error en la transacción: {e}")
+            try:
+                conn.rollback()
+            except Error:
+                pass
+            broken = not conn.is_connected()
             return None
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                broken = True
+            self._checkin(conn, owned, broken)
+    
+    @staticmethod
+    def _insertar_filas(ejecutar, query, filas):
+        """Inserta ``filas`` con un solo INSERT de varias filas y devuelve sus ids, en orden, como ``range``.
+        
+        Se usa dentro de ``en_transaccion``. El conector convierte el executemany
+        en un solo INSERT ... VALUES (...), (...), que InnoDB trata como "simple
+        insert": con cualquier innodb_autoinc_lock_mode reserva de una vez los
+        ids de todas sus filas, que van de ``auto_increment_increment`` en
+        ``auto_increment_increment`` a partir de ``lastrowid`` (el primero). El
+        incremento se lee en la misma conexión porque puede no ser 1 (p. ej. en
+        replicación multiprimario).
+        """
+        paso = int(ejecutar("SELECT @@SESSION.auto_increment_increment AS paso").fetchone()['paso'])
+        cursor = ejecutar(query, filas, varios=True)
+        primer_id, cantidad = cursor.lastrowid, cursor.rowcount
+        if not primer_id or cantidad != len(filas):
+            raise Error(msg=f"El INSERT de varias filas devolvió id {primer_id} y {cantidad} de {len(filas)} filas")
+        return range(primer_id, primer_id + cantidad * paso, paso)
+    
+    def stream_query(self, query, params=None, chunk_size=1000, primario=False):
+        """Ejecuta una consulta con un cursor sin búfer y entrega las filas por bloques.
+        
+        Usa una conexión propia del pool (de la réplica si está disponible y
+        ``primario`` es falso) durante toda la iteración, para que la exportación
+        pueda seguir después de terminar la petición que la inició. El destino se
+        decide al llamar, mientras la petición sigue activa.
+        """
+        pool = self.replica.pool if not primario and self._leer_de_replica(query) else self.pool
+        return self._stream(pool, query, params, chunk_size)
+    
+    def _stream(self, pool, query, params, chunk_size):
+        try:
+            conn = pool.acquire()
+        except Error as e:
+            if pool is self.pool:
+                raise
+            self.replica.marcar_caida(str(e))
+            pool = self.pool
+            conn = pool.acquire()
+        completo = False
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            try:
+                inicio = time.perf_counter()
+                cursor.execute(query, params or ())
+                # Para las consultas en streaming se mide hasta la primera fila
+                self.metricas.registrar(query, params, time.perf_counter() - inicio)
+                while True:
+                    filas = cursor.fetchmany(chunk_size)
+                    if not filas:
+                        break
+                    yield filas
+                completo = True
+            finally:
+                try:
+                    cursor.close()
+                except Error:
+                    completo = False
+        except Error as e:
+            print(f"Error en la consulta: {e}")
+            raise
+        finally:
+            # Si la iteración se cortó quedan filas sin leer en el socket:
+            # es más barato descartar la conexión que drenarlas
+            pool.release(conn, discard=not completo)
+    
+    # === LECTURAS EN PARALELO ===
+    
+    def _obtener_ejecutor(self):
+        # Se crea en el primer uso: los hilos no sobreviven al fork de gunicorn
+        with self._ejecutor_lock:
+            if self._ejecutor is None:
+                self._ejecutor = ThreadPoolExecutor(max_workers=Config.PARALELO_HILOS,
+                                                    thread_name_prefix='lecturas')
+            return self._ejecutor
+    
+    def _tarea_paralela(self, funcion, args, primario_hasta, escribio):
+        """Corre una tarea en un hilo del ejecutor con el contexto de la petición que la lanzó"""
+        self._local.en_paralelo = True
+        self._local.primario_hasta = primario_hasta
+        self._local.escribio = escribio
+        self.metricas.iniciar(None)
+        resultado = error = None
+        try:
+            resultado = funcion(*args)
+        except Exception as e:
+            # Se devuelve junto con la medición para no perder las consultas ya hechas
+            error = e
+        finally:
+            medicion = self.metricas.separar()
+            self._local.en_paralelo = False
+            self._local.primario_hasta = None
+            self._local.escribio = False
+        return resultado, error, medicion
+    
+    def en_paralelo(self, **tareas):
+        """Ejecuta lecturas independientes a la vez y devuelve sus resultados por nombre.
+        
+        Cada tarea es una función o una tupla ``(funcion, *args)``. Cada una corre
+        en un hilo del ejecutor con su propia conexión del pool, así que la espera
+        total se acerca a la de la tarea más lenta. Si el pool no tiene conexiones
+        libres para todas, o si se llama desde otra tarea paralela, las tareas se
+        ejecutan una tras otra en el hilo actual.
+        """
+        tareas = {nombre: tarea if isinstance(tarea, tuple) else (tarea,) for nombre, tarea in tareas.items()}
+        estado = self.pool.stats()
+        libres = estado['max_size'] - estado['in_use']
+        if (len(tareas) < 2 or Config.PARALELO_HILOS < 2 or libres < len(tareas)
+                or getattr(self._local, 'en_paralelo', False)):
+            return {nombre: funcion(*args) for nombre, (funcion, *args) in tareas.items()}
+        
+        inicio = time.perf_counter()
+        ejecutor = self._obtener_ejecutor()
+        primario_hasta = getattr(self._local, 'primario_hasta', None)
+        escribio = getattr(self._local, 'escribio', False)
+        futuros = {
+            nombre: ejecutor.submit(self._tarea_paralela, funcion, args, primario_hasta, escribio)
+            for nombre, (funcion, *args) in tareas.items()
+        }
+        resultados = {}
+        error = None
+        try:
+            # Se espera a todas aunque alguna falle, para sumar lo que midió cada una
+            for nombre, futuro in futuros.items():
+                resultados[nombre], error_tarea, medicion = futuro.result()
+                self.metricas.sumar(medicion)
+                error = error or error_tarea
+        finally:
+            self.metricas.registrar_paralelo(len(tareas), time.perf_counter() - inicio)
+        if error is not None:
+            raise error
+        return resultados
     
     def registrar_log(self, usuario_id, accion, tabla_afectada, registro_id=None, detalles=None, ip_address=None):
-        """Registra una acción en el log de actividades"""
-        query = """
-            INSERT INTO log_actividades 
-            (usuario_id, accion, tabla_afectada, registro_id, detalles, ip_address)
-            VALUES (%s, %s, %s, %s, %s, %s)
+        """Registra una acción en el log de actividades.
+        
+        La entrada se encola y la escribe en lote el LogWriter en segundo plano.
         """
-        params = (usuario_id, accion, tabla_afectada, registro_id, detalles, ip_address)
-        return self.execute_query(query, params, commit=True)
+        self.log_writer.registrar((usuario_id, accion, tabla_afectada, registro_id, detalles, ip_address, datetime.now()))
     
     # === FUNCIONES DE USUARIOS ===
     
@@ -64,13 +414,12 @@ class Database:
             FROM usuarios_sistema
             WHERE username = %s AND password = %s AND activo = TRUE
         """
-        result = self.execute_query(query, (username, password))
-        return result[0] if result else None
+        return convertir_una(self.execute_query(query, (username, password)), UsuarioSistema)
     
     def obtener_usuarios(self):
         """Obtiene todos los usuarios del sistema"""
         query = "SELECT id, username, nombre_completo, rol, email, activo, fecha_creacion FROM usuarios_sistema ORDER BY id"
-        return self.execute_query(query)
+        return convertir(self.execute_query(query), UsuarioSistema)
     
     def crear_usuario(self, username, password, nombre_completo, rol, email):
         """Crea un nuevo usuario del sistema"""
@@ -78,28 +427,81 @@ class Database:
             INSERT INTO usuarios_sistema (username, password, nombre_completo, rol, email)
             VALUES (%s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (username, password, nombre_completo, rol, email), commit=True)
+        usuario_id = self.execute_query(query, (username, password, nombre_completo, rol, email), commit=True)
+        if usuario_id:
+            self._invalidar_usuarios()
+        return usuario_id
+    
+    def _cargar_mapa_usuarios(self):
+        result = self.execute_query("SELECT id, username, nombre_completo FROM usuarios_sistema")
+        if result is None:
+            return None
+        return {row['id']: row for row in result}
+    
+    def _invalidar_usuarios(self):
+        self.mapa_usuarios.invalidate()
+        self.incrementar_version_cache('usuarios')
+    
+    def obtener_mapa_usuarios(self):
+        """Diccionario id -> {id, username, nombre_completo} de los usuarios del sistema (en memoria)"""
+        return self.mapa_usuarios.get() or {}
     
     # === FUNCIONES DE MIEMBROS ===
     
-    def obtener_miembros(self):
-        """Obtiene todos los miembros del gimnasio"""
-        query = """
+    def obtener_miembros_pagina(self, cursor=None, limite=50, estado=None, orden='desc'):
+        """Obtiene una página de miembros usando paginación por llave (keyset) sobre m.id.
+        
+        Devuelve un diccionario con los miembros de la página y el cursor de la
+        siguiente (None si es la última).
+        """
+        condiciones = []
+        params = []
+        if cursor is not None:
+            condiciones.append("m.id < %s" if orden == 'desc' else "m.id > %s")
+            params.append(cursor)
+        if estado:
+            condiciones.append("m.estado = %s")
+            params.append(estado)
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        direccion = 'DESC' if orden == 'desc' else 'ASC'
+        params.append(limite + 1)
+        
+        # El LIMIT se aplica antes de los JOIN para unir solo las filas de la página
+        query = f"""
             SELECT m.*, 
                    p.nombre as plan_actual,
                    mem.fecha_fin as vencimiento_membresia
-            FROM miembros m
+            FROM (
+                SELECT * FROM miembros m
+                {where}
+                ORDER BY m.id {direccion}
+                LIMIT %s
+            ) m
             LEFT JOIN membresias mem ON m.id = mem.miembro_id AND mem.estado = 'activa'
             LEFT JOIN planes p ON mem.plan_id = p.id
-            ORDER BY m.id DESC
+            ORDER BY m.id {direccion}
         """
-        return self.execute_query(query)
+        result = self.execute_query(query, tuple(params)) or []
+        
+        # Se pide una fila extra solo para saber si hay otra página
+        ids = []
+        for row in result:
+            if row['id'] not in ids:
+                ids.append(row['id'])
+        hay_mas = len(ids) > limite
+        if hay_mas:
+            pagina = set(ids[:limite])
+            result = [row for row in result if row['id'] in pagina]
+        
+        return {
+            'miembros': convertir(result, Miembro),
+            'siguiente': ids[limite - 1] if hay_mas else None
+        }
     
     def obtener_miembro(self, miembro_id):
         """Obtiene un miembro específico"""
         query = "SELECT * FROM miembros WHERE id = %s"
-        result = self.execute_query(query, (miembro_id,))
-        return result[0] if result else None
+        return convertir_una(self.execute_query(query, (miembro_id,)), Miembro)
     
     def crear_miembro(self, nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion):
         """Crea un nuevo miembro"""
@@ -107,29 +509,172 @@ class Database:
             INSERT INTO miembros (nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion)
             VALUES (%s, %s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion), commit=True)
+        miembro_id = self.execute_query(query, (nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion), commit=True)
+        if miembro_id:
+            self.indice_miembros.agregar({
+                'id': miembro_id, 'nombre': nombre, 'apellido': apellido,
+                'email': email, 'telefono': telefono, 'estado': 'activo'
+            })
+            self._sumar_estadistica('miembros_activos')
+        return miembro_id
+    
+    def insertar_miembros_lote(self, miembros):
+        """Inserta varios miembros (nombre, apellido, email, telefono, fecha_nacimiento,
+        fecha_inscripcion) con un solo INSERT de varias filas en su propia transacción.
+        
+        Devuelve los ids asignados, en el mismo orden, como ``range``, o None si falló.
+        """
+        if not miembros:
+            return range(0)
+        query = """
+            INSERT INTO miembros (nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """
+        ids = self.en_transaccion(lambda ejecutar: self._insertar_filas(ejecutar, query, miembros))
+        if ids is None:
+            return None
+        self.indice_miembros.agregar_varios([
+            {'id': miembro_id, 'nombre': nombre, 'apellido': apellido,
+             'email': email, 'telefono': telefono, 'estado': 'activo'}
+            for miembro_id, (nombre, apellido, email, telefono, _, _) in zip(ids, miembros)
+        ])
+        self._sumar_estadistica('miembros_activos', len(ids))
+        return ids
     
     def actualizar_miembro(self, miembro_id, nombre, apellido, email, telefono, fecha_nacimiento, estado):
         """Actualiza un miembro existente"""
         query = """
             UPDATE miembros 
             SET nombre = %s, apellido = %s, email = %s, telefono = %s, 
-                fecha_nacimiento = %s, estado = %s
+                fecha_nacimiento = %s, estado = %s, version = version + 1
             WHERE id = %s
         """
-        return self.execute_query(query, (nombre, apellido, email, telefono, fecha_nacimiento, estado, miembro_id), commit=True)
+        resultado = self.execute_query(query, (nombre, apellido, email, telefono, fecha_nacimiento, estado, miembro_id), commit=True)
+        if resultado is not None:
+            self._fila_modificada('miembros', miembro_id)
+            self.indice_miembros.agregar({
+                'id': miembro_id, 'nombre': nombre, 'apellido': apellido,
+                'email': email, 'telefono': telefono, 'estado': estado
+            })
+            self.estadisticas.invalidate()
+        return resultado
     
     def eliminar_miembro(self, miembro_id):
         """Elimina un miembro (solo administrador)"""
         query = "DELETE FROM miembros WHERE id = %s"
-        return self.execute_query(query, (miembro_id,), commit=True)
+        clases = []
+        
+        def eliminar(ejecutar):
+            # El DELETE borra en cascada sus inscripciones: sus lugares se liberan aquí
+            filas = ejecutar("""
+                SELECT clase_id, COUNT(*) as lugares FROM inscripciones_clases
+                WHERE miembro_id = %s AND estado = 'activa'
+                GROUP BY clase_id
+                ORDER BY clase_id
+            """, (miembro_id,)).fetchall()
+            clases[:] = [fila['clase_id'] for fila in filas]
+            for clase_id in clases:
+                ejecutar("SELECT id FROM clases WHERE id = %s FOR UPDATE", (clase_id,))
+            eliminadas = ejecutar(query, (miembro_id,)).rowcount
+            for fila in filas:
+                self._liberar_lugar(ejecutar, fila['clase_id'], fila['lugares'])
+            return eliminadas
+        
+        resultado = self.en_transaccion(eliminar)
+        if resultado is not None:
+            for clase_id in clases:
+                self._fila_modificada('clases', clase_id)
+            self._fila_modificada('miembros', miembro_id)
+            self.indice_miembros.eliminar(miembro_id)
+            self.estadisticas.invalidate()
+        return resultado
+    
+    def obtener_miembros_busqueda(self):
+        """Obtiene los campos de todos los miembros necesarios para el índice de búsqueda"""
+        query = "SELECT id, nombre, apellido, email, telefono, estado FROM miembros"
+        return self.execute_query(query)
+    
+    def buscar_miembros(self, q, limite=10):
+        """Busca miembros por prefijo de nombre, apellido, email o teléfono"""
+        return self.indice_miembros.buscar(q, limite)
+    
+    # === VERSIONES DE CACHÉ COMPARTIDAS ENTRE WORKERS ===
+    
+    def obtener_version_cache(self, nombre):
+        """Lee el contador de versión de un catálogo (None si no se pudo leer)"""
+        query = "SELECT version FROM cache_versiones WHERE nombre = %s"
+        result = self.execute_query(query, (nombre,))
+        if result is None:
+            return None
+        return result[0]['version'] if result else 0
+    
+    def incrementar_version_cache(self, nombre):
+        """Incrementa el contador de versión para que los demás workers recarguen"""
+        query = """
+            INSERT INTO cache_versiones (nombre, version) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE version = version + 1
+        """
+        return self.execute_query(query, (nombre,), commit=True)
+    
+    # === VERSIONES DE FILA (ETAG) ===
+    
+    TABLAS_ETAG = ('miembros', 'clases', 'pagos', 'usuarios_sistema')
+    
+    def _leer_generaciones_filas(self):
+        query = "SELECT nombre, version FROM cache_versiones WHERE nombre IN (%s, %s, %s, %s)"
+        result = self.execute_query(query, tuple(f'filas_{tabla}' for tabla in self.TABLAS_ETAG))
+        if result is None:
+            return None
+        return {row['nombre'][len('filas_'):]: row['version'] for row in result}
+    
+    def _fila_modificada(self, tabla, fila_id):
+        """Invalida el ETag de una fila en este proceso y avisa a los demás workers"""
+        self.etags.invalidar(tabla, int(fila_id))
+        self.incrementar_version_cache(f'filas_{tabla}')
+    
+    @staticmethod
+    def etag_fila(tabla, fila):
+        """ETag de una fila a partir de su campo version"""
+        if fila.version is None:
+            return None
+        etag = f"{tabla}-{fila.id}-v{fila.version}"
+        if getattr(fila, 'version_miembro', None) is not None:
+            etag += f"-m{fila.version_miembro}"
+        return etag
     
     # === FUNCIONES DE PLANES ===
     
-    def obtener_planes(self):
-        """Obtiene todos los planes de membresía"""
+    def _cargar_catalogo_planes(self):
+        """Carga los planes activos con los beneficios ya separados"""
         query = "SELECT * FROM planes WHERE activo = TRUE ORDER BY duracion_dias"
-        return self.execute_query(query)
+        planes = self.execute_query(query)
+        if planes is None:
+            return None
+        for plan in planes:
+            plan['lista_beneficios'] = [b.strip() for b in (plan.get('beneficios') or '').split('|') if b.strip()]
+        return {
+            'lista': planes,
+            'por_id': {plan['id']: plan for plan in planes}
+        }
+    
+    def _invalidar_planes(self):
+        self.catalogo_planes.invalidate()
+        self.incrementar_version_cache('planes')
+    
+    def obtener_planes(self):
+        """Obtiene todos los planes de membresía activos (desde el catálogo en memoria)"""
+        catalogo = self.catalogo_planes.get()
+        return catalogo['lista'] if catalogo else []
+    
+    def obtener_plan(self, plan_id):
+        """Obtiene un plan activo por id (desde el catálogo en memoria)"""
+        catalogo = self.catalogo_planes.get()
+        if not catalogo:
+            return None
+        try:
+            return catalogo['por_id'].get(int(plan_id))
+        except (TypeError, ValueError):
+            return None
     
     def crear_plan(self, nombre, descripcion, duracion_dias, precio):
         """Crea un nuevo plan de membresía"""
@@ -137,7 +682,23 @@ class Database:
             INSERT INTO planes (nombre, descripcion, duracion_dias, precio)
             VALUES (%s, %s, %s, %s)
         """
-        return self.execute_query(query, (nombre, descripcion, duracion_dias, precio), commit=True)
+        plan_id = self.execute_query(query, (nombre, descripcion, duracion_dias, precio), commit=True)
+        if plan_id:
+            self._invalidar_planes()
+        return plan_id
+    
+    def actualizar_plan(self, plan_id, nombre, descripcion, duracion_dias, precio, beneficios, activo):
+        """Actualiza un plan de membresía existente"""
+        query = """
+            UPDATE planes
+            SET nombre = %s, descripcion = %s, duracion_dias = %s, precio = %s,
+                beneficios = %s, activo = %s
+            WHERE id = %s
+        """
+        resultado = self.execute_query(query, (nombre, descripcion, duracion_dias, precio, beneficios, activo, plan_id), commit=True)
+        if resultado is not None:
+            self._invalidar_planes()
+        return resultado
     
     # === FUNCIONES DE MEMBRESÍAS ===
     
@@ -147,7 +708,13 @@ class Database:
             INSERT INTO membresias (miembro_id, plan_id, fecha_inicio, fecha_fin, monto_pagado)
             VALUES (%s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (miembro_id, plan_id, fecha_inicio, fecha_fin, monto_pagado), commit=True)
+        membresia_id = self.execute_query(query, (miembro_id, plan_id, fecha_inicio, fecha_fin, monto_pagado), commit=True)
+        if membresia_id:
+            self.por_vencer.invalidate()
+            self._sumar_estadistica('membresias_activas')
+            if str(fecha_inicio)[:7] == date.today().strftime('%Y-%m'):
+                self._sumar_estadistica('ingresos_mes', float(monto_pagado or 0))
+        return membresia_id
     
     def obtener_membresias_activas(self):
         """Obtiene todas las membresías activas"""
@@ -159,7 +726,87 @@ class Database:
             WHERE mem.estado = 'activa'
             ORDER BY mem.fecha_fin
         """
-        return self.execute_query(query)
+        return convertir(self.execute_query(query), Membresia)
+    
+    def expirar_membresias_vencidas(self, lote=500, hoy=None):
+        """Marca como 'vencida' cada membresía activa cuyo fecha_fin ya pasó.
+        
+        Trabaja por lotes de ``lote`` filas, cada uno en su propia transacción
+        corta, para no bloquear la tabla mientras atiende peticiones. La versión
+        de los miembros afectados se incrementa en la misma transacción, porque su
+        plan y su vencimiento dejan de aparecer. Devuelve cuántas membresías
+        venció, o None si el primer lote falló.
+        """
+        hoy = hoy or date.today()
+        total = 0
+        while True:
+            def vencer_lote(ejecutar):
+                filas = ejecutar("""
+                    SELECT id, miembro_id FROM membresias
+                    WHERE estado = 'activa' AND fecha_fin < %s
+                    ORDER BY fecha_fin, id
+                    LIMIT %s
+                    FOR UPDATE
+                """, (hoy, lote)).fetchall()
+                if not filas:
+                    return [], []
+                ids = [fila['id'] for fila in filas]
+                miembros = sorted({fila['miembro_id'] for fila in filas})
+                marcadores = ', '.join(['%s'] * len(ids))
+                ejecutar(f"UPDATE membresias SET estado = 'vencida' WHERE id IN ({marcadores})", tuple(ids))
+                marcadores = ', '.join(['%s'] * len(miembros))
+                ejecutar(f"UPDATE miembros SET version = version + 1 WHERE id IN ({marcadores})", tuple(miembros))
+                return ids, miembros
+            
+            resultado = self.en_transaccion(vencer_lote)
+            if resultado is None:
+                break
+            ids, miembros = resultado
+            if ids:
+                total += len(ids)
+                for miembro_id in miembros:
+                    self.etags.invalidar('miembros', miembro_id)
+                self.incrementar_version_cache('filas_miembros')
+            if len(ids) < lote:
+                break
+        if resultado is None and not total:
+            return None
+        if total:
+            self.estadisticas.invalidate()
+            self.por_vencer.invalidate()
+        return total
+    
+    def _cargar_membresias_por_vencer(self):
+        hoy = date.today()
+        query = """
+            SELECT mem.*, m.nombre, m.apellido, p.nombre as plan_nombre
+            FROM membresias mem
+            JOIN miembros m ON mem.miembro_id = m.id
+            JOIN planes p ON mem.plan_id = p.id
+            WHERE mem.estado = 'activa' AND mem.fecha_fin >= %s AND mem.fecha_fin <= %s
+            ORDER BY mem.fecha_fin, mem.id
+        """
+        result = self.execute_query(query, (hoy, hoy + timedelta(days=Config.VENCIMIENTO_AVISO_DIAS)))
+        if result is None:
+            return None
+        return {'fecha': hoy, 'membresias': convertir(result, Membresia)}
+    
+    def obtener_membresias_por_vencer(self, dias=None):
+        """Membresías activas que vencen en los próximos ``dias`` días (como mucho VENCIMIENTO_AVISO_DIAS).
+        
+        Se sirve de una lista precalculada que se recarga cada POR_VENCER_TTL
+        segundos, al cambiar el día o después de vencer membresías.
+        """
+        snapshot = self.por_vencer.get()
+        if snapshot and snapshot['fecha'] != date.today():
+            self.por_vencer.invalidate()
+            snapshot = self.por_vencer.get()
+        if not snapshot:
+            return []
+        if dias is None or dias >= Config.VENCIMIENTO_AVISO_DIAS:
+            return snapshot['membresias']
+        limite = date.today() + timedelta(days=max(dias, 0))
+        return [m for m in snapshot['membresias'] if m.fecha_fin <= limite]
     
     # === FUNCIONES DE ASISTENCIAS ===
     
@@ -169,7 +816,42 @@ class Database:
             INSERT INTO asistencias (miembro_id, tipo)
             VALUES (%s, %s)
         """
-        return self.execute_query(query, (miembro_id, tipo), commit=True)
+        asistencia_id = self.execute_query(query, (miembro_id, tipo), commit=True)
+        if asistencia_id:
+            self._sumar_estadistica('asistencias_hoy')
+        return asistencia_id
+    
+    def filtrar_miembros_activos(self, miembro_ids):
+        """Devuelve el subconjunto de ids que pertenecen a miembros activos (None si falla la consulta).
+        
+        Una sola búsqueda por clave primaria para todo el lote, en el primario: un
+        miembro dado de baja en cualquier worker deja de registrar asistencias
+        en el siguiente lote.
+        """
+        ids = sorted(set(miembro_ids))
+        if not ids:
+            return set()
+        marcadores = ', '.join(['%s'] * len(ids))
+        query = f"SELECT id FROM miembros WHERE id IN ({marcadores}) AND estado = 'activo'"
+        result = self.execute_query(query, tuple(ids), primario=True)
+        return {row['id'] for row in result} if result is not None else None
+    
+    def registrar_asistencias_lote(self, eventos):
+        """Inserta varias asistencias (miembro_id, tipo, fecha_hora) en un solo INSERT.
+        
+        Devuelve los ids asignados, en el mismo orden, como ``range``, o None si falló.
+        """
+        if not eventos:
+            return range(0)
+        query = "INSERT INTO asistencias (miembro_id, tipo, fecha_hora) VALUES (%s, %s, %s)"
+        ids = self.en_transaccion(lambda ejecutar: self._insertar_filas(ejecutar, query, list(eventos)))
+        if ids is None:
+            return None
+        hoy = date.today()
+        de_hoy = sum(1 for _, _, fecha_hora in eventos if fecha_hora.date() == hoy)
+        if de_hoy:
+            self._sumar_estadistica('asistencias_hoy', de_hoy)
+        return ids
     
     def obtener_asistencias_hoy(self):
         """Obtiene las asistencias del día actual"""
@@ -177,10 +859,10 @@ class Database:
             SELECT a.*, m.nombre, m.apellido
             FROM asistencias a
             JOIN miembros m ON a.miembro_id = m.id
-            WHERE DATE(a.fecha_hora) = CURDATE()
+            WHERE a.fecha_hora >= %s AND a.fecha_hora < %s
             ORDER BY a.fecha_hora DESC
         """
-        return self.execute_query(query)
+        return convertir(self.execute_query(query, rango_dia()), Asistencia)
     
     def obtener_asistencias(self, limite=100):
         """Obtiene el historial de asistencias"""
@@ -191,68 +873,200 @@ class Database:
             ORDER BY a.fecha_hora DESC
             LIMIT %s
         """
-        return self.execute_query(query, (limite,))
+        return convertir(self.execute_query(query, (limite,)), Asistencia)
     
     # === FUNCIONES DE LOG ===
     
     def obtener_logs(self, limite=100):
         """Obtiene el registro de actividades"""
-        query = """
-            SELECT l.*, u.username, u.nombre_completo
+        return self.obtener_logs_pagina(limite=limite)['logs']
+    
+    def obtener_logs_pagina(self, cursor=None, limite=100, usuario_id=None, accion=None, tabla_afectada=None,
+                            registro_id=None, desde=None, hasta=None):
+        """Obtiene una página del log, del más reciente al más antiguo, con paginación por llave.
+        
+        ``cursor`` es el par ``(fecha_hora, id)`` de la última fila de la página
+        anterior; cada filtro tiene un índice que termina en (fecha_hora, id).
+        ``desde`` y ``hasta`` forman el rango semiabierto [desde, hasta). El
+        usuario de cada fila sale del mapa de usuarios en memoria, sin JOIN.
+        Devuelve un diccionario con los logs de la página y el cursor de la
+        siguiente (None si es la última).
+        """
+        condiciones = []
+        params = []
+        for columna, valor in (('usuario_id', usuario_id), ('accion', accion),
+                               ('tabla_afectada', tabla_afectada), ('registro_id', registro_id)):
+            if valor is not None:
+                condiciones.append(f"l.{columna} = %s")
+                params.append(valor)
+        if desde is not None:
+            condiciones.append("l.fecha_hora >= %s")
+            params.append(desde)
+        if hasta is not None:
+            condiciones.append("l.fecha_hora < %s")
+            params.append(hasta)
+        if cursor is not None:
+            condiciones.append("(l.fecha_hora < %s OR (l.fecha_hora = %s AND l.id < %s))")
+            params.extend([cursor[0], cursor[0], cursor[1]])
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        params.append(limite + 1)
+        
+        query = f"""
+            SELECT l.*
             FROM log_actividades l
-            JOIN usuarios_sistema u ON l.usuario_id = u.id
-            ORDER BY l.fecha_hora DESC
+            {where}
+            ORDER BY l.fecha_hora DESC, l.id DESC
             LIMIT %s
         """
-        return self.execute_query(query, (limite,))
+        result = self.execute_query(query, tuple(params)) or []
+        
+        # Se pide una fila extra solo para saber si hay otra página
+        hay_mas = len(result) > limite
+        result = result[:limite]
+        usuarios = self.obtener_mapa_usuarios()
+        for row in result:
+            usuario = usuarios.get(row['usuario_id'])
+            row['username'] = usuario['username'] if usuario else None
+            row['nombre_completo'] = usuario['nombre_completo'] if usuario else None
+        
+        return {
+            'logs': convertir(result, LogActividad),
+            'siguiente': (result[-1]['fecha_hora'], result[-1]['id']) if hay_mas else None
+        }
+    
+    def iterar_logs(self, desde, hasta, usuario_id=None, accion=None, chunk_size=1000):
+        """Recorre el log de actividades de un rango de fechas [desde, hasta) por bloques"""
+        condiciones = ["l.fecha_hora >= %s", "l.fecha_hora < %s"]
+        params = [desde, hasta]
+        if usuario_id:
+            condiciones.append("l.usuario_id = %s")
+            params.append(usuario_id)
+        if accion:
+            condiciones.append("l.accion = %s")
+            params.append(accion)
+        query = f"""
+            SELECT l.id, l.fecha_hora, l.accion, l.tabla_afectada, l.detalles, l.ip_address, u.username
+            FROM log_actividades l
+            JOIN usuarios_sistema u ON l.usuario_id = u.id
+            WHERE {' AND '.join(condiciones)}
+            ORDER BY l.fecha_hora, l.id
+        """
+        return self.stream_query(query, tuple(params), chunk_size)
+    
+    # === EXPORTACIONES ===
+    
+    COLUMNAS_EXPORTACION = {
+        'pagos': ['id', 'fecha_pago', 'miembro_id', 'nombre', 'apellido', 'concepto', 'monto',
+                  'metodo_pago', 'estado', 'referencia', 'notas', 'username'],
+        'asistencias': ['id', 'fecha_hora', 'miembro_id', 'nombre', 'apellido', 'tipo'],
+        'miembros': ['id', 'nombre', 'apellido', 'email', 'telefono', 'fecha_nacimiento',
+                     'fecha_inscripcion', 'estado'],
+    }
+    
+    def iterar_pagos(self, desde, hasta, chunk_size=1000):
+        """Recorre los pagos de un rango de fechas [desde, hasta) por bloques"""
+        query = """
+            SELECT p.id, p.fecha_pago, p.miembro_id, m.nombre, m.apellido, p.concepto, p.monto,
+                   p.metodo_pago, p.estado, p.referencia, p.notas, u.username
+            FROM pagos p
+            JOIN miembros m ON p.miembro_id = m.id
+            JOIN usuarios_sistema u ON p.usuario_registro_id = u.id
+            WHERE p.fecha_pago >= %s AND p.fecha_pago < %s
+            ORDER BY p.fecha_pago, p.id
+        """
+        return self.stream_query(query, (desde, hasta), chunk_size)
+    
+    def iterar_asistencias(self, desde, hasta, chunk_size=1000):
+        """Recorre las asistencias de un rango de fechas [desde, hasta) por bloques"""
+        query = """
+            SELECT a.id, a.fecha_hora, a.miembro_id, m.nombre, m.apellido, a.tipo
+            FROM asistencias a
+            JOIN miembros m ON a.miembro_id = m.id
+            WHERE a.fecha_hora >= %s AND a.fecha_hora < %s
+            ORDER BY a.fecha_hora, a.id
+        """
+        return self.stream_query(query, (desde, hasta), chunk_size)
+    
+    def iterar_miembros(self, desde, hasta, chunk_size=1000):
+        """Recorre los miembros inscritos en un rango de fechas [desde, hasta) por bloques"""
+        query = """
+            SELECT id, nombre, apellido, email, telefono, fecha_nacimiento, fecha_inscripcion, estado
+            FROM miembros
+            WHERE fecha_inscripcion >= %s AND fecha_inscripcion < %s
+            ORDER BY id
+        """
+        return self.stream_query(query, (desde, hasta), chunk_size)
     
     # === FUNCIONES DE ESTADÍSTICAS ===
     
-    def obtener_estadisticas(self):
-        """Obtiene estadísticas generales del gimnasio"""
-        stats = {}
-        
-        # Total de miembros activos
-        query = "SELECT COUNT(*) as total FROM miembros WHERE estado = 'activo'"
-        result = self.execute_query(query)
-        stats['miembros_activos'] = result[0]['total'] if result else 0
-        
-        # Membresías activas
-        query = "SELECT COUNT(*) as total FROM membresias WHERE estado = 'activa'"
-        result = self.execute_query(query)
-        stats['membresias_activas'] = result[0]['total'] if result else 0
-        
-        # Asistencias hoy
-        query = "SELECT COUNT(*) as total FROM asistencias WHERE DATE(fecha_hora) = CURDATE()"
-        result = self.execute_query(query)
-        stats['asistencias_hoy'] = result[0]['total'] if result else 0
-        
-        # Ingresos del mes
+    def _calcular_estadisticas(self):
+        """Calcula todas las estadísticas generales en una sola consulta"""
+        hoy = date.today()
         query = """
-            SELECT COALESCE(SUM(monto_pagado), 0) as total 
-            FROM membresias 
-            WHERE MONTH(fecha_inicio) = MONTH(CURDATE()) 
-            AND YEAR(fecha_inicio) = YEAR(CURDATE())
+            SELECT
+                (SELECT COUNT(*) FROM miembros WHERE estado = 'activo') as miembros_activos,
+                (SELECT COUNT(*) FROM membresias WHERE estado = 'activa') as membresias_activas,
+                (SELECT COUNT(*) FROM asistencias
+                 WHERE fecha_hora >= %s AND fecha_hora < %s) as asistencias_hoy,
+                (SELECT COALESCE(SUM(monto_pagado), 0) FROM membresias
+                 WHERE fecha_inicio >= %s AND fecha_inicio < %s) as ingresos_mes
         """
-        result = self.execute_query(query)
-        stats['ingresos_mes'] = float(result[0]['total']) if result else 0.0
+        params = rango_dia(hoy) + rango_mes(hoy)
+        result = self.execute_query(query, params)
+        if not result:
+            return None
+        row = result[0]
+        return {
+            'fecha': hoy,
+            'miembros_activos': int(row['miembros_activos']),
+            'membresias_activas': int(row['membresias_activas']),
+            'asistencias_hoy': int(row['asistencias_hoy']),
+            'ingresos_mes': float(row['ingresos_mes'])
+        }
+    
+    def obtener_estadisticas(self):
+        """Obtiene estadísticas generales del gimnasio (en caché por ESTADISTICAS_TTL segundos)"""
+        entrada = self.estadisticas.get_entry()
+        if entrada and entrada[0]['fecha'] != date.today():
+            # Cambió el día: los contadores de hoy y del mes ya no aplican
+            self.estadisticas.invalidate()
+            entrada = self.estadisticas.get_entry()
+        
+        if not entrada:
+            stats = {'miembros_activos': 0, 'membresias_activas': 0, 'asistencias_hoy': 0, 'ingresos_mes': 0.0}
+            stats['generado_en'] = None
+            stats['edad_segundos'] = None
+            return stats
         
+        snapshot, generado_en, edad = entrada
+        stats = {k: v for k, v in snapshot.items() if k != 'fecha'}
+        stats['generado_en'] = generado_en.isoformat(timespec='seconds')
+        stats['edad_segundos'] = round(edad, 1)
         return stats
     
+    def _sumar_estadistica(self, campo, cantidad=1):
+        """Actualiza en sitio un contador del snapshot de estadísticas"""
+        def actualizar(stats):
+            stats[campo] += cantidad
+        self.estadisticas.update(actualizar)
+    
     # === FUNCIONES DE CLASES ===
     
+    # clases.inscritos cuenta las inscripciones activas. Se mantiene en la misma
+    # transacción que cada inscripción o baja: primero se bloquea la fila de la
+    # clase, así las inscripciones de una misma clase se ejecutan en orden.
+    # Cuando la clase está llena las inscripciones quedan con estado 'espera' y
+    # se promueven por orden de llegada al liberarse un lugar.
+    
     def obtener_clases(self):
         """Obtiene todas las clases disponibles"""
-        query = """
-            SELECT c.*, 
-                   COUNT(ic.id) as inscritos
-            FROM clases c
-            LEFT JOIN inscripciones_clases ic ON c.id = ic.clase_id AND ic.estado = 'activa'
-            WHERE c.activo = TRUE
-            GROUP BY c.id
-            ORDER BY c.nombre
-        """
-        return self.execute_query(query)
+        query = "SELECT * FROM clases WHERE activo = TRUE ORDER BY nombre"
+        return convertir(self.execute_query(query), Clase)
+    
+    def obtener_clase(self, clase_id):
+        """Obtiene una clase específica"""
+        query = "SELECT * FROM clases WHERE id = %s"
+        return convertir_una(self.execute_query(query, (clase_id,)), Clase)
     
     def crear_clase(self, nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana):
         """Crea una nueva clase"""
@@ -263,38 +1077,139 @@ class Database:
         return self.execute_query(query, (nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana), commit=True)
     
     def actualizar_clase(self, clase_id, nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana):
-        """Actualiza una clase existente"""
+        """Actualiza una clase existente. Si aumenta el cupo se promueve la lista de espera"""
         query = """
             UPDATE clases 
             SET nombre = %s, descripcion = %s, instructor = %s, duracion_minutos = %s,
-                cupo_maximo = %s, horario = %s, dias_semana = %s
+                cupo_maximo = %s, horario = %s, dias_semana = %s, version = version + 1
             WHERE id = %s
         """
-        return self.execute_query(query, (nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana, clase_id), commit=True)
+        def actualizar(ejecutar):
+            filas = ejecutar(query, (nombre, descripcion, instructor, duracion_minutos, cupo_maximo, horario, dias_semana, clase_id)).rowcount
+            self._promover_lista_espera(ejecutar, clase_id)
+            return filas
+        
+        resultado = self.en_transaccion(actualizar)
+        if resultado is not None:
+            self._fila_modificada('clases', clase_id)
+        return resultado
     
     def eliminar_clase(self, clase_id):
         """Desactiva una clase"""
-        query = "UPDATE clases SET activo = FALSE WHERE id = %s"
-        return self.execute_query(query, (clase_id,), commit=True)
+        query = "UPDATE clases SET activo = FALSE, version = version + 1 WHERE id = %s"
+        resultado = self.execute_query(query, (clase_id,), commit=True)
+        if resultado is not None:
+            self._fila_modificada('clases', clase_id)
+        return resultado
+    
+    @staticmethod
+    def _promover_lista_espera(ejecutar, clase_id):
+        """Pasa a 'activa' las inscripciones en espera mientras haya lugar. Devuelve las promovidas"""
+        promovidas = []
+        while True:
+            siguiente = ejecutar("""
+                SELECT id, miembro_id FROM inscripciones_clases
+                WHERE clase_id = %s AND estado = 'espera'
+                ORDER BY id LIMIT 1 FOR UPDATE
+            """, (clase_id,)).fetchone()
+            if siguiente is None:
+                return promovidas
+            lugar = ejecutar("""
+                UPDATE clases SET inscritos = inscritos + 1, version = version + 1
+                WHERE id = %s AND activo = TRUE AND inscritos < cupo_maximo
+            """, (clase_id,)).rowcount
+            if not lugar:
+                return promovidas
+            ejecutar("UPDATE inscripciones_clases SET estado = 'activa' WHERE id = %s", (siguiente['id'],))
+            promovidas.append(siguiente)
+    
+    def _liberar_lugar(self, ejecutar, clase_id, lugares=1):
+        """Descuenta inscripciones activas de la clase y promueve la lista de espera"""
+        ejecutar("""
+            UPDATE clases SET inscritos = GREATEST(CAST(inscritos AS SIGNED) - %s, 0), version = version + 1
+            WHERE id = %s
+        """, (lugares, clase_id))
+        return self._promover_lista_espera(ejecutar, clase_id)
     
     def inscribir_miembro_clase(self, miembro_id, clase_id):
-        """Inscribe un miembro a una clase"""
-        query = """
-            INSERT INTO inscripciones_clases (miembro_id, clase_id)
-            VALUES (%s, %s)
+        """Inscribe un miembro a una clase, o a su lista de espera si está llena.
+        
+        El lugar se reserva con un UPDATE condicional sobre ``inscritos``, así dos
+        recepciones inscribiendo a la vez nunca pasan del cupo. Devuelve
+        ``(inscripcion_id, estado)`` con estado 'activa', 'espera' o
+        'ya_inscrito' (el miembro ya estaba inscrito o en espera), o
+        ``(None, None)`` si la clase no existe, está inactiva o hubo un error.
         """
-        return self.execute_query(query, (miembro_id, clase_id), commit=True)
+        def inscribir(ejecutar):
+            # Bloquea la clase (también si está llena) antes de revisar la inscripción
+            clase = ejecutar("SELECT activo FROM clases WHERE id = %s FOR UPDATE", (clase_id,)).fetchone()
+            if clase is None or not clase['activo']:
+                return None, None
+            existente = ejecutar("""
+                SELECT id FROM inscripciones_clases
+                WHERE miembro_id = %s AND clase_id = %s AND estado IN ('activa', 'espera')
+                LIMIT 1
+            """, (miembro_id, clase_id)).fetchone()
+            if existente is not None:
+                return existente['id'], 'ya_inscrito'
+            lugar = ejecutar("""
+                UPDATE clases SET inscritos = inscritos + 1, version = version + 1
+                WHERE id = %s AND inscritos < cupo_maximo
+            """, (clase_id,)).rowcount
+            estado = 'activa' if lugar else 'espera'
+            inscripcion_id = ejecutar(
+                "INSERT INTO inscripciones_clases (miembro_id, clase_id, estado) VALUES (%s, %s, %s)",
+                (miembro_id, clase_id, estado)
+            ).lastrowid
+            return inscripcion_id, estado
+        
+        resultado = self.en_transaccion(inscribir)
+        if resultado is None:
+            return None, None
+        if resultado[1] == 'activa':
+            self._fila_modificada('clases', clase_id)
+        return resultado
+    
+    def cancelar_inscripcion(self, inscripcion_id):
+        """Cancela una inscripción activa o en espera.
+        
+        Si ocupaba un lugar, el primero de la lista de espera lo toma en la misma
+        transacción. Devuelve ``(clase_id, promovidas)`` con la lista de
+        inscripciones promovidas, o None si no existe, ya estaba cancelada o
+        hubo un error.
+        """
+        fila = self.execute_query("SELECT clase_id FROM inscripciones_clases WHERE id = %s",
+                                  (inscripcion_id,), primario=True)
+        if not fila:
+            return None
+        clase_id = fila[0]['clase_id']
+        
+        def cancelar(ejecutar):
+            ejecutar("SELECT id FROM clases WHERE id = %s FOR UPDATE", (clase_id,))
+            inscripcion = ejecutar("SELECT estado FROM inscripciones_clases WHERE id = %s FOR UPDATE",
+                                   (inscripcion_id,)).fetchone()
+            if inscripcion is None or inscripcion['estado'] not in ('activa', 'espera'):
+                return None
+            ejecutar("UPDATE inscripciones_clases SET estado = 'cancelada' WHERE id = %s", (inscripcion_id,))
+            if inscripcion['estado'] == 'espera':
+                return clase_id, []
+            return clase_id, self._liberar_lugar(ejecutar, clase_id)
+        
+        resultado = self.en_transaccion(cancelar)
+        if resultado is not None:
+            self._fila_modificada('clases', clase_id)
+        return resultado
     
     def obtener_inscripciones_clase(self, clase_id):
-        """Obtiene los miembros inscritos en una clase"""
+        """Obtiene los miembros inscritos en una clase y su lista de espera, en orden de llegada"""
         query = """
             SELECT ic.*, m.nombre, m.apellido
             FROM inscripciones_clases ic
             JOIN miembros m ON ic.miembro_id = m.id
-            WHERE ic.clase_id = %s AND ic.estado = 'activa'
-            ORDER BY ic.fecha_inscripcion
+            WHERE ic.clase_id = %s AND ic.estado IN ('activa', 'espera')
+            ORDER BY ic.estado, ic.id
         """
-        return self.execute_query(query, (clase_id,))
+        return convertir(self.execute_query(query, (clase_id,)), InscripcionClase)
     
     # === FUNCIONES DE PAGOS ===
     
@@ -308,15 +1223,67 @@ class Database:
             ORDER BY p.fecha_pago DESC
             LIMIT %s
         """
-        return self.execute_query(query, (limite,))
+        return convertir(self.execute_query(query, (limite,)), Pago)
+    
+    # Los totales de ingresos se leen de ingresos_diarios (un renglón por día,
+    # método y concepto), que se ajusta en la misma transacción que el pago
     
-    def registrar_pago(self, miembro_id, concepto, monto, metodo_pago, usuario_id, referencia=None, notas=None):
-        """Registra un nuevo pago"""
+    CONSULTA_PAGO_INGRESOS = """
+        SELECT fecha_pago, metodo_pago, concepto, monto, estado
+        FROM pagos WHERE id = %s FOR UPDATE
+    """
+    
+    @staticmethod
+    def _ajustar_ingresos(ejecutar, pago, signo):
+        """Suma (signo 1) o resta (signo -1) un pago en el acumulado de su día"""
+        if pago['estado'] != 'completado':
+            return
+        ejecutar("""
+            INSERT INTO ingresos_diarios (dia, metodo_pago, concepto, total, pagos)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE total = total + VALUES(total), pagos = pagos + VALUES(pagos)
+        """, (pago['fecha_pago'].date(), pago['metodo_pago'], pago['concepto'],
+              signo * pago['monto'], signo))
+    
+    def registrar_pago(self, miembro_id, concepto, monto, metodo_pago, usuario_id, referencia=None, notas=None,
+                       clave_idempotencia=None):
+        """Registra un nuevo pago. Devuelve ``(pago_id, nuevo)``.
+        
+        Si ``clave_idempotencia`` ya se usó (un reintento o un doble clic) no se
+        inserta nada y se devuelve el id del pago original con ``nuevo`` falso.
+        Si falla devuelve ``(None, False)``.
+        """
         query = """
-            INSERT INTO pagos (miembro_id, concepto, monto, metodo_pago, usuario_registro_id, referencia, notas)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            INSERT INTO pagos (miembro_id, concepto, monto, metodo_pago, usuario_registro_id, referencia, notas,
+                               clave_idempotencia)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        return self.execute_query(query, (miembro_id, concepto, monto, metodo_pago, usuario_id, referencia, notas), commit=True)
+        def registrar(ejecutar):
+            try:
+                pago_id = ejecutar(query, (miembro_id, concepto, monto, metodo_pago, usuario_id, referencia, notas,
+                                           clave_idempotencia)).lastrowid
+            except Error as e:
+                if clave_idempotencia is None or e.errno != ER_DUP_ENTRY:
+                    raise
+                # Lectura con bloqueo: ve la fila aunque la haya confirmado otra transacción
+                original = ejecutar("SELECT id FROM pagos WHERE clave_idempotencia = %s FOR UPDATE",
+                                    (clave_idempotencia,)).fetchone()
+                if original is None:
+                    raise
+                return original['id'], False
+            # Se relee la fila para usar la fecha y el monto tal como los guardó MySQL
+            pago = ejecutar(self.CONSULTA_PAGO_INGRESOS, (pago_id,)).fetchone()
+            self._ajustar_ingresos(ejecutar, pago, 1)
+            return pago_id, True
+        
+        resultado = self.en_transaccion(registrar)
+        if resultado is None:
+            return None, False
+        pago_id, nuevo = resultado
+        if nuevo:
+            self.estadisticas.invalidate()
+            self._agregar_pago_reciente(pago_id, int(miembro_id), concepto, monto, clave_idempotencia)
+        return pago_id, nuevo
     
     def obtener_pagos_miembro(self, miembro_id):
         """Obtiene el historial de pagos de un miembro específico"""
@@ -327,34 +1294,91 @@ class Database:
             WHERE p.miembro_id = %s
             ORDER BY p.fecha_pago DESC
         """
-        return self.execute_query(query, (miembro_id,))
+        return convertir(self.execute_query(query, (miembro_id,)), Pago)
     
     def obtener_ingresos_totales(self):
-        """Obtiene estadísticas de ingresos"""
-        stats = {}
-        
-        # Ingresos del día
-        query = "SELECT COALESCE(SUM(monto), 0) as total FROM pagos WHERE DATE(fecha_pago) = CURDATE() AND estado = 'completado'"
-        result = self.execute_query(query)
-        stats['ingresos_hoy'] = float(result[0]['total']) if result else 0.0
-        
-        # Ingresos del mes
+        """Obtiene los ingresos del día, del mes y del año desde el acumulado diario"""
+        hoy = date.today()
         query = """
-            SELECT COALESCE(SUM(monto), 0) as total 
-            FROM pagos 
-            WHERE MONTH(fecha_pago) = MONTH(CURDATE()) 
-            AND YEAR(fecha_pago) = YEAR(CURDATE())
-            AND estado = 'completado'
+            SELECT COALESCE(SUM(CASE WHEN dia = %s THEN total END), 0) as hoy,
+                   COALESCE(SUM(CASE WHEN dia >= %s THEN total END), 0) as mes,
+                   COALESCE(SUM(total), 0) as anio
+            FROM ingresos_diarios
+            WHERE dia >= %s AND dia < %s
+        """
+        result = self.execute_query(query, (hoy, rango_mes(hoy)[0]) + rango_anio(hoy))
+        row = result[0] if result else {}
+        return {
+            'ingresos_hoy': float(row.get('hoy', 0)),
+            'ingresos_mes': float(row.get('mes', 0)),
+            'ingresos_anio': float(row.get('anio', 0))
+        }
+    
+    def reconciliar_ingresos(self, desde=None, hasta=None, reconstruir=True):
+        """Compara ingresos_diarios con la suma real de pagos y, si se pide, lo reconstruye.
+        
+        ``desde`` y ``hasta`` (inclusive) limitan los días revisados; sin ellos se
+        revisa todo el historial. Devuelve un diccionario con los grupos revisados
+        y la lista de diferencias (día, método y concepto con los valores
+        esperados y guardados), o None si alguna consulta falló. La
+        reconstrucción borra y recalcula los días del rango en una transacción.
+        """
+        condiciones_pagos, condiciones_dias, params = ["estado = 'completado'"], [], []
+        if desde is not None:
+            condiciones_pagos.append("fecha_pago >= %s")
+            condiciones_dias.append("dia >= %s")
+            params.append(desde)
+        if hasta is not None:
+            condiciones_pagos.append("fecha_pago < %s")
+            condiciones_dias.append("dia < %s")
+            params.append(hasta + timedelta(days=1))
+        where_pagos = ' AND '.join(condiciones_pagos)
+        where_dias = ('WHERE ' + ' AND '.join(condiciones_dias)) if condiciones_dias else ''
+        query_pagos = f"""
+            SELECT DATE(fecha_pago) as dia, metodo_pago, concepto, SUM(monto) as total, COUNT(*) as pagos
+            FROM pagos
+            WHERE {where_pagos}
+            GROUP BY DATE(fecha_pago), metodo_pago, concepto
         """
-        result = self.execute_query(query)
-        stats['ingresos_mes'] = float(result[0]['total']) if result else 0.0
         
-        # Ingresos del año
-        query = "SELECT COALESCE(SUM(monto), 0) as total FROM pagos WHERE YEAR(fecha_pago) = YEAR(CURDATE()) AND estado = 'completado'"
-        result = self.execute_query(query)
-        stats['ingresos_anio'] = float(result[0]['total']) if result else 0.0
+        # Contra el primario: el retraso de la réplica aparecería como diferencia
+        esperadas = self.execute_query(query_pagos, tuple(params), primario=True)
+        guardadas = self.execute_query(
+            f"SELECT dia, metodo_pago, concepto, total, pagos FROM ingresos_diarios {where_dias}",
+            tuple(params), primario=True
+        )
+        if esperadas is None or guardadas is None:
+            return None
         
-        return stats
+        def por_clave(filas):
+            return {(f['dia'], f['metodo_pago'], f['concepto']): (f['total'], int(f['pagos']))
+                    for f in filas if f['pagos'] or f['total']}
+        esperadas, guardadas = por_clave(esperadas), por_clave(guardadas)
+        diferencias = []
+        for clave in sorted(esperadas.keys() | guardadas.keys()):
+            esperado = esperadas.get(clave, (0, 0))
+            guardado = guardadas.get(clave, (0, 0))
+            if esperado != guardado:
+                dia, metodo_pago, concepto = clave
+                diferencias.append({
+                    'dia': dia, 'metodo_pago': metodo_pago, 'concepto': concepto,
+                    'total_esperado': esperado[0], 'total_guardado': guardado[0],
+                    'pagos_esperados': esperado[1], 'pagos_guardados': guardado[1]
+                })
+        
+        reconstruido = False
+        if diferencias and reconstruir:
+            def reconstruir_rango(ejecutar):
+                ejecutar(f"DELETE FROM ingresos_diarios {where_dias}", tuple(params))
+                ejecutar(f"""
+                    INSERT INTO ingresos_diarios (dia, metodo_pago, concepto, total, pagos)
+                    {query_pagos}
+                """, tuple(params))
+                return True
+            reconstruido = bool(self.en_transaccion(reconstruir_rango))
+            if reconstruido:
+                self.estadisticas.invalidate()
+        return {'grupos': len(esperadas), 'diferencias': diferencias, 'reconstruido': reconstruido}
     
     # === FUNCIONES ADICIONALES DE USUARIOS ===
     
@@ -362,15 +1386,23 @@ class Database:
         """Actualiza un usuario del sistema"""
         query = """
             UPDATE usuarios_sistema 
-            SET nombre_completo = %s, rol = %s, email = %s, activo = %s
+            SET nombre_completo = %s, rol = %s, email = %s, activo = %s, version = version + 1
             WHERE id = %s
         """
-        return self.execute_query(query, (nombre_completo, rol, email, activo, usuario_id), commit=True)
+        resultado = self.execute_query(query, (nombre_completo, rol, email, activo, usuario_id), commit=True)
+        if resultado is not None:
+            self._fila_modificada('usuarios_sistema', usuario_id)
+            self._invalidar_usuarios()
+        return resultado
     
     def eliminar_usuario(self, usuario_id):
         """Elimina un usuario del sistema (solo administrador)"""
         query = "DELETE FROM usuarios_sistema WHERE id = %s"
-        return self.execute_query(query, (usuario_id,), commit=True)
+        resultado = self.execute_query(query, (usuario_id,), commit=True)
+        if resultado is not None:
+            self._fila_modificada('usuarios_sistema', usuario_id)
+            self._invalidar_usuarios()
+        return resultado
     
     # === FUNCIONES ADICIONALES DE PAGOS ===
     
@@ -378,42 +1410,95 @@ class Database:
         """Actualiza un pago existente"""
         query = """
             UPDATE pagos 
-            SET concepto = %s, monto = %s, metodo_pago = %s, referencia = %s, notas = %s
+            SET concepto = %s, monto = %s, metodo_pago = %s, referencia = %s, notas = %s,
+                version = version + 1
             WHERE id = %s
         """
-        return self.execute_query(query, (concepto, monto, metodo_pago, referencia, notas, pago_id), commit=True)
+        def actualizar(ejecutar):
+            anterior = ejecutar(self.CONSULTA_PAGO_INGRESOS, (pago_id,)).fetchone()
+            filas = ejecutar(query, (concepto, monto, metodo_pago, referencia, notas, pago_id)).rowcount
+            if anterior is not None:
+                self._ajustar_ingresos(ejecutar, anterior, -1)
+                self._ajustar_ingresos(ejecutar, ejecutar(self.CONSULTA_PAGO_INGRESOS, (pago_id,)).fetchone(), 1)
+            return filas
+        
+        resultado = self.en_transaccion(actualizar)
+        if resultado is not None:
+            self._fila_modificada('pagos', pago_id)
+            self.estadisticas.invalidate()
+            self.pagos_recientes.invalidate()
+        return resultado
     
     def eliminar_pago(self, pago_id):
         """Elimina un pago"""
-        query = "DELETE FROM pagos WHERE id = %s"
-        return self.execute_query(query, (pago_id,), commit=True)
+        def eliminar(ejecutar):
+            anterior = ejecutar(self.CONSULTA_PAGO_INGRESOS, (pago_id,)).fetchone()
+            if anterior is None:
+                return 0
+            self._ajustar_ingresos(ejecutar, anterior, -1)
+            return ejecutar("DELETE FROM pagos WHERE id = %s", (pago_id,)).rowcount
+        
+        resultado = self.en_transaccion(eliminar)
+        if resultado is not None:
+            self._fila_modificada('pagos', pago_id)
+            self.estadisticas.invalidate()
+            self.pagos_recientes.invalidate()
+        return resultado
     
-    def verificar_pago_duplicado(self, miembro_id, concepto, monto):
-        """Verifica si existe un pago similar en las últimas 24 horas"""
+    def _cargar_pagos_recientes(self):
+        """Pagos de la ventana de duplicados agrupados por miembro"""
         query = """
-            SELECT COUNT(*) as total
+            SELECT id, miembro_id, concepto, monto, fecha_pago, clave_idempotencia
             FROM pagos
-            WHERE miembro_id = %s 
-            AND concepto = %s 
-            AND monto = %s 
-            AND fecha_pago >= DATE_SUB(NOW(), INTERVAL 24 HOUR)
+            WHERE fecha_pago >= %s
+        """
+        result = self.execute_query(query, (datetime.now() - timedelta(hours=Config.PAGO_DUPLICADO_HORAS),))
+        if result is None:
+            return None
+        recientes = {}
+        for row in result:
+            recientes.setdefault(row['miembro_id'], []).append(row)
+        return recientes
+    
+    def _agregar_pago_reciente(self, pago_id, miembro_id, concepto, monto, clave_idempotencia):
+        """Agrega un pago recién registrado a la ventana y descarta los que ya salieron de ella"""
+        limite = datetime.now() - timedelta(hours=Config.PAGO_DUPLICADO_HORAS)
+        pago = {'id': pago_id, 'miembro_id': miembro_id, 'concepto': concepto, 'monto': Decimal(str(monto)),
+                'fecha_pago': datetime.now(), 'clave_idempotencia': clave_idempotencia}
+        
+        def agregar(recientes):
+            pagos = [p for p in recientes.get(miembro_id, []) if p['fecha_pago'] >= limite]
+            pagos.append(pago)
+            recientes[miembro_id] = pagos
+        self.pagos_recientes.update(agregar)
+    
+    def verificar_pago_duplicado(self, miembro_id, concepto, monto, clave_idempotencia=None):
+        """Verifica si existe un pago similar en las últimas PAGO_DUPLICADO_HORAS horas.
+        
+        Se responde con la ventana de pagos recientes en memoria, sin consultar la
+        base en cada pago. Un pago con la misma clave de idempotencia no cuenta:
+        es un reintento y registrar_pago devolverá el original.
         """
-        result = self.execute_query(query, (miembro_id, concepto, monto))
-        return result[0]['total'] > 0 if result else False
+        recientes = self.pagos_recientes.get() or {}
+        limite = datetime.now() - timedelta(hours=Config.PAGO_DUPLICADO_HORAS)
+        monto = Decimal(str(monto))
+        return any(
+            p['concepto'] == concepto and p['monto'] == monto and p['fecha_pago'] >= limite
+            and (clave_idempotencia is None or p['clave_idempotencia'] != clave_idempotencia)
+            for p in recientes.get(int(miembro_id), [])
+        )
     
     def obtener_pago(self, pago_id):
         """Obtiene un pago específico"""
         query = """
-            SELECT p.*, m.nombre, m.apellido
+            SELECT p.*, m.nombre, m.apellido, m.version AS version_miembro
             FROM pagos p
             JOIN miembros m ON p.miembro_id = m.id
             WHERE p.id = %s
         """
-        result = self.execute_query(query, (pago_id,))
-        return result[0] if result else None
+        return convertir_una(self.execute_query(query, (pago_id,)), Pago)
     
     def obtener_usuario(self, usuario_id):
         """Obtiene un usuario específico"""
         query = "SELECT * FROM usuarios_sistema WHERE id = %s"
-        result = self.execute_query(query, (usuario_id,))
-        return result[0] if result else None
\ No newline at end of file
+        return convertir_una(self.execute_query(query, (usuario_id,)), UsuarioSistema)
\ No newline at end of file
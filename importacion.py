@@ -0,0 +1,249 @@
+"""Importación masiva de miembros desde CSV.
+
+El archivo se lee fila por fila, sin cargarlo completo en memoria. Cada fila
+se valida y se compara contra el índice de búsqueda en memoria y contra las
+filas anteriores del mismo archivo para descartar emails o teléfonos ya
+registrados. Las filas válidas se insertan por lotes de ``lote`` filas, cada
+uno con un solo executemany en su propia transacción. Al final se escribe una
+sola entrada de resumen en el log de actividades.
+
+Un candado de MySQL (GET_LOCK) impide dos importaciones a la vez, para que
+los duplicados entre archivos se detecten aunque lleguen a workers distintos.
+"""
+import csv
+import io
+import itertools
+import re
+from datetime import date, datetime
+
+from mysql.connector import Error
+
+from busqueda import normalizar
+
+CANDADO = 'gimnasio_importacion_miembros'
+COLUMNAS = ('nombre', 'apellido', 'email', 'telefono', 'fecha_nacimiento', 'fecha_inscripcion')
+OBLIGATORIAS = ('nombre', 'apellido')
+# Otros nombres de columna habituales en exportaciones de otros sistemas
+ALIAS = {'e_mail': 'email', 'correo': 'email', 'correo_electronico': 'email',
+         'tel': 'telefono', 'celular': 'telefono', 'apellidos': 'apellido'}
+# Largo máximo de cada columna en la tabla miembros
+LARGOS = {'nombre': 100, 'apellido': 100, 'email': 150, 'telefono': 30}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y')
+EMAIL_VALIDO = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+class ImportacionError(Exception):
+    """El archivo no se puede importar"""
+
+
+class ImportacionEnCurso(ImportacionError):
+    """Otro proceso tiene el candado de importación"""
+
+
+def _leer_fecha(texto):
+    try:
+        return date.fromisoformat(texto)
+    except ValueError:
+        pass
+    for formato in FORMATOS_FECHA[1:]:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(texto)
+
+
+def leer_csv(archivo):
+    """Genera ``(linea, fila)`` de un CSV binario, con la fila como diccionario por columna.
+
+    Acepta ``,`` o ``;`` como separador (Excel en español usa ``;``) y un BOM
+    UTF-8 al inicio. Los nombres de columna se comparan sin mayúsculas, acentos
+    ni signos, y admiten los alias de ``ALIAS``; las columnas desconocidas se ignoran.
+    """
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    primera = texto.readline()
+    separador = ';' if primera.count(';') > primera.count(',') else ','
+    lector = csv.reader(itertools.chain([primera], texto), delimiter=separador)
+    try:
+        encabezado = [re.sub(r'[^a-z0-9]+', '_', normalizar(nombre)).strip('_') for nombre in next(lector)]
+        encabezado = [ALIAS.get(nombre, nombre) for nombre in encabezado]
+    except StopIteration:
+        raise ImportacionError("El archivo está vacío")
+    faltantes = [columna for columna in OBLIGATORIAS if columna not in encabezado]
+    if faltantes:
+        raise ImportacionError(f"Faltan columnas obligatorias: {', '.join(faltantes)}")
+    posiciones = {columna: encabezado.index(columna) for columna in COLUMNAS if columna in encabezado}
+    for valores in lector:
+        if not any(valor.strip() for valor in valores):
+            continue
+        yield lector.line_num, {
+            columna: valores[i].strip() if i < len(valores) else ''
+            for columna, i in posiciones.items()
+        }
+
+
+def validar_fila(fila, hoy):
+    """Devuelve la tupla a insertar en miembros; lanza ValueError con el motivo si la fila no es válida"""
+    for columna in OBLIGATORIAS:
+        if not fila.get(columna):
+            raise ValueError(f"Falta {columna}")
+    for columna, largo in LARGOS.items():
+        if len(fila.get(columna) or '') > largo:
+            raise ValueError(f"{columna} supera {largo} caracteres")
+    email = (fila.get('email') or '').lower() or None
+    if email and not EMAIL_VALIDO.match(email):
+        raise ValueError("Email inválido")
+    telefono = fila.get('telefono') or None
+    if telefono and len(re.sub(r'\D', '', telefono)) < 7:
+        raise ValueError("Teléfono inválido")
+    fecha_nacimiento = None
+    if fila.get('fecha_nacimiento'):
+        try:
+            fecha_nacimiento = _leer_fecha(fila['fecha_nacimiento'])
+        except ValueError:
+            raise ValueError("fecha_nacimiento inválida (AAAA-MM-DD o DD/MM/AAAA)")
+        if fecha_nacimiento > hoy:
+            raise ValueError("fecha_nacimiento en el futuro")
+    fecha_inscripcion = hoy
+    if fila.get('fecha_inscripcion'):
+        try:
+            fecha_inscripcion = _leer_fecha(fila['fecha_inscripcion'])
+        except ValueError:
+            raise ValueError("fecha_inscripcion inválida (AAAA-MM-DD o DD/MM/AAAA)")
+    return (fila['nombre'], fila['apellido'], email, telefono, fecha_nacimiento, fecha_inscripcion)
+
+
+def importar_miembros(db, archivo, usuario_id, ip_address=None, lote=1000, max_errores=1000, solo_validar=False):
+    """Importa los miembros de un CSV binario y devuelve un resumen.
+
+    El resumen tiene ``filas`` leídas, ``importados``, ``rechazados``, los
+    ``ids`` asignados como rangos ``[primero, cantidad, paso]`` y hasta ``max_errores``
+    errores ``{'linea', 'error'}`` (todos si es None). Con ``solo_validar`` no se
+    inserta nada. Lanza ImportacionError si el encabezado no sirve o si ya hay
+    otra importación en curso.
+    """
+    conn = db.pool.acquire()
+    roto = False
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, 0)", (CANDADO,))
+        (obtenido,) = cursor.fetchone()
+        if not obtenido:
+            raise ImportacionEnCurso("Ya hay otra importación de miembros en curso")
+        try:
+            resumen = _importar(db, archivo, lote, max_errores, solo_validar)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (CANDADO,))
+            cursor.fetchone()
+    except Error as e:
+        roto = not conn.is_connected()
+        raise ImportacionError(f"Error de base de datos: {e}")
+    finally:
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                roto = True
+        db.pool.release(conn, discard=roto)
+
+    if resumen['ids']:
+        db.registrar_log(
+            usuario_id=usuario_id,
+            accion='CREATE',
+            tabla_afectada='miembros',
+            registro_id=resumen['ids'][0][0],
+            detalles=(f"Importación CSV: {resumen['importados']} miembros importados, "
+                      f"{resumen['rechazados']} filas rechazadas (ids {_describir_rangos(resumen['ids'])})"),
+            ip_address=ip_address
+        )
+    return resumen
+
+
+def _agregar_rangos(rangos, ids):
+    """Agrega los ids de un lote (un ``range``) a una lista de rangos ``[primero, cantidad, paso]``.
+
+    El rango llega tal como lo devuelve ``Database._insertar_filas``, con el
+    ``auto_increment_increment`` de la conexión como paso. Solo se une al
+    rango anterior si tiene el mismo paso y empieza justo donde aquel termina.
+    """
+    if not ids:
+        return
+    if rangos:
+        primero, cantidad, paso = rangos[-1]
+        if paso == ids.step and primero + cantidad * paso == ids.start:
+            rangos[-1][1] += len(ids)
+            return
+    rangos.append([ids.start, len(ids), ids.step])
+
+
+def _describir_rangos(rangos, maximo=20):
+    partes = []
+    for primero, cantidad, paso in rangos[:maximo]:
+        ultimo = primero + (cantidad - 1) * paso
+        if cantidad == 1:
+            partes.append(str(primero))
+        elif paso == 1:
+            partes.append(f"{primero}-{ultimo}")
+        else:
+            partes.append(f"{primero}-{ultimo} de {paso} en {paso}")
+    if len(rangos) > maximo:
+        partes.append(f"y {len(rangos) - maximo} rangos más")
+    return ', '.join(partes)
+
+
+def _importar(db, archivo, lote, max_errores, solo_validar):
+    hoy = date.today()
+    resumen = {'filas': 0, 'importados': 0, 'rechazados': 0, 'ids': [], 'errores': []}
+    # Emails y teléfonos ya vistos en este archivo -> línea donde aparecieron
+    emails = {}
+    telefonos = {}
+    pendientes = []
+
+    def rechazar(linea, motivo):
+        resumen['rechazados'] += 1
+        if max_errores is None or len(resumen['errores']) < max_errores:
+            resumen['errores'].append({'linea': linea, 'error': motivo})
+
+    def guardar():
+        filas = [miembro for _, miembro in pendientes]
+        ids = db.insertar_miembros_lote(filas) if not solo_validar else range(0)
+        if ids is None:
+            for linea, _ in pendientes:
+                rechazar(linea, "Error al guardar el lote")
+        else:
+            resumen['importados'] += len(filas)
+            _agregar_rangos(resumen['ids'], ids)
+        pendientes.clear()
+
+    # El índice de búsqueda se recarga para ver también las altas de otros workers
+    db.indice_miembros.recargar()
+    for linea, fila in leer_csv(archivo):
+        resumen['filas'] += 1
+        try:
+            miembro = validar_fila(fila, hoy)
+        except ValueError as e:
+            rechazar(linea, str(e))
+            continue
+        email, telefono = miembro[2], miembro[3]
+        digitos = re.sub(r'\D', '', telefono or '')
+        if email and email in emails:
+            rechazar(linea, f"Email repetido en la línea {emails[email]}")
+            continue
+        if digitos and digitos in telefonos:
+            rechazar(linea, f"Teléfono repetido en la línea {telefonos[digitos]}")
+            continue
+        existente = db.indice_miembros.buscar_contacto(email, telefono)
+        if existente is not None:
+            rechazar(linea, f"Email o teléfono ya registrado (miembro {existente})")
+            continue
+        if email:
+            emails[email] = linea
+        if digitos:
+            telefonos[digitos] = linea
+        pendientes.append((linea, miembro))
+        if len(pendientes) >= lote:
+            guardar()
+    if pendientes:
+        guardar()
+    return resumen
@@ -0,0 +1,168 @@
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+
+slow_query_logger = logging.getLogger('fitgym.slow_query')
+
+_RE_CADENAS = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_RE_NUMEROS = re.compile(r"\b\d+(?:\.\d+)?\b")
+_RE_LISTAS = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))+\s*\)")
+_RE_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_sql(query):
+    """Reduce una consulta a su forma canónica para agrupar las que solo difieren en valores"""
+    sql = _RE_CADENAS.sub('?', query)
+    sql = _RE_NUMEROS.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _RE_LISTAS.sub('(?, ...)', sql)
+    return _RE_ESPACIOS.sub(' ', sql).strip()
+
+
+def configurar_slow_query_log(archivo=None):
+    """Envía el log de consultas lentas a un archivo (o a stderr) como una línea JSON por consulta"""
+    if slow_query_logger.handlers:
+        return
+    handler = logging.FileHandler(archivo) if archivo else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    slow_query_logger.addHandler(handler)
+    slow_query_logger.setLevel(logging.WARNING)
+    slow_query_logger.propagate = False
+
+
+class MetricasConsultas:
+    """Mide las consultas de cada petición y acumula totales por endpoint.
+
+    ``iniciar``/``terminar`` delimitan la petición del hilo actual; ``registrar``
+    lo llama Database después de cada consulta.
+    """
+
+    def __init__(self, umbral_lento_ms=200):
+        self.umbral_lento_ms = umbral_lento_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._por_endpoint = {}
+
+    def iniciar(self, endpoint):
+        self._local.actual = {
+            'endpoint': endpoint,
+            'inicio': time.perf_counter(),
+            'consultas': 0,
+            'tiempo_ms': 0.0,
+            'mas_lenta_ms': 0.0,
+            'mas_lenta': None,
+            'filas_lote': 0,
+            'paralelo_ms': 0.0,
+            'tareas_paralelas': 0,
+        }
+
+    def actual(self):
+        return getattr(self._local, 'actual', None)
+
+    def terminar(self):
+        """Cierra la medición de la petición actual y la acumula en su endpoint"""
+        actual = self.actual()
+        self._local.actual = None
+        if actual is None:
+            return None
+        with self._lock:
+            total = self._por_endpoint.setdefault(actual['endpoint'], {
+                'peticiones': 0, 'consultas': 0, 'tiempo_ms': 0.0, 'max_tiempo_ms': 0.0, 'paralelo_ms': 0.0,
+                'duracion_ms': 0.0, 'filas_lote': 0
+            })
+            total['peticiones'] += 1
+            total['duracion_ms'] += (time.perf_counter() - actual['inicio']) * 1000
+            total['consultas'] += actual['consultas']
+            total['tiempo_ms'] += actual['tiempo_ms']
+            total['filas_lote'] += actual['filas_lote']
+            total['paralelo_ms'] += actual['paralelo_ms']
+            total['max_tiempo_ms'] = max(total['max_tiempo_ms'], actual['tiempo_ms'])
+        return actual
+
+    def separar(self):
+        """Quita la medición del hilo actual sin acumularla (para tareas en otros hilos)"""
+        actual = self.actual()
+        self._local.actual = None
+        return actual
+
+    def sumar(self, parcial):
+        """Suma a la petición actual lo medido por una tarea en otro hilo"""
+        actual = self.actual()
+        if actual is None or parcial is None:
+            return
+        actual['consultas'] += parcial['consultas']
+        actual['tiempo_ms'] += parcial['tiempo_ms']
+        actual['filas_lote'] += parcial['filas_lote']
+        if parcial['mas_lenta_ms'] > actual['mas_lenta_ms']:
+            actual['mas_lenta_ms'] = parcial['mas_lenta_ms']
+            actual['mas_lenta'] = parcial['mas_lenta']
+
+    def registrar_paralelo(self, tareas, duracion):
+        """Registra el tiempo de reloj de un grupo de tareas ejecutadas a la vez"""
+        actual = self.actual()
+        if actual is not None:
+            actual['tareas_paralelas'] += tareas
+            actual['paralelo_ms'] += duracion * 1000
+
+    def registrar(self, query, params, duracion, varios=False):
+        """Registra una consulta; con ``varios`` los ``params`` son las filas de un executemany"""
+        ms = duracion * 1000
+        if varios:
+            filas = len(params) if params else 0
+            num_parametros = len(params[0]) if filas else 0
+        else:
+            filas = 1
+            num_parametros = len(params) if params else 0
+        actual = self.actual()
+        if actual is not None:
+            actual['consultas'] += 1
+            actual['tiempo_ms'] += ms
+            if varios:
+                actual['filas_lote'] += filas
+            if ms > actual['mas_lenta_ms']:
+                actual['mas_lenta_ms'] = ms
+                actual['mas_lenta'] = query
+        if ms >= self.umbral_lento_ms:
+            slow_query_logger.warning(json.dumps({
+                'ts': datetime.now().isoformat(timespec='milliseconds'),
+                'endpoint': actual['endpoint'] if actual else threading.current_thread().name,
+                'duracion_ms': round(ms, 2),
+                'sql': normalizar_sql(query),
+                'filas': filas,
+                'num_parametros': num_parametros,
+            }, ensure_ascii=False))
+
+    def server_timing(self):
+        """Valor del encabezado Server-Timing para la petición actual"""
+        actual = self.actual()
+        if actual is None:
+            return None
+        valor = f'db;dur={actual["tiempo_ms"]:.2f};desc="{actual["consultas"]} consultas"'
+        valor += f', app;dur={(time.perf_counter() - actual["inicio"]) * 1000:.2f}'
+        if actual['mas_lenta'] is not None:
+            valor += f', db-lenta;dur={actual["mas_lenta_ms"]:.2f}'
+        if actual['tareas_paralelas']:
+            # db suma el tiempo de todas las consultas; paralelo es lo que se esperó realmente
+            valor += f', paralelo;dur={actual["paralelo_ms"]:.2f};desc="{actual["tareas_paralelas"]} tareas"'
+        return valor
+
+    def resumen(self):
+        """Totales acumulados por endpoint, con promedios"""
+        with self._lock:
+            resumen = {}
+            for endpoint, total in self._por_endpoint.items():
+                peticiones = total['peticiones'] or 1
+                resumen[endpoint] = dict(
+                    total,
+                    consultas_promedio=round(total['consultas'] / peticiones, 2),
+                    tiempo_promedio_ms=round(total['tiempo_ms'] / peticiones, 2),
+                    duracion_promedio_ms=round(total['duracion_ms'] / peticiones, 2),
+                    tiempo_ms=round(total['tiempo_ms'], 2),
+                    paralelo_ms=round(total['paralelo_ms'], 2),
+                    duracion_ms=round(total['duracion_ms'], 2),
+                    max_tiempo_ms=round(total['max_tiempo_ms'], 2),
+                )
+            return resumen
@@ -0,0 +1,495 @@
+"""Migraciones versionadas del esquema de la base de datos.
+
+Cada migración es una tupla ``(version, descripcion, pasos)``. Un paso puede ser
+una sentencia SQL o una función que recibe el cursor. Las versiones aplicadas se
+guardan en la tabla ``schema_migrations``. Las migraciones nuevas se agregan al
+final de MIGRACIONES con la siguiente versión; nunca se modifican las ya publicadas.
+"""
+import inspect
+from datetime import date, datetime
+
+from mysql.connector import Error
+
+from config import Config
+from retencion import definicion_particion, sumar_meses
+
+
+def indice(tabla, nombre, columnas, unico=False):
+    """Paso que crea un índice solo si todavía no existe"""
+    def paso(cursor):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """, (tabla, nombre))
+        if cursor.fetchone()[0]:
+            return
+        tipo = 'UNIQUE INDEX' if unico else 'INDEX'
+        cursor.execute(f"CREATE {tipo} {nombre} ON {tabla} ({columnas})")
+    paso.descripcion = f"{nombre} ON {tabla} ({columnas})"
+    return paso
+
+
+def columna(tabla, nombre, definicion):
+    """Paso que agrega una columna solo si todavía no existe"""
+    def paso(cursor):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (tabla, nombre))
+        if cursor.fetchone()[0]:
+            return
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {definicion}")
+    paso.descripcion = f"{tabla}.{nombre}"
+    return paso
+
+
+def particionar_logs(cursor):
+    """Paso que particiona log_actividades por mes, desde su fila más antigua.
+
+    La llave primaria pasa a (id, fecha_hora) porque MySQL exige que la columna
+    de partición forme parte de cada llave única. Reescribe la tabla completa,
+    así que en tablas grandes conviene aplicarla fuera de horario.
+    """
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = 'log_actividades' AND partition_name IS NOT NULL
+    """)
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute("SELECT MIN(fecha_hora) FROM log_actividades")
+    (minima,) = cursor.fetchone()
+    actual = date.today().replace(day=1)
+    mes = minima.date().replace(day=1) if minima else actual
+    definiciones = []
+    while mes <= sumar_meses(actual, Config.LOG_PARTICIONES_ADELANTE):
+        definiciones.append(definicion_particion(mes))
+        mes = sumar_meses(mes, 1)
+    definiciones.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    cursor.execute("ALTER TABLE log_actividades DROP PRIMARY KEY, ADD PRIMARY KEY (id, fecha_hora)")
+    cursor.execute(f"ALTER TABLE log_actividades PARTITION BY RANGE COLUMNS(fecha_hora) ({', '.join(definiciones)})")
+particionar_logs.descripcion = "log_actividades PARTITION BY RANGE COLUMNS(fecha_hora)"
+
+
+ESQUEMA_INICIAL = [
+    """
+    CREATE TABLE IF NOT EXISTS usuarios_sistema (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        nombre_completo VARCHAR(150) NOT NULL,
+        rol ENUM('administrador', 'encargado', 'consulta') NOT NULL DEFAULT 'consulta',
+        email VARCHAR(150),
+        activo BOOLEAN NOT NULL DEFAULT TRUE,
+        fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS miembros (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        apellido VARCHAR(100) NOT NULL,
+        email VARCHAR(150),
+        telefono VARCHAR(30),
+        fecha_nacimiento DATE,
+        fecha_inscripcion DATE NOT NULL,
+        estado ENUM('activo', 'suspendido', 'inactivo') NOT NULL DEFAULT 'activo'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS planes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        descripcion TEXT,
+        duracion_dias INT NOT NULL,
+        precio DECIMAL(10, 2) NOT NULL,
+        beneficios TEXT,
+        activo BOOLEAN NOT NULL DEFAULT TRUE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS membresias (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        miembro_id INT NOT NULL,
+        plan_id INT NOT NULL,
+        fecha_inicio DATE NOT NULL,
+        fecha_fin DATE NOT NULL,
+        monto_pagado DECIMAL(10, 2) NOT NULL DEFAULT 0,
+        estado VARCHAR(20) NOT NULL DEFAULT 'activa',
+        FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE,
+        FOREIGN KEY (plan_id) REFERENCES planes(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS asistencias (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        miembro_id INT NOT NULL,
+        fecha_hora DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        tipo ENUM('entrada', 'salida') NOT NULL DEFAULT 'entrada',
+        FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS clases (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        nombre VARCHAR(100) NOT NULL,
+        descripcion TEXT,
+        instructor VARCHAR(100),
+        duracion_minutos INT,
+        cupo_maximo INT NOT NULL DEFAULT 20,
+        horario VARCHAR(50),
+        dias_semana VARCHAR(100),
+        activo BOOLEAN NOT NULL DEFAULT TRUE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inscripciones_clases (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        miembro_id INT NOT NULL,
+        clase_id INT NOT NULL,
+        fecha_inscripcion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        estado VARCHAR(20) NOT NULL DEFAULT 'activa',
+        FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE,
+        FOREIGN KEY (clase_id) REFERENCES clases(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pagos (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        miembro_id INT NOT NULL,
+        concepto VARCHAR(150) NOT NULL,
+        monto DECIMAL(10, 2) NOT NULL,
+        metodo_pago VARCHAR(30) NOT NULL,
+        fecha_pago DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        estado VARCHAR(20) NOT NULL DEFAULT 'completado',
+        referencia VARCHAR(100),
+        notas TEXT,
+        usuario_registro_id INT NOT NULL,
+        FOREIGN KEY (miembro_id) REFERENCES miembros(id) ON DELETE CASCADE,
+        FOREIGN KEY (usuario_registro_id) REFERENCES usuarios_sistema(id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS log_actividades (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        accion VARCHAR(30) NOT NULL,
+        tabla_afectada VARCHAR(50) NOT NULL,
+        registro_id INT,
+        detalles TEXT,
+        ip_address VARCHAR(45),
+        fecha_hora DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+MIGRACIONES = [
+    (1, 'Esquema inicial', ESQUEMA_INICIAL),
+    (2, 'Índices para las consultas frecuentes', [
+        indice('miembros', 'idx_miembros_estado', 'estado, id'),
+        indice('membresias', 'idx_membresias_estado_fin', 'estado, fecha_fin'),
+        indice('membresias', 'idx_membresias_miembro_estado', 'miembro_id, estado'),
+        indice('membresias', 'idx_membresias_inicio', 'fecha_inicio'),
+        indice('asistencias', 'idx_asistencias_fecha', 'fecha_hora'),
+        indice('pagos', 'idx_pagos_estado_fecha', 'estado, fecha_pago'),
+        indice('pagos', 'idx_pagos_fecha', 'fecha_pago'),
+        indice('pagos', 'idx_pagos_miembro_fecha', 'miembro_id, fecha_pago'),
+        indice('log_actividades', 'idx_log_fecha', 'fecha_hora'),
+        indice('inscripciones_clases', 'idx_inscripciones_clase_estado', 'clase_id, estado'),
+        indice('clases', 'idx_clases_activo_nombre', 'activo, nombre'),
+    ]),
+    (3, 'Contadores de versión para cachés compartidas entre workers', [
+        """
+        CREATE TABLE IF NOT EXISTS cache_versiones (
+            nombre VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (4, 'Versión de fila para los ETag de la API', [
+        columna('miembros', 'version', 'INT UNSIGNED NOT NULL DEFAULT 1'),
+        columna('clases', 'version', 'INT UNSIGNED NOT NULL DEFAULT 1'),
+        columna('pagos', 'version', 'INT UNSIGNED NOT NULL DEFAULT 1'),
+        columna('usuarios_sistema', 'version', 'INT UNSIGNED NOT NULL DEFAULT 1'),
+    ]),
+    (5, 'Sesiones del lado del servidor', [
+        """
+        CREATE TABLE IF NOT EXISTS sesiones (
+            id VARCHAR(64) PRIMARY KEY,
+            usuario_id INT NULL,
+            datos TEXT NOT NULL,
+            expira DATETIME NOT NULL,
+            INDEX idx_sesiones_expira (expira),
+            INDEX idx_sesiones_usuario (usuario_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+    ]),
+    (6, 'Acumulado diario de ingresos por método y concepto', [
+        """
+        CREATE TABLE IF NOT EXISTS ingresos_diarios (
+            dia DATE NOT NULL,
+            metodo_pago VARCHAR(30) NOT NULL,
+            concepto VARCHAR(150) NOT NULL,
+            total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            pagos INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, metodo_pago, concepto)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+        """,
+        # Carga inicial desde el historial; repetirla deja los mismos valores
+        """
+        INSERT INTO ingresos_diarios (dia, metodo_pago, concepto, total, pagos)
+        SELECT DATE(fecha_pago), metodo_pago, concepto, SUM(monto), COUNT(*)
+        FROM pagos
+        WHERE estado = 'completado'
+        GROUP BY DATE(fecha_pago), metodo_pago, concepto
+        ON DUPLICATE KEY UPDATE total = VALUES(total), pagos = VALUES(pagos)
+        """,
+    ]),
+    (7, 'Clave de idempotencia de los pagos', [
+        columna('pagos', 'clave_idempotencia', 'VARCHAR(64) NULL'),
+        indice('pagos', 'uq_pagos_clave_idempotencia', 'clave_idempotencia', unico=True),
+    ]),
+    (8, 'Contador de inscritos por clase y lista de espera', [
+        columna('clases', 'inscritos', 'INT UNSIGNED NOT NULL DEFAULT 0'),
+        indice('inscripciones_clases', 'idx_inscripciones_miembro_clase', 'miembro_id, clase_id, estado'),
+        """
+        UPDATE clases c
+        SET inscritos = (SELECT COUNT(*) FROM inscripciones_clases ic
+                         WHERE ic.clase_id = c.id AND ic.estado = 'activa')
+        """,
+    ]),
+    (9, 'Particiones mensuales del log de actividades', [
+        particionar_logs,
+    ]),
+    (10, 'Índices para filtrar y paginar el log de actividades', [
+        indice('log_actividades', 'idx_log_usuario_fecha', 'usuario_id, fecha_hora, id'),
+        indice('log_actividades', 'idx_log_accion_fecha', 'accion, fecha_hora, id'),
+        indice('log_actividades', 'idx_log_tabla_registro_fecha', 'tabla_afectada, registro_id, fecha_hora, id'),
+    ]),
+    (11, 'Versión de revocación de las sesiones de cada usuario', [
+        columna('usuarios_sistema', 'sesiones_version', 'INT UNSIGNED NOT NULL DEFAULT 0'),
+        columna('sesiones', 'usuario_version', 'INT UNSIGNED NULL'),
+        # Las sesiones abiertas siguen válidas con la versión inicial
+        "UPDATE sesiones SET usuario_version = 0 WHERE usuario_id IS NOT NULL AND usuario_version IS NULL",
+    ]),
+]
+
+
+def versiones_aplicadas(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(200) NOT NULL,
+            aplicada_en DATETIME NOT NULL
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrar(db, hasta=None, salida=print):
+    """Aplica en orden las migraciones pendientes. Devuelve la lista de versiones aplicadas"""
+    conn = db.pool.acquire()
+    aplicadas = []
+    try:
+        cursor = conn.cursor()
+        hechas = versiones_aplicadas(cursor)
+        for version, descripcion, pasos in MIGRACIONES:
+            if version in hechas or (hasta is not None and version > hasta):
+                continue
+            salida(f"Aplicando migración {version}: {descripcion}")
+            # MySQL confirma implícitamente cada DDL, por eso los pasos deben ser idempotentes
+            for paso in pasos:
+                if callable(paso):
+                    paso(cursor)
+                else:
+                    cursor.execute(paso)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, descripcion, aplicada_en) VALUES (%s, %s, %s)",
+                (version, descripcion, datetime.now())
+            )
+            conn.commit()
+            aplicadas.append(version)
+        cursor.close()
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        db.pool.release(conn)
+    if not aplicadas:
+        salida("El esquema ya está actualizado")
+    return aplicadas
+
+
+def estado(db):
+    """Devuelve [(version, descripcion, aplicada)] para todas las migraciones conocidas"""
+    conn = db.pool.acquire()
+    try:
+        cursor = conn.cursor()
+        hechas = versiones_aplicadas(cursor)
+        conn.commit()
+        cursor.close()
+    finally:
+        db.pool.release(conn)
+    return [(version, descripcion, version in hechas) for version, descripcion, _ in MIGRACIONES]
+
+
+# === REVISIÓN DE PLANES DE EJECUCIÓN ===
+
+PREFIJOS_CONSULTA = ('obtener_', 'verificar_', 'buscar_', 'filtrar_', 'iterar_',
+                     '_calcular_', '_cargar_', '_leer_')
+
+# Escrituras cuyas lecturas (SELECT ... FOR UPDATE, UPDATE con condición)
+# van dentro de en_transaccion y también conviene revisar
+METODOS_TRANSACCIONALES = (
+    'registrar_pago', 'actualizar_pago', 'eliminar_pago', 'inscribir_miembro_clase',
+    'cancelar_inscripcion', 'actualizar_clase', 'eliminar_miembro', 'expirar_membresias_vencidas',
+    'reconciliar_ingresos',
+)
+
+# Recorridos completos que son a propósito: (método, tabla) -> motivo
+ESCANEOS_ESPERADOS = {
+    ('obtener_miembros_busqueda', 'miembros'): 'carga completa del índice de búsqueda',
+    ('iterar_miembros', 'miembros'): 'exportación por fecha de inscripción, sin índice propio',
+    ('reconciliar_ingresos', 'pagos'): 'sin rango revisa todo el historial',
+    ('reconciliar_ingresos', 'ingresos_diarios'): 'sin rango revisa todo el historial',
+}
+
+VALORES_EJEMPLO = {
+    'username': 'admin',
+    'password': 'x',
+    'concepto': 'Membresía',
+    'monto': 0,
+    'q': 'a',
+    'desde': date(2000, 1, 1),
+    'hasta': date(2000, 2, 1),
+}
+
+
+def _argumentos_ejemplo(metodo):
+    """Construye argumentos de ejemplo a partir de la firma del método"""
+    args = []
+    for nombre, param in inspect.signature(metodo).parameters.items():
+        if param.default is not inspect.Parameter.empty:
+            break
+        if nombre in VALORES_EJEMPLO:
+            args.append(VALORES_EJEMPLO[nombre])
+        elif nombre.endswith('id'):
+            args.append(1)
+        else:
+            args.append('x')
+    return args
+
+
+class _CursorCaptura:
+    """Cursor de en_transaccion durante la captura: no devuelve filas"""
+    lastrowid = 0
+    rowcount = 0
+
+    def fetchone(self):
+        return None
+
+    def fetchall(self):
+        return []
+
+
+class _BitacoraCaptura:
+    def registrar(self, entrada):
+        pass
+
+
+def _instancia_de_captura(db, registrar):
+    """Copia de ``db`` que anota sus consultas en lugar de ejecutarlas.
+
+    Tiene cachés propias (vacías), así que la captura no deja resultados vacíos
+    en las cachés de ``db``, y no usa el pool, la réplica ni el log de actividades.
+    """
+    espia = object.__new__(type(db))
+    espia.__dict__.update(db.__dict__)
+    espia.replica = None
+    espia.log_writer = _BitacoraCaptura()
+    espia._crear_caches()
+
+    def ejecutar(query, params, commit, replica=False, filas_afectadas=False):
+        registrar(query, params)
+        return (None if commit else []), None
+
+    def stream_query(query, params=None, chunk_size=1000, primario=False):
+        registrar(query, params)
+        return iter(())
+
+    def en_transaccion(funcion):
+        cursor = _CursorCaptura()
+
+        def ejecutar_en_transaccion(query, params=None, varios=False):
+            # De un executemany basta con la primera fila
+            registrar(query, (params[0] if params else ()) if varios else params)
+            return cursor
+        return funcion(ejecutar_en_transaccion)
+
+    espia._ejecutar = ejecutar
+    espia.stream_query = stream_query
+    espia.en_transaccion = en_transaccion
+    return espia
+
+
+def capturar_consultas(db):
+    """Ejecuta los métodos de lectura de Database sin tocar la base y devuelve sus consultas.
+
+    Devuelve una lista de (metodo, query, params).
+    """
+    capturadas = []
+    actual = None
+
+    def registrar(query, params=None):
+        capturadas.append((actual, query, params or ()))
+
+    espia = _instancia_de_captura(db, registrar)
+    for nombre in sorted(dir(espia)):
+        if not (nombre.startswith(PREFIJOS_CONSULTA) or nombre in METODOS_TRANSACCIONALES):
+            continue
+        metodo = getattr(espia, nombre)
+        if not callable(metodo):
+            continue
+        actual = nombre
+        try:
+            resultado = metodo(*_argumentos_ejemplo(metodo))
+            if inspect.isgenerator(resultado):
+                for _ in resultado:
+                    pass
+        except Exception as e:
+            print(f"  (no se pudo capturar {nombre}: {e})")
+    return capturadas
+
+
+def revisar_consultas(db, tablas_pequenas=('planes', 'usuarios_sistema', 'clases', 'cache_versiones'),
+                      esperados=ESCANEOS_ESPERADOS):
+    """Ejecuta EXPLAIN sobre cada consulta de Database y señala los recorridos completos.
+
+    Los recorridos de ``esperados`` no se informan. Devuelve una lista de
+    hallazgos (metodo, tabla, tipo, filas, extra).
+    """
+    hallazgos = []
+    conn = db.pool.acquire()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        for metodo, query, params in capturar_consultas(db):
+            try:
+                cursor.execute("EXPLAIN " + query, params)
+                plan = cursor.fetchall()
+            except Error as e:
+                hallazgos.append((metodo, None, 'ERROR', None, str(e)))
+                continue
+            for fila in plan:
+                tabla = fila.get('table') or ''
+                extra = fila.get('Extra') or ''
+                if (metodo, tabla) in esperados:
+                    continue
+                if fila.get('type') == 'ALL' and not tabla.startswith('<') and tabla not in tablas_pequenas:
+                    hallazgos.append((metodo, tabla, 'ALL', fila.get('rows'), extra))
+                elif 'Using filesort' in extra and tabla not in tablas_pequenas:
+                    hallazgos.append((metodo, tabla, fila.get('type'), fila.get('rows'), extra))
+        conn.commit()
+        cursor.close()
+    finally:
+        db.pool.release(conn)
+    return hallazgos
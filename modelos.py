@@ -0,0 +1,138 @@
+"""Modelos tipados de las filas que devuelve Database.
+
+Las filas se convierten con ``msgspec.convert``: las columnas que no están
+declaradas en el modelo se descartan, así que campos ocultos como
+``usuarios_sistema.password`` nunca llegan a la API aunque la consulta use
+``SELECT *``. Los campos opcionales al final de cada modelo vienen de los JOIN
+de algunas consultas.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+import msgspec
+
+
+class Miembro(msgspec.Struct, kw_only=True):
+    id: int
+    nombre: str
+    apellido: str
+    email: Optional[str] = None
+    telefono: Optional[str] = None
+    fecha_nacimiento: Optional[date] = None
+    fecha_inscripcion: Optional[date] = None
+    estado: str = 'activo'
+    version: Optional[int] = None
+    plan_actual: Optional[str] = None
+    vencimiento_membresia: Optional[date] = None
+
+
+class Membresia(msgspec.Struct, kw_only=True):
+    id: int
+    miembro_id: int
+    plan_id: int
+    fecha_inicio: date
+    fecha_fin: date
+    monto_pagado: Decimal = Decimal(0)
+    estado: str = 'activa'
+    nombre: Optional[str] = None
+    apellido: Optional[str] = None
+    plan_nombre: Optional[str] = None
+
+
+class Pago(msgspec.Struct, kw_only=True):
+    id: int
+    miembro_id: int
+    concepto: str
+    monto: Decimal
+    metodo_pago: str
+    fecha_pago: datetime
+    estado: str = 'completado'
+    referencia: Optional[str] = None
+    notas: Optional[str] = None
+    usuario_registro_id: Optional[int] = None
+    version: Optional[int] = None
+    nombre: Optional[str] = None
+    apellido: Optional[str] = None
+    username: Optional[str] = None
+    version_miembro: Optional[int] = None
+
+
+class Clase(msgspec.Struct, kw_only=True):
+    id: int
+    nombre: str
+    descripcion: Optional[str] = None
+    instructor: Optional[str] = None
+    duracion_minutos: Optional[int] = None
+    cupo_maximo: int = 20
+    horario: Optional[str] = None
+    dias_semana: Optional[str] = None
+    activo: bool = True
+    version: Optional[int] = None
+    inscritos: int = 0
+
+
+class InscripcionClase(msgspec.Struct, kw_only=True):
+    id: int
+    miembro_id: int
+    clase_id: int
+    fecha_inscripcion: datetime
+    estado: str = 'activa'
+    nombre: Optional[str] = None
+    apellido: Optional[str] = None
+
+
+class Asistencia(msgspec.Struct, kw_only=True):
+    id: int
+    miembro_id: int
+    fecha_hora: datetime
+    tipo: str = 'entrada'
+    nombre: Optional[str] = None
+    apellido: Optional[str] = None
+
+
+class LogActividad(msgspec.Struct, kw_only=True):
+    id: int
+    usuario_id: int
+    accion: str
+    tabla_afectada: str
+    fecha_hora: datetime
+    registro_id: Optional[int] = None
+    detalles: Optional[str] = None
+    ip_address: Optional[str] = None
+    username: Optional[str] = None
+    nombre_completo: Optional[str] = None
+
+
+class UsuarioSistema(msgspec.Struct, kw_only=True):
+    id: int
+    username: str
+    nombre_completo: str
+    rol: str
+    email: Optional[str] = None
+    activo: bool = True
+    fecha_creacion: Optional[datetime] = None
+    version: Optional[int] = None
+
+
+def convertir(filas, modelo):
+    """Convierte las filas de execute_query en una lista de ``modelo`` (None si la consulta falló)"""
+    if filas is None:
+        return None
+    # strict=False acepta los 0/1 de las columnas BOOLEAN de MySQL
+    return msgspec.convert(filas, list[modelo], strict=False)
+
+
+def convertir_una(filas, modelo):
+    """Como convertir, pero devuelve solo la primera fila (o None)"""
+    if not filas:
+        return None
+    return msgspec.convert(filas[0], modelo, strict=False)
+
+
+def a_json(datos):
+    """Codifica modelos, diccionarios y listas a JSON (bytes).
+
+    Las fechas salen en ISO 8601 y los Decimal como texto para no perder precisión.
+    """
+    return msgspec.json.encode(datos)
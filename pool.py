@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeout(Error):
+    """Se agotó el tiempo de espera para obtener una conexión del pool"""
+
+
+class ConnectionPool:
+    """Pool de conexiones MySQL seguro entre hilos.
+
+    Mantiene entre ``min_size`` y ``max_size`` conexiones abiertas. Las
+    conexiones ociosas se verifican con un ping solo cuando llevan más de
+    ``ping_interval`` segundos sin usarse, en lugar de hacerlo en cada consulta.
+    """
+
+    def __init__(self, config, min_size=2, max_size=10, timeout=10, ping_interval=30, max_idle=300):
+        self.config = config
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self.max_idle = max_idle
+
+        self._lock = threading.Lock()
+        self._disponible = threading.Condition(self._lock)
+        self._idle = deque()  # (conexion, momento en que se devolvió)
+        self._size = 0
+        self._closed = False
+        self._primed = False
+
+        # Estadísticas
+        self._in_use = 0
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _new_connection(self):
+        return mysql.connector.connect(**self.config)
+
+    def fill(self):
+        """Abre conexiones hasta alcanzar el tamaño mínimo"""
+        self._primed = True
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._new_connection()
+            except Error:
+                with self._lock:
+                    self._size -= 1
+                    self._disponible.notify()
+                raise
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+                self._disponible.notify()
+
+    def _healthy(self, conn, idle_since):
+        """Verifica una conexión ociosa solo si lleva tiempo sin usarse"""
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=None):
+        """Obtiene una conexión del pool, esperando si todas están en uso"""
+        timeout = self.timeout if timeout is None else timeout
+        if not self._primed:
+            # El pool se llena en el primer uso (después del fork de gunicorn)
+            try:
+                self.fill()
+            except Error as e:
+                print(f"Error al llenar el pool de conexiones: {e}")
+        inicio = time.monotonic()
+        limite = inicio + timeout
+
+        while True:
+            conn = None
+            crear = False
+            with self._lock:
+                if self._closed:
+                    raise Error(msg="El pool de conexiones está cerrado")
+                while not self._idle and self._size >= self.max_size:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(msg=f"Sin conexiones disponibles tras {timeout}s (max_size={self.max_size})")
+                    self._waiting += 1
+                    try:
+                        self._disponible.wait(restante)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    self._size += 1
+                    crear = True
+
+            if crear:
+                try:
+                    conn = self._new_connection()
+                except Error:
+                    with self._lock:
+                        self._size -= 1
+                        self._disponible.notify()
+                    raise
+            elif not self._healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._lock:
+                self._in_use += 1
+                self._checkouts += 1
+                self._wait_total += espera
+                self._wait_max = max(self._wait_max, espera)
+            return conn
+
+    def release(self, conn, discard=False):
+        """Devuelve una conexión al pool (o la descarta si está dañada)"""
+        with self._lock:
+            self._in_use -= 1
+        if discard or self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self._disponible.notify()
+        self._prune()
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._lock:
+            self._size -= 1
+            self._discarded += 1
+            self._disponible.notify()
+
+    def _prune(self):
+        """Cierra conexiones ociosas por encima del mínimo que excedan max_idle"""
+        ahora = time.monotonic()
+        viejas = []
+        with self._lock:
+            # Las más antiguas están al inicio de la cola
+            while self._idle and self._size > self.min_size and ahora - self._idle[0][1] > self.max_idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                viejas.append(conn)
+        for conn in viejas:
+            self._close_quietly(conn)
+
+    def close(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevas solicitudes"""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._disponible.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Devuelve las estadísticas actuales del pool"""
+        with self._lock:
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_total_ms': round(self._wait_total * 1000, 3),
+                'wait_avg_ms': round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
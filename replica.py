@@ -0,0 +1,104 @@
+import threading
+import time
+
+from mysql.connector import Error
+
+from pool import ConnectionPool
+
+
+class Replica:
+    """Pool de una réplica de lectura con verificación periódica de su estado.
+
+    ``disponible`` consulta el retraso de replicación como mucho una vez cada
+    ``check_interval`` segundos. La réplica deja de usarse si está caída, si la
+    replicación está detenida o si va más de ``max_lag`` segundos atrás; se
+    vuelve a probar en la siguiente verificación.
+    """
+
+    def __init__(self, config, pool_config, max_lag=5, check_interval=5):
+        self.pool = ConnectionPool(config, **pool_config)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._ok = False
+        self._checked_at = None
+        self.lag = None
+        self.motivo = None
+        self.lecturas = 0
+        self.fallos = 0
+
+    def _leer_lag(self, conn):
+        """Segundos de retraso de la réplica; 0 si el servidor no replica de nadie"""
+        cursor = conn.cursor(dictionary=True)
+        try:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                campo = 'Seconds_Behind_Source'
+            except Error:
+                # MySQL anterior a 8.0.22
+                cursor.execute("SHOW SLAVE STATUS")
+                campo = 'Seconds_Behind_Master'
+            filas = cursor.fetchall()
+        finally:
+            cursor.close()
+        if not filas:
+            return 0
+        # NULL significa que el hilo de replicación está detenido
+        return filas[0].get(campo)
+
+    def _verificar(self):
+        conn = None
+        broken = False
+        try:
+            conn = self.pool.acquire(timeout=1)
+            lag = self._leer_lag(conn)
+        except Error as e:
+            if conn is not None:
+                broken = not conn.is_connected()
+            self.lag = None
+            self.motivo = f"sin conexión: {e}"
+            return False
+        finally:
+            if conn is not None:
+                self.pool.release(conn, discard=broken)
+        self.lag = lag
+        if lag is None:
+            self.motivo = 'replicación detenida'
+            return False
+        if lag > self.max_lag:
+            self.motivo = f'retraso de {lag}s'
+            return False
+        self.motivo = None
+        return True
+
+    def disponible(self):
+        """Indica si las lecturas pueden ir a la réplica en este momento"""
+        ahora = time.monotonic()
+        if self._checked_at is not None and ahora - self._checked_at < self.check_interval:
+            return self._ok
+        with self._lock:
+            if self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval:
+                self._ok = self._verificar()
+                self._checked_at = time.monotonic()
+            return self._ok
+
+    def marcar_caida(self, motivo):
+        """Deja de usar la réplica hasta la siguiente verificación"""
+        with self._lock:
+            self._ok = False
+            self._checked_at = time.monotonic()
+            self.motivo = motivo
+            self.fallos += 1
+
+    def close(self):
+        self.pool.close()
+
+    def stats(self):
+        return dict(
+            self.pool.stats(),
+            disponible=self._ok,
+            lag_segundos=self.lag,
+            motivo=self.motivo,
+            lecturas=self.lecturas,
+            fallos=self.fallos,
+        )
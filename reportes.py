@@ -0,0 +1,166 @@
+import csv
+import io
+from datetime import date, datetime
+
+import msgspec
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+
+ENCABEZADO_LOGS = ['ID', 'Fecha/Hora', 'Usuario', 'Acción', 'Tabla', 'Detalles', 'IP']
+
+ESTILO_TABLA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+])
+
+ANCHOS_LOGS = [0.7 * inch, 1.2 * inch, 1.1 * inch, 0.9 * inch, 1.3 * inch, 3.6 * inch, 1.1 * inch]
+
+
+def fila_log(log):
+    """Convierte un registro de log en una fila de la tabla del PDF"""
+    detalles = log['detalles'] or '-'
+    if len(detalles) > 60:
+        detalles = detalles[:60] + '...'
+    return [
+        str(log['id']),
+        log['fecha_hora'].strftime('%d/%m/%Y %H:%M'),
+        log['username'],
+        log['accion'],
+        log['tabla_afectada'],
+        detalles,
+        log['ip_address'] or '-'
+    ]
+
+
+class ReportePDF:
+    """Genera un PDF tabular página por página directamente sobre el canvas.
+
+    Las filas se convierten en página en cuanto se completa una, pero el canvas
+    de reportlab guarda cada página terminada hasta ``cerrar()``: la memoria
+    crece con el número de filas (unos 0.7 KB por fila). Para acotarla, el
+    llamador limita las filas de cada PDF (ver ``generar_pdfs_logs``).
+    """
+
+    def __init__(self, destino, titulo, subtitulo, encabezado, anchos, filas_por_pagina=32):
+        self.canvas = canvas.Canvas(destino, pagesize=landscape(letter), pageCompression=1)
+        self.ancho, self.alto = landscape(letter)
+        self.titulo = titulo
+        self.subtitulo = subtitulo
+        self.encabezado = encabezado
+        self.anchos = anchos
+        self.filas_por_pagina = filas_por_pagina
+        self.pagina = 0
+        self.total_filas = 0
+        self._pendientes = []
+
+    def _dibujar_pagina(self, filas):
+        c = self.canvas
+        self.pagina += 1
+        margen = 0.5 * inch
+        y = self.alto - margen
+
+        c.setFont('Helvetica-Bold', 14)
+        c.drawString(margen, y - 14, self.titulo)
+        c.setFont('Helvetica', 9)
+        c.drawString(margen, y - 30, self.subtitulo)
+        c.drawRightString(self.ancho - margen, margen / 2, f"Página {self.pagina}")
+
+        tabla = Table([self.encabezado] + filas, colWidths=self.anchos)
+        tabla.setStyle(ESTILO_TABLA)
+        _, alto_tabla = tabla.wrapOn(c, self.ancho - 2 * margen, self.alto - 2 * margen)
+        tabla.drawOn(c, margen, y - 45 - alto_tabla)
+        c.showPage()
+
+    def agregar(self, filas):
+        """Agrega filas; cada vez que se llena una página se dibuja y se libera"""
+        self._pendientes.extend(filas)
+        self.total_filas += len(filas)
+        while len(self._pendientes) >= self.filas_por_pagina:
+            pagina = self._pendientes[:self.filas_por_pagina]
+            del self._pendientes[:self.filas_por_pagina]
+            self._dibujar_pagina(pagina)
+
+    def cerrar(self):
+        """Dibuja la última página y escribe el PDF en el destino"""
+        if self._pendientes or self.pagina == 0:
+            self._dibujar_pagina(self._pendientes)
+            self._pendientes = []
+        self.canvas.save()
+
+
+def generar_pdfs_logs(bloques, nuevo_destino, filtros_texto, usuario, max_filas):
+    """Escribe el log en uno o más PDFs de hasta ``max_filas`` filas cada uno.
+
+    ``nuevo_destino()`` devuelve el archivo donde escribir cada parte; la
+    siguiente parte solo se abre si quedan filas. Devuelve la lista con las
+    filas de cada parte.
+    """
+    generado = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+
+    def abrir(parte):
+        subtitulo = f"Generado el: {generado} - Usuario: {usuario} - {filtros_texto}"
+        if parte > 1:
+            subtitulo += f" - Parte {parte}"
+        return ReportePDF(nuevo_destino(), 'Registro de Actividades del Sistema - FitGym Pro', subtitulo,
+                          ENCABEZADO_LOGS, ANCHOS_LOGS)
+
+    reporte = abrir(1)
+    partes = []
+    for bloque in bloques:
+        filas = [fila_log(log) for log in bloque]
+        while filas:
+            if reporte.total_filas == max_filas:
+                reporte.cerrar()
+                partes.append(reporte.total_filas)
+                reporte = abrir(len(partes) + 1)
+            cupo = max_filas - reporte.total_filas
+            reporte.agregar(filas[:cupo])
+            del filas[:cupo]
+    reporte.cerrar()
+    partes.append(reporte.total_filas)
+    return partes
+
+
+# === EXPORTACIONES CSV / NDJSON ===
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat(sep=' ') if isinstance(valor, datetime) else valor.isoformat()
+    return valor
+
+
+def exportar_csv(bloques, columnas):
+    """Genera el CSV por bloques: primero el encabezado y luego un fragmento por bloque de filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columnas)
+    yield buffer.getvalue()
+    for bloque in bloques:
+        buffer.seek(0)
+        buffer.truncate()
+        for fila in bloque:
+            writer.writerow([_valor_csv(fila.get(col)) for col in columnas])
+        yield buffer.getvalue()
+
+
+def exportar_ndjson(bloques, columnas):
+    """Genera NDJSON por bloques: un objeto JSON por línea.
+
+    msgspec escribe las fechas en ISO 8601 y los Decimal como texto, para no
+    perder precisión en los montos.
+    """
+    encoder = msgspec.json.Encoder()
+    for bloque in bloques:
+        yield encoder.encode_lines([{col: fila.get(col) for col in columnas} for fila in bloque])
@@ -0,0 +1,278 @@
+"""Retención del log de actividades.
+
+``log_actividades`` está particionada por mes (RANGE COLUMNS sobre
+``fecha_hora``, migración 9), con una partición ``pmax`` que recibe todo lo
+posterior a la última partición mensual. ``retener_logs`` crea por adelantado
+las particiones de los próximos meses y archiva las que ya salieron del periodo
+de retención: cada mes se escribe en ``log_actividades-AAAA-MM.ndjson.gz`` junto
+con un índice ``log_actividades-AAAA-MM.indice.json``, y después se elimina la
+partición con DROP PARTITION, sin DELETE fila por fila.
+
+El archivo comprimido es una concatenación de miembros gzip, uno por bloque de
+filas; el índice guarda el desplazamiento, el rango de fechas, los usuarios y
+las acciones de cada bloque. ``ArchivoLogs`` usa el índice para descomprimir
+solo los bloques que pueden contener filas de la búsqueda.
+"""
+import gzip
+import json
+import os
+import re
+import threading
+from datetime import date, datetime, time
+
+import msgspec
+
+from modelos import LogActividad
+
+PREFIJO = 'log_actividades'
+FILAS_POR_BLOQUE = 5000
+PARTICION_MES = re.compile(r'^p(\d{4})(\d{2})$')
+
+
+def sumar_meses(mes, meses):
+    """Primer día del mes que está ``meses`` meses después (o antes) de ``mes``"""
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def nombre_particion(mes):
+    return f"p{mes:%Y%m}"
+
+
+def definicion_particion(mes):
+    """Partición con las filas del mes que empieza en ``mes``"""
+    return f"PARTITION {nombre_particion(mes)} VALUES LESS THAN ('{sumar_meses(mes, 1):%Y-%m-%d}')"
+
+
+def particiones_mensuales(cursor):
+    """Devuelve los meses (primer día) que ya tienen partición, en orden"""
+    cursor.execute("""
+        SELECT partition_name FROM information_schema.partitions
+        WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+    """, (PREFIJO,))
+    meses = []
+    for (nombre,) in cursor.fetchall():
+        coincidencia = PARTICION_MES.match(nombre)
+        if coincidencia:
+            meses.append(date(int(coincidencia.group(1)), int(coincidencia.group(2)), 1))
+    return sorted(meses)
+
+
+def rutas_archivo(directorio, mes):
+    base = os.path.join(directorio, f"{PREFIJO}-{mes:%Y-%m}")
+    return base + '.ndjson.gz', base + '.indice.json'
+
+
+def _como_datetime(valor):
+    if isinstance(valor, datetime):
+        return valor
+    return datetime.combine(valor, time.min)
+
+
+# === MANTENIMIENTO ===
+
+def asegurar_particiones(db, meses_adelante=3, salida=print):
+    """Crea las particiones mensuales que falten hasta ``meses_adelante`` meses después del actual.
+
+    Las nuevas se separan de ``pmax``; si ya tenía filas de esos meses, MySQL
+    las mueve a la partición que les corresponde. Devuelve los meses creados.
+    """
+    conn = db.pool.acquire()
+    creadas = []
+    try:
+        cursor = conn.cursor()
+        existentes = particiones_mensuales(cursor)
+        if not existentes:
+            raise RuntimeError("log_actividades no está particionada; aplica la migración 9")
+        actual = date.today().replace(day=1)
+        mes = sumar_meses(existentes[-1], 1)
+        while mes <= sumar_meses(actual, meses_adelante):
+            cursor.execute(f"""
+                ALTER TABLE {PREFIJO} REORGANIZE PARTITION pmax INTO (
+                    {definicion_particion(mes)},
+                    PARTITION pmax VALUES LESS THAN (MAXVALUE)
+                )
+            """)
+            salida(f"Partición {nombre_particion(mes)} creada")
+            creadas.append(mes)
+            mes = sumar_meses(mes, 1)
+        cursor.close()
+    finally:
+        db.pool.release(conn)
+    return creadas
+
+
+def archivar_mes(db, mes, directorio):
+    """Escribe las filas del mes en su archivo comprimido y su índice. Devuelve cuántas filas escribió.
+
+    Lee siempre del primario (después se elimina la partición, y a la réplica
+    le podrían faltar filas). El índice se escribe al final: un archivo sin
+    índice es un intento incompleto y el lector lo ignora.
+    """
+    ruta_datos, ruta_indice = rutas_archivo(directorio, mes)
+    os.makedirs(directorio, exist_ok=True)
+    query = f"""
+        SELECT l.*, u.username, u.nombre_completo
+        FROM {PREFIJO} PARTITION ({nombre_particion(mes)}) l
+        LEFT JOIN usuarios_sistema u ON l.usuario_id = u.id
+        ORDER BY l.fecha_hora, l.id
+    """
+    encoder = msgspec.json.Encoder()
+    bloques = []
+    temporal = ruta_datos + '.tmp'
+    with open(temporal, 'wb') as archivo:
+        for filas in db.stream_query(query, chunk_size=FILAS_POR_BLOQUE, primario=True):
+            datos = gzip.compress(encoder.encode_lines(filas), mtime=0)
+            bloques.append({
+                'offset': archivo.tell(),
+                'longitud': len(datos),
+                'filas': len(filas),
+                'desde': filas[0]['fecha_hora'].isoformat(),
+                'hasta': filas[-1]['fecha_hora'].isoformat(),
+                'usuarios': sorted({fila['usuario_id'] for fila in filas}),
+                'acciones': sorted({fila['accion'] for fila in filas}),
+            })
+            archivo.write(datos)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta_datos)
+
+    indice = {
+        'tabla': PREFIJO,
+        'desde': _como_datetime(mes).isoformat(),
+        'hasta': _como_datetime(sumar_meses(mes, 1)).isoformat(),
+        'filas': sum(bloque['filas'] for bloque in bloques),
+        'archivo': os.path.basename(ruta_datos),
+        'generado_en': datetime.now().isoformat(timespec='seconds'),
+        'bloques': bloques,
+    }
+    with open(ruta_indice + '.tmp', 'w', encoding='utf-8') as archivo:
+        json.dump(indice, archivo, ensure_ascii=False)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(ruta_indice + '.tmp', ruta_indice)
+    return indice['filas']
+
+
+def retener_logs(db, directorio, retencion_meses=12, meses_adelante=3, salida=print):
+    """Crea las particiones futuras y archiva y elimina las anteriores al periodo de retención.
+
+    Un mes se elimina de la base solo después de que su archivo y su índice
+    están completos en disco y el número de filas coincide. Devuelve la lista
+    de ``(mes, filas)`` archivados.
+    """
+    asegurar_particiones(db, meses_adelante, salida)
+    corte = sumar_meses(date.today().replace(day=1), -retencion_meses)
+    conn = db.pool.acquire()
+    try:
+        cursor = conn.cursor()
+        meses = [mes for mes in particiones_mensuales(cursor) if mes < corte]
+        cursor.close()
+    finally:
+        db.pool.release(conn)
+
+    archivados = []
+    for mes in meses:
+        particion = nombre_particion(mes)
+        conteo = db.execute_query(f"SELECT COUNT(*) as total FROM {PREFIJO} PARTITION ({particion})", primario=True)
+        if conteo is None:
+            salida(f"No se pudo contar {particion}; se omite")
+            continue
+        escritas = archivar_mes(db, mes, directorio)
+        if escritas != conteo[0]['total']:
+            salida(f"{particion}: se archivaron {escritas} filas de {conteo[0]['total']}; no se elimina")
+            _borrar_archivo(directorio, mes)
+            continue
+        if db.execute_update(f"ALTER TABLE {PREFIJO} DROP PARTITION {particion}") is None:
+            # Sin el DROP las filas seguirían en la base y en el archivo a la vez
+            _borrar_archivo(directorio, mes)
+            salida(f"No se pudo eliminar {particion}; se descartó su archivo")
+            continue
+        salida(f"{particion}: {escritas} filas archivadas")
+        archivados.append((mes, escritas))
+    return archivados
+
+
+def _borrar_archivo(directorio, mes):
+    for ruta in reversed(rutas_archivo(directorio, mes)):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+# === LECTURA DEL ARCHIVO ===
+
+class ArchivoLogs:
+    """Consulta los meses archivados por rango de fechas, usuario y acción.
+
+    Los índices se leen una vez y se recargan solo si cambia el archivo.
+    """
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        self._indices = {}  # ruta -> (mtime, índice)
+        self._decoder = msgspec.json.Decoder(LogActividad)
+
+    def indices(self):
+        """Índices de los meses archivados, del más antiguo al más reciente"""
+        try:
+            nombres = os.listdir(self.directorio)
+        except FileNotFoundError:
+            return []
+        vigentes = []
+        with self._lock:
+            for nombre in sorted(nombres):
+                if not (nombre.startswith(PREFIJO + '-') and nombre.endswith('.indice.json')):
+                    continue
+                ruta = os.path.join(self.directorio, nombre)
+                try:
+                    mtime = os.stat(ruta).st_mtime
+                    guardado = self._indices.get(ruta)
+                    if guardado is None or guardado[0] != mtime:
+                        with open(ruta, encoding='utf-8') as archivo:
+                            guardado = self._indices[ruta] = (mtime, json.load(archivo))
+                except (OSError, ValueError):
+                    continue
+                vigentes.append(guardado[1])
+        return vigentes
+
+    def buscar(self, desde, hasta, usuario_id=None, accion=None):
+        """Genera bloques de filas (diccionarios) del rango [desde, hasta) en orden cronológico.
+
+        Las filas tienen las mismas columnas que ``log_actividades`` más
+        ``username`` y ``nombre_completo`` tal como estaban al archivarlas.
+        """
+        desde, hasta = _como_datetime(desde), _como_datetime(hasta)
+        for indice in self.indices():
+            if datetime.fromisoformat(indice['hasta']) <= desde or datetime.fromisoformat(indice['desde']) >= hasta:
+                continue
+            ruta = os.path.join(self.directorio, indice['archivo'])
+            with open(ruta, 'rb') as archivo:
+                for bloque in indice['bloques']:
+                    if datetime.fromisoformat(bloque['hasta']) < desde or datetime.fromisoformat(bloque['desde']) >= hasta:
+                        continue
+                    if usuario_id is not None and usuario_id not in bloque['usuarios']:
+                        continue
+                    if accion is not None and accion not in bloque['acciones']:
+                        continue
+                    archivo.seek(bloque['offset'])
+                    registros = self._decoder.decode_lines(gzip.decompress(archivo.read(bloque['longitud'])))
+                    filas = [
+                        msgspec.structs.asdict(registro) for registro in registros
+                        if desde <= registro.fecha_hora < hasta
+                        and (usuario_id is None or registro.usuario_id == usuario_id)
+                        and (accion is None or registro.accion == accion)
+                    ]
+                    if filas:
+                        yield filas
+
+    def stats(self):
+        indices = self.indices()
+        return {
+            'meses': len(indices),
+            'filas': sum(indice['filas'] for indice in indices),
+            'desde': indices[0]['desde'] if indices else None,
+            'hasta': indices[-1]['hasta'] if indices else None,
+        }
@@ -0,0 +1,345 @@
+"""Sesiones del lado del servidor compartidas entre workers y nodos.
+
+La cookie solo lleva un identificador aleatorio; los datos viven en un
+almacén (``AlmacenSesionesMySQL``) con una caché LRU de proceso delante
+(``CacheSesiones``). ``SesionesServidor`` conecta el almacén con Flask.
+"""
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+
+class AlmacenSesiones(ABC):
+    """Interfaz de un almacén de sesiones (la implementan ``AlmacenSesionesMySQL`` y ``CacheSesiones``).
+
+    ``cargar`` devuelve un diccionario con ``datos`` (texto), ``usuario_id``,
+    ``expira`` y ``version``, o None si la sesión no existe, expiró o fue
+    revocada. ``version`` es la versión de revocación del usuario con la que se
+    abrió la sesión: ``revocar_usuario`` la incrementa y deja inválidas todas
+    las sesiones anteriores del usuario.
+    """
+
+    @abstractmethod
+    def cargar(self, sid):
+        pass
+
+    @abstractmethod
+    def guardar(self, sid, usuario_id, datos, expira, version=None):
+        """Guarda la sesión; con ``version`` None se toma la versión actual del usuario"""
+
+    @abstractmethod
+    def version_usuario(self, usuario_id):
+        """Versión de revocación actual del usuario, o None si no se pudo leer"""
+
+    @abstractmethod
+    def tocar(self, sid, expira):
+        """Extiende la expiración sin reescribir los datos"""
+
+    @abstractmethod
+    def eliminar(self, sid):
+        pass
+
+    @abstractmethod
+    def revocar_usuario(self, usuario_id):
+        """Elimina todas las sesiones de un usuario. Devuelve cuántas se eliminaron"""
+
+    @abstractmethod
+    def purgar_expiradas(self):
+        """Elimina las sesiones expiradas. Devuelve cuántas se eliminaron"""
+
+
+class AlmacenSesionesMySQL(AlmacenSesiones):
+    """Sesiones en la tabla ``sesiones`` (migraciones 5 y 11).
+
+    Cada fila guarda en ``usuario_version`` el ``sesiones_version`` que tenía
+    el usuario al abrirla; una fila con una versión anterior está revocada,
+    aunque una petición en curso la haya vuelto a escribir. Las lecturas van
+    siempre al primario: justo después de iniciar sesión la réplica todavía
+    puede no tener la fila.
+    """
+
+    def __init__(self, db, lote_purga=1000):
+        self.db = db
+        self.lote_purga = lote_purga
+
+    def cargar(self, sid):
+        query = """
+            SELECT s.datos, s.usuario_id, s.expira, s.usuario_version AS version
+            FROM sesiones s
+            LEFT JOIN usuarios_sistema u ON u.id = s.usuario_id
+            WHERE s.id = %s AND s.expira > %s
+              AND (s.usuario_id IS NULL OR s.usuario_version = u.sesiones_version)
+        """
+        result = self.db.execute_query(query, (sid, datetime.now()), primario=True)
+        return result[0] if result else None
+
+    def guardar(self, sid, usuario_id, datos, expira, version=None):
+        query = """
+            INSERT INTO sesiones (id, usuario_id, usuario_version, datos, expira)
+            VALUES (%s, %s, COALESCE(%s, (SELECT sesiones_version FROM usuarios_sistema WHERE id = %s)), %s, %s)
+            ON DUPLICATE KEY UPDATE usuario_id = VALUES(usuario_id), usuario_version = VALUES(usuario_version),
+                                    datos = VALUES(datos), expira = VALUES(expira)
+        """
+        return self.db.execute_update(query, (sid, usuario_id, version, usuario_id, datos, expira)) is not None
+
+    def version_usuario(self, usuario_id):
+        query = "SELECT sesiones_version FROM usuarios_sistema WHERE id = %s"
+        result = self.db.execute_query(query, (usuario_id,), primario=True)
+        return result[0]['sesiones_version'] if result else None
+
+    def tocar(self, sid, expira):
+        return self.db.execute_update("UPDATE sesiones SET expira = %s WHERE id = %s", (expira, sid)) is not None
+
+    def eliminar(self, sid):
+        return self.db.execute_update("DELETE FROM sesiones WHERE id = %s", (sid,)) is not None
+
+    def revocar_usuario(self, usuario_id):
+        def revocar(ejecutar):
+            ejecutar("UPDATE usuarios_sistema SET sesiones_version = sesiones_version + 1 WHERE id = %s",
+                     (usuario_id,))
+            return ejecutar("DELETE FROM sesiones WHERE usuario_id = %s", (usuario_id,)).rowcount
+
+        return self.db.en_transaccion(revocar) or 0
+
+    def purgar_expiradas(self):
+        # Por lotes, para no bloquear la tabla con un DELETE enorme
+        total = 0
+        ahora = datetime.now()
+        while True:
+            borradas = self.db.execute_update(
+                "DELETE FROM sesiones WHERE expira <= %s LIMIT %s", (ahora, self.lote_purga)
+            )
+            if not borradas:
+                return total
+            total += borradas
+            if borradas < self.lote_purga:
+                return total
+
+
+class CacheSesiones(AlmacenSesiones):
+    """Caché LRU de proceso delante de otro almacén.
+
+    Las escrituras pasan al almacén y actualizan la caché. Una sesión leída se
+    reutiliza durante ``ttl`` segundos, pero cada acierto de una sesión con
+    usuario vuelve a leer la versión de revocación del usuario en el almacén:
+    una revocación hecha en otro worker se respeta en la siguiente petición.
+    """
+
+    def __init__(self, almacen, max_entradas=10000, ttl=5):
+        self.almacen = almacen
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # sid -> (sesion, momento en que se leyó)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _poner(self, sid, sesion):
+        with self._lock:
+            self._entradas[sid] = (sesion, time.monotonic())
+            self._entradas.move_to_end(sid)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def _quitar(self, sid):
+        with self._lock:
+            self._entradas.pop(sid, None)
+
+    def cargar(self, sid):
+        with self._lock:
+            sesion = None
+            entrada = self._entradas.get(sid)
+            if entrada is not None:
+                sesion, leida = entrada
+                if time.monotonic() - leida < self.ttl and sesion['expira'] > datetime.now():
+                    self._entradas.move_to_end(sid)
+                else:
+                    del self._entradas[sid]
+                    sesion = None
+        if sesion is not None:
+            if sesion['usuario_id'] is None or self.almacen.version_usuario(sesion['usuario_id']) == sesion['version']:
+                self.aciertos += 1
+                return sesion
+            self._quitar(sid)
+        self.fallos += 1
+        sesion = self.almacen.cargar(sid)
+        if sesion is not None:
+            self._poner(sid, sesion)
+        return sesion
+
+    def guardar(self, sid, usuario_id, datos, expira, version=None):
+        ok = self.almacen.guardar(sid, usuario_id, datos, expira, version)
+        if ok and (version is not None or usuario_id is None):
+            self._poner(sid, {'datos': datos, 'usuario_id': usuario_id, 'expira': expira, 'version': version})
+        else:
+            # Sin la versión con la que quedó guardada, la próxima lectura va al almacén
+            self._quitar(sid)
+        return ok
+
+    def version_usuario(self, usuario_id):
+        return self.almacen.version_usuario(usuario_id)
+
+    def tocar(self, sid, expira):
+        ok = self.almacen.tocar(sid, expira)
+        with self._lock:
+            entrada = self._entradas.get(sid)
+            if entrada is not None and ok:
+                entrada[0]['expira'] = expira
+        return ok
+
+    def eliminar(self, sid):
+        self._quitar(sid)
+        return self.almacen.eliminar(sid)
+
+    def revocar_usuario(self, usuario_id):
+        with self._lock:
+            for sid in [sid for sid, (sesion, _) in self._entradas.items() if sesion['usuario_id'] == usuario_id]:
+                del self._entradas[sid]
+        return self.almacen.revocar_usuario(usuario_id)
+
+    def purgar_expiradas(self):
+        return self.almacen.purgar_expiradas()
+
+    def stats(self):
+        with self._lock:
+            entradas = len(self._entradas)
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': entradas,
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else None,
+        }
+
+
+class SesionServidor(CallbackDict, SessionMixin):
+    """Sesión cuyo contenido se guarda en el servidor bajo ``sid``"""
+
+    def __init__(self, datos=None, sid=None, expira=None, version=None):
+        def on_update(sesion):
+            sesion.modified = True
+            sesion.accessed = True
+
+        super().__init__(datos, on_update)
+        self.sid = sid
+        self.expira = expira
+        self.version = version
+        self.modified = False
+        self.accessed = False
+        self.sid_anterior = None
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+    def regenerar(self):
+        """Cambia el identificador (al iniciar sesión, contra la fijación de sesión)"""
+        if self.sid is not None:
+            self.sid_anterior = self.sid
+        self.sid = None
+        self.version = None
+        self.modified = True
+
+
+class SesionesServidor(SessionInterface):
+    """SessionInterface de Flask sobre un AlmacenSesiones.
+
+    Solo se escribe en el almacén cuando la sesión cambió; si no cambió, solo se
+    extiende su expiración cuando ya pasó la mitad de su vida. Cada
+    ``intervalo_purga`` segundos un hilo en segundo plano purga las expiradas.
+    """
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, almacen, intervalo_purga=600):
+        self.almacen = almacen
+        self.intervalo_purga = intervalo_purga
+        self._ultima_purga = time.monotonic()
+        self._purga_lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            fila = self.almacen.cargar(sid)
+            if fila is not None:
+                try:
+                    datos = self.serializer.loads(fila['datos'])
+                except ValueError:
+                    datos = None
+                if datos is not None:
+                    return SesionServidor(datos, sid=sid, expira=fila['expira'], version=fila['version'])
+        return SesionServidor()
+
+    def save_session(self, app, session, response):
+        nombre = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        ruta = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.sid_anterior is not None:
+            self.almacen.eliminar(session.sid_anterior)
+            session.sid_anterior = None
+
+        if not session:
+            if session.modified and session.sid is not None:
+                self.almacen.eliminar(session.sid)
+                response.delete_cookie(nombre, domain=dominio, path=ruta,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        expira = datetime.now() + app.permanent_session_lifetime
+        if session.modified or session.sid is None:
+            session.sid = session.sid or secrets.token_urlsafe(32)
+            # Con la versión con la que se abrió: si el usuario fue revocado mientras
+            # tanto, la fila reescrita por esta petición sigue revocada
+            self.almacen.guardar(session.sid, session.get('user_id'), self.serializer.dumps(dict(session)), expira,
+                                 session.version)
+        elif session.expira is None or session.expira - datetime.now() < app.permanent_session_lifetime / 2:
+            self.almacen.tocar(session.sid, expira)
+        else:
+            self._purgar_si_toca()
+            return
+
+        response.set_cookie(
+            nombre, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=dominio,
+            path=ruta,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        self._purgar_si_toca()
+
+    def _purgar_si_toca(self):
+        if time.monotonic() - self._ultima_purga < self.intervalo_purga:
+            return
+        if not self._purga_lock.acquire(blocking=False):
+            return
+        self._ultima_purga = time.monotonic()
+
+        def purgar():
+            try:
+                self.almacen.purgar_expiradas()
+            finally:
+                self._purga_lock.release()
+
+        threading.Thread(target=purgar, name='purga-sesiones', daemon=True).start()
@@ -134,6 +134,11 @@ function actualizarEstadisticas() {
         document.getElementById('membresias_activas').textContent = stats.membresias_activas;
         document.getElementById('asistencias_hoy').textContent = stats.asistencias_hoy;
         document.getElementById('ingresos_mes').textContent = formatearMoneda(stats.ingresos_mes);
+        const edad = document.getElementById('stats_edad');
+        if (edad && stats.generado_en) {
+            // generado_en viene en UTC con su zona horaria, así que no depende de la zona del navegador
+            edad.textContent = Math.max(0, Math.floor((Date.now() - Date.parse(stats.generado_en)) / 1000));
+        }
     });
 }
 
@@ -168,6 +173,83 @@ function descargarCSV(csv, nombreArchivo) {
     document.body.removeChild(downloadLink);
 }
 
+// Búsqueda de miembros (typeahead) para los formularios con buscador_miembro
+function inicializarBuscadorMiembro(contenedor) {
+    const texto = contenedor.querySelector('.buscador-miembro-texto');
+    const oculto = contenedor.querySelector('input[type="hidden"]');
+    const resultados = contenedor.querySelector('.buscador-miembro-resultados');
+    let temporizador = null;
+    let ultimaBusqueda = '';
+
+    function limpiarResultados() {
+        resultados.innerHTML = '';
+    }
+
+    function seleccionar(miembro) {
+        oculto.value = miembro.id;
+        texto.value = `${miembro.nombre} ${miembro.apellido}`;
+        texto.setCustomValidity('');
+        limpiarResultados();
+    }
+
+    texto.addEventListener('input', function() {
+        oculto.value = '';
+        texto.setCustomValidity('Seleccione un miembro de la lista');
+        clearTimeout(temporizador);
+        const q = texto.value.trim();
+        if (q.length < 2) {
+            limpiarResultados();
+            return;
+        }
+        temporizador = setTimeout(function() {
+            ultimaBusqueda = q;
+            fetch(`/api/miembros/buscar?q=${encodeURIComponent(q)}`)
+                .then(response => response.json())
+                .then(miembros => {
+                    // Ignorar respuestas de búsquedas anteriores
+                    if (q !== ultimaBusqueda) return;
+                    limpiarResultados();
+                    miembros.forEach(function(miembro) {
+                        const item = document.createElement('button');
+                        item.type = 'button';
+                        item.className = 'list-group-item list-group-item-action';
+                        item.textContent = `${miembro.nombre} ${miembro.apellido}`;
+                        const detalle = document.createElement('small');
+                        detalle.className = 'text-muted ms-2';
+                        detalle.textContent = miembro.email || miembro.telefono || '';
+                        item.appendChild(detalle);
+                        item.addEventListener('click', () => seleccionar(miembro));
+                        resultados.appendChild(item);
+                    });
+                    if (miembros.length === 0) {
+                        const vacio = document.createElement('div');
+                        vacio.className = 'list-group-item text-muted';
+                        vacio.textContent = 'Sin coincidencias';
+                        resultados.appendChild(vacio);
+                    }
+                })
+                .catch(error => console.error('Error:', error));
+        }, 200);
+    });
+
+    texto.addEventListener('blur', function() {
+        // Esperar a que se procese el clic en un resultado
+        setTimeout(limpiarResultados, 200);
+    });
+
+    const form = contenedor.closest('form');
+    if (form) {
+        form.addEventListener('reset', function() {
+            oculto.value = '';
+            limpiarResultados();
+        });
+    }
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('.buscador-miembro').forEach(inicializarBuscadorMiembro);
+});
+
 // Imprimir página
 function imprimirPagina() {
     window.print();
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+import app as aplicacion
+from cache import ETagCache
+from modelos import Miembro
+
+
+class RespuestaFilaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.etags = ETagCache(lambda: {'miembros': 1}, check_interval=60)
+        parche = mock.patch.object(aplicacion.db, 'etags', self.etags)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def test_if_none_match_con_etag_en_cache_responde_304_sin_leer(self):
+        # Como en una respuesta anterior: primero se consulta y luego se guarda
+        self.assertIsNone(self.etags.get('miembros', 5))
+        self.etags.set('miembros', 5, 'miembros-5-v3')
+
+        def cargar(fila_id):
+            raise AssertionError('no debería leer la fila')
+
+        with aplicacion.app.test_request_context(headers={'If-None-Match': '"miembros-5-v3"'}):
+            response = aplicacion.respuesta_fila('miembros', 5, cargar)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], '"miembros-5-v3"')
+
+    def test_primera_lectura_guarda_el_etag(self):
+        miembro = Miembro(id=5, nombre='Ana', apellido='Paz', version=3)
+        with aplicacion.app.test_request_context():
+            response = aplicacion.respuesta_fila('miembros', 5, lambda fila_id: miembro)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['ETag'], '"miembros-5-v3"')
+        self.assertEqual(self.etags.get('miembros', 5), 'miembros-5-v3')
+
+    def test_etag_distinto_lee_la_fila(self):
+        self.etags.get('miembros', 5)
+        self.etags.set('miembros', 5, 'miembros-5-v3')
+        leidas = []
+
+        def cargar(fila_id):
+            leidas.append(fila_id)
+            return None
+
+        with aplicacion.app.test_request_context(headers={'If-None-Match': '"miembros-5-v2"'}):
+            response, status = aplicacion.respuesta_fila('miembros', 5, cargar)
+        self.assertEqual(status, 404)
+        self.assertEqual(leidas, [5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+
+from busqueda import IndiceMiembros
+
+
+def miembro(miembro_id, nombre, apellido, email=None, telefono=None):
+    return {'id': miembro_id, 'nombre': nombre, 'apellido': apellido, 'email': email,
+            'telefono': telefono, 'estado': 'activo'}
+
+
+class CargaControlada:
+    """Cargador cuya segunda llamada y siguientes se quedan esperando hasta ``soltar``"""
+
+    def __init__(self, *cargas):
+        self.cargas = list(cargas)
+        self.llamadas = 0
+        self.dentro = threading.Event()
+        self.soltar = threading.Event()
+
+    def __call__(self):
+        self.llamadas += 1
+        carga = self.cargas[min(self.llamadas, len(self.cargas)) - 1]
+        if self.llamadas > 1:
+            self.dentro.set()
+            self.soltar.wait(5)
+        if isinstance(carga, Exception):
+            raise carga
+        return carga
+
+
+def ids(docs):
+    return [doc['id'] for doc in docs]
+
+
+class IndiceMiembrosRecargaTest(unittest.TestCase):
+
+    def recargar_en_hilo(self, indice):
+        resultado = []
+        hilo = threading.Thread(target=lambda: resultado.append(indice.recargar()))
+        hilo.start()
+        return hilo, resultado
+
+    def test_buscar_durante_la_recarga_usa_el_indice_anterior(self):
+        carga = CargaControlada([miembro(1, 'Ana', 'Paz')], [miembro(1, 'Ana', 'Paz'), miembro(2, 'Ana', 'Gil')])
+        indice = IndiceMiembros(carga, ttl=0.05)
+        self.assertEqual(ids(indice.buscar('ana')), [1])
+        time.sleep(0.06)
+        hilo, _ = self.recargar_en_hilo(indice)
+        carga.dentro.wait(5)
+
+        # El índice está vencido, pero quien busca no espera a la recarga en curso
+        inicio = time.monotonic()
+        self.assertEqual(ids(indice.buscar('ana')), [1])
+        self.assertLess(time.monotonic() - inicio, 1)
+
+        carga.soltar.set()
+        hilo.join(5)
+        self.assertEqual(carga.llamadas, 2)
+        self.assertEqual(ids(indice.buscar('ana')), [2, 1])
+
+    def test_cambios_durante_la_recarga_sobreviven_al_cambio_de_indice(self):
+        # La carga lenta se leyó antes de los cambios: trae a Luis y no trae a Eva
+        viejos = [miembro(1, 'Ana', 'Paz', 'ana@x.com'), miembro(3, 'Luis', 'Gil')]
+        carga = CargaControlada(viejos, viejos)
+        indice = IndiceMiembros(carga, ttl=300)
+        indice.recargar()
+        hilo, resultado = self.recargar_en_hilo(indice)
+        carga.dentro.wait(5)
+
+        indice.agregar(miembro(1, 'Ana', 'Ruiz', 'ana.ruiz@x.com'))
+        indice.agregar_varios([miembro(2, 'Eva', 'Sol', telefono='11 5555 1234')])
+        indice.eliminar(3)
+        carga.soltar.set()
+        hilo.join(5)
+
+        self.assertEqual(resultado, [True])
+        self.assertEqual(ids(indice.buscar('ruiz')), [1])
+        self.assertEqual(indice.buscar('paz'), [])
+        self.assertEqual(ids(indice.buscar('eva')), [2])
+        self.assertEqual(indice.buscar('luis'), [])
+        self.assertEqual(indice.buscar_contacto(email='ana.ruiz@x.com'), 1)
+        self.assertIsNone(indice.buscar_contacto(email='ana@x.com'))
+        self.assertEqual(indice.buscar_contacto(telefono='1155551234'), 2)
+
+    def test_recarga_fallida_conserva_el_indice_anterior(self):
+        for fallo in (None, RuntimeError('sin conexión')):
+            with self.subTest(fallo=fallo):
+                carga = CargaControlada([miembro(1, 'Ana', 'Paz')], fallo, [miembro(2, 'Eva', 'Sol')])
+                indice = IndiceMiembros(carga, ttl=300)
+                indice.recargar()
+                carga.soltar.set()
+                if fallo is None:
+                    self.assertFalse(indice.recargar())
+                else:
+                    with self.assertRaises(RuntimeError):
+                        indice.recargar()
+                self.assertEqual(ids(indice.buscar('ana')), [1])
+                # La recarga fallida no deja al índice marcado como "recargando"
+                self.assertTrue(indice.recargar())
+                self.assertEqual(ids(indice.buscar('eva')), [2])
+
+    def test_una_sola_recarga_a_la_vez(self):
+        carga = CargaControlada([miembro(1, 'Ana', 'Paz')], [miembro(2, 'Eva', 'Sol')])
+        indice = IndiceMiembros(carga, ttl=300)
+        indice.recargar()
+        hilos = [self.recargar_en_hilo(indice) for _ in range(4)]
+        carga.dentro.wait(5)
+        time.sleep(0.05)
+        carga.soltar.set()
+        for hilo, resultado in hilos:
+            hilo.join(5)
+            self.assertEqual(resultado, [True])
+        self.assertEqual(carga.llamadas, 2)
+        self.assertEqual(ids(indice.buscar('eva')), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import sys
+import threading
+import time
+import unittest
+
+from cache import ETagCache, SnapshotCache, VersionedCache
+
+
+class SnapshotCacheConcurrenciaTest(unittest.TestCase):
+
+    def test_invalidate_mientras_se_lee(self):
+        cache = SnapshotCache(lambda: {'total': 1}, ttl=60)
+        errores = []
+        detener = threading.Event()
+
+        def leer():
+            while not detener.is_set():
+                try:
+                    if cache.get() is None:
+                        errores.append('get() devolvió None')
+                    entrada = cache.get_entry()
+                    if entrada is None or entrada[0] is None or entrada[2] < 0:
+                        errores.append(f'get_entry() incoherente: {entrada!r}')
+                    edad = cache.age()
+                    if edad is not None and edad < 0:
+                        errores.append(f'age() negativa: {edad}')
+                except Exception as e:
+                    errores.append(repr(e))
+
+        def invalidar():
+            while not detener.is_set():
+                cache.invalidate()
+
+        hilos = [threading.Thread(target=leer) for _ in range(4)] + [threading.Thread(target=invalidar)]
+        intervalo = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for hilo in hilos:
+                hilo.start()
+            time.sleep(1.0)
+        finally:
+            detener.set()
+            for hilo in hilos:
+                hilo.join()
+            sys.setswitchinterval(intervalo)
+        self.assertEqual(errores[:5], [])
+
+    def test_loader_sin_valor_conserva_el_anterior(self):
+        valores = iter([{'total': 1}, None])
+        cache = SnapshotCache(lambda: next(valores), ttl=0)
+        self.assertEqual(cache.get(), {'total': 1})
+        self.assertEqual(cache.get(), {'total': 1})
+
+
+class VersionedCacheConcurrenciaTest(unittest.TestCase):
+
+    def test_revision_lenta_no_bloquea_a_los_demas(self):
+        dentro = threading.Event()
+        soltar = threading.Event()
+        versiones = iter([1, 2])
+
+        def version():
+            v = next(versiones, 2)
+            if v == 2:
+                dentro.set()
+                soltar.wait(5)
+            return v
+
+        cache = VersionedCache(lambda: {'v': 1}, version, check_interval=0.05)
+        self.assertEqual(cache.get(), {'v': 1})
+        time.sleep(0.06)
+        revisor = threading.Thread(target=cache.get)
+        revisor.start()
+        dentro.wait(5)
+        inicio = time.monotonic()
+        self.assertEqual(cache.get(), {'v': 1})
+        self.assertLess(time.monotonic() - inicio, 1)
+        soltar.set()
+        revisor.join()
+
+    def test_invalidate_durante_la_carga_no_guarda_el_valor_viejo(self):
+        cargando = threading.Event()
+        soltar = threading.Event()
+        valores = iter(['viejo', 'nuevo'])
+
+        def cargar():
+            valor = next(valores)
+            if valor == 'viejo':
+                cargando.set()
+                soltar.wait(5)
+            return valor
+
+        cache = VersionedCache(cargar, lambda: 1, check_interval=60)
+        lector = threading.Thread(target=cache.get)
+        lector.start()
+        cargando.wait(5)
+        cache.invalidate()
+        soltar.set()
+        lector.join()
+        self.assertEqual(cache.get(), 'nuevo')
+
+
+class ETagCacheTest(unittest.TestCase):
+
+    def test_cambio_de_generacion_olvida_la_tabla_y_sus_dependientes(self):
+        generaciones = {'miembros': 1, 'pagos': 1}
+        etags = ETagCache(lambda: dict(generaciones), check_interval=0, dependencias={'pagos': ('miembros',)})
+        self.assertIsNone(etags.get('pagos', 7))
+        etags.set('miembros', 1, 'miembros-1-v1')
+        etags.set('pagos', 7, 'pagos-7-v1-m1')
+        self.assertEqual(etags.get('pagos', 7), 'pagos-7-v1-m1')
+        generaciones['miembros'] = 2
+        self.assertIsNone(etags.get('miembros', 1))
+        self.assertIsNone(etags.get('pagos', 7))
+
+    def test_sin_generaciones_no_devuelve_nada(self):
+        etags = ETagCache(lambda: None, check_interval=0)
+        etags.set('miembros', 1, 'miembros-1-v1')
+        self.assertIsNone(etags.get('miembros', 1))
+
+    def test_lru_acotado(self):
+        etags = ETagCache(lambda: {}, check_interval=60, max_entradas=2)
+        for fila_id in (1, 2, 3):
+            etags.set('miembros', fila_id, f'miembros-{fila_id}-v1')
+        self.assertIsNone(etags.get('miembros', 1))
+        self.assertEqual(etags.get('miembros', 3), 'miembros-3-v1')
+
+
+if __name__ == '__main__':
+    unittest.main()
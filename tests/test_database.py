@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+
+from database import Database
+
+
+class EnParaleloTest(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database()
+        self.addCleanup(lambda: self.db._ejecutor and self.db._ejecutor.shutdown())
+
+    def consulta(self, sql, resultado=None, error=None):
+        def tarea():
+            self.db.metricas.registrar(sql, None, 0.001)
+            if error is not None:
+                raise error
+            return resultado
+        return tarea
+
+    def test_suma_las_consultas_de_todas_las_tareas(self):
+        self.db.metricas.iniciar('prueba')
+        resultados = self.db.en_paralelo(a=self.consulta('SELECT 1', 1), b=self.consulta('SELECT 2', 2))
+        actual = self.db.metricas.terminar()
+        self.assertEqual(resultados, {'a': 1, 'b': 2})
+        self.assertEqual(actual['consultas'], 2)
+        self.assertEqual(actual['tareas_paralelas'], 2)
+
+    def test_tarea_que_falla_conserva_sus_consultas(self):
+        self.db.metricas.iniciar('prueba')
+        with self.assertRaises(ValueError):
+            self.db.en_paralelo(a=self.consulta('SELECT 1', error=ValueError('falla')),
+                                b=self.consulta('SELECT 2', 2))
+        actual = self.db.metricas.terminar()
+        self.assertIsNotNone(self.db._ejecutor)
+        self.assertEqual(actual['consultas'], 2)
+        self.assertEqual(actual['tareas_paralelas'], 2)
+
+
+class FiltrarMiembrosActivosTest(unittest.TestCase):
+
+    def test_una_consulta_por_lote_en_el_primario(self):
+        db = Database()
+        with mock.patch.object(db, 'execute_query', return_value=[{'id': 3}]) as consulta:
+            self.assertEqual(db.filtrar_miembros_activos([5, 3, 5, 9]), {3})
+            self.assertEqual(db.filtrar_miembros_activos([]), set())
+        consulta.assert_called_once()
+        query, params = consulta.call_args.args
+        self.assertIn("estado = 'activo'", query)
+        self.assertEqual(params, (3, 5, 9))
+        self.assertTrue(consulta.call_args.kwargs['primario'])
+
+    def test_error_de_consulta(self):
+        db = Database()
+        with mock.patch.object(db, 'execute_query', return_value=None):
+            self.assertIsNone(db.filtrar_miembros_activos([1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
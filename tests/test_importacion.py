@@ -0,0 +1,102 @@
+import io
+import unittest
+from datetime import date
+
+from importacion import ImportacionError, _agregar_rangos, _describir_rangos, leer_csv, validar_fila
+
+HOY = date(2024, 5, 1)
+
+
+def csv_binario(texto):
+    return io.BytesIO(texto.encode('utf-8'))
+
+
+class LeerCsvTest(unittest.TestCase):
+
+    def test_encabezado_con_bom_alias_y_punto_y_coma(self):
+        archivo = csv_binario('\ufeffNombre;Apellidos;E-mail;Otra\nAna;Paz;ana@x.com;z\n;;;\nLuis;Gil\n')
+        filas = list(leer_csv(archivo))
+        self.assertEqual(filas, [
+            (2, {'nombre': 'Ana', 'apellido': 'Paz', 'email': 'ana@x.com'}),
+            (4, {'nombre': 'Luis', 'apellido': 'Gil', 'email': ''}),
+        ])
+
+    def test_campo_con_salto_de_linea(self):
+        archivo = csv_binario('nombre,apellido,telefono\n"Ana\nMaría",Paz,555 1234\nLuis,Gil,\n')
+        lineas = [linea for linea, _ in leer_csv(archivo)]
+        self.assertEqual(lineas, [3, 4])
+
+    def test_faltan_columnas_obligatorias(self):
+        with self.assertRaisesRegex(ImportacionError, 'apellido'):
+            list(leer_csv(csv_binario('nombre,email\nAna,ana@x.com\n')))
+
+    def test_archivo_vacio(self):
+        with self.assertRaises(ImportacionError):
+            list(leer_csv(csv_binario('')))
+
+
+class ValidarFilaTest(unittest.TestCase):
+
+    def test_fila_completa(self):
+        fila = {'nombre': 'Ana', 'apellido': 'Paz', 'email': 'Ana@X.com', 'telefono': '+54 11 5555-1234',
+                'fecha_nacimiento': '31/12/1990', 'fecha_inscripcion': '2024-04-01'}
+        self.assertEqual(validar_fila(fila, HOY), (
+            'Ana', 'Paz', 'ana@x.com', '+54 11 5555-1234', date(1990, 12, 31), date(2024, 4, 1)
+        ))
+
+    def test_valores_por_defecto(self):
+        self.assertEqual(validar_fila({'nombre': 'Ana', 'apellido': 'Paz', 'email': ''}, HOY),
+                         ('Ana', 'Paz', None, None, None, HOY))
+
+    def test_rechazos(self):
+        base = {'nombre': 'Ana', 'apellido': 'Paz'}
+        casos = [
+            ({'apellido': ''}, 'Falta apellido'),
+            ({'nombre': 'x' * 101}, 'nombre supera 100'),
+            ({'email': 'ana@x'}, 'Email inválido'),
+            ({'telefono': '12-34'}, 'Teléfono inválido'),
+            ({'fecha_nacimiento': '1990-13-01'}, 'fecha_nacimiento inválida'),
+            ({'fecha_nacimiento': '2030-01-01'}, 'en el futuro'),
+            ({'fecha_inscripcion': 'ayer'}, 'fecha_inscripcion inválida'),
+        ]
+        for cambios, motivo in casos:
+            with self.subTest(motivo=motivo):
+                with self.assertRaisesRegex(ValueError, motivo):
+                    validar_fila(dict(base, **cambios), HOY)
+
+
+class RangosTest(unittest.TestCase):
+
+    def test_paso_1_une_lotes_contiguos(self):
+        rangos = []
+        _agregar_rangos(rangos, range(10, 13))
+        _agregar_rangos(rangos, range(13, 14))
+        _agregar_rangos(rangos, range(20, 22))
+        self.assertEqual(rangos, [[10, 4, 1], [20, 2, 1]])
+        self.assertEqual(_describir_rangos(rangos), '10-13, 20-21')
+
+    def test_paso_2(self):
+        rangos = []
+        _agregar_rangos(rangos, range(11, 17, 2))
+        # Un lote de una sola fila conserva el paso de su conexión
+        _agregar_rangos(rangos, range(17, 19, 2))
+        _agregar_rangos(rangos, range(19, 25, 2))
+        self.assertEqual(rangos, [[11, 7, 2]])
+        self.assertEqual(_describir_rangos(rangos), '11-23 de 2 en 2')
+
+    def test_paso_distinto_o_hueco_abre_otro_rango(self):
+        rangos = []
+        _agregar_rangos(rangos, range(11, 13, 2))
+        _agregar_rangos(rangos, range(13, 14))
+        _agregar_rangos(rangos, range(16, 20, 2))
+        self.assertEqual(rangos, [[11, 1, 2], [13, 1, 1], [16, 2, 2]])
+        self.assertEqual(_describir_rangos(rangos), '11, 13, 16-18 de 2 en 2')
+
+    def test_lote_vacio(self):
+        rangos = []
+        _agregar_rangos(rangos, range(0))
+        self.assertEqual(rangos, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
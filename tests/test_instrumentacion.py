@@ -0,0 +1,59 @@
+import json
+import unittest
+
+from instrumentacion import MetricasConsultas, normalizar_sql
+
+
+class NormalizarSqlTest(unittest.TestCase):
+
+    def test_literales_se_reemplazan(self):
+        self.assertEqual(
+            normalizar_sql("SELECT * FROM miembros WHERE id = 42 AND email = 'a@b.c' AND monto > 10.50"),
+            "SELECT * FROM miembros WHERE id = ? AND email = ? AND monto > ?"
+        )
+
+    def test_cadenas_con_comillas_escapadas(self):
+        self.assertEqual(normalizar_sql("SELECT 'it\\'s', \"x\" FROM t"), "SELECT ?, ? FROM t")
+
+    def test_numeros_dentro_de_identificadores_se_conservan(self):
+        self.assertEqual(normalizar_sql("SELECT t2.col1 FROM t2 LIMIT 5"), "SELECT t2.col1 FROM t2 LIMIT ?")
+
+    def test_listas_in_se_agrupan(self):
+        self.assertEqual(normalizar_sql("SELECT * FROM m WHERE id IN (%s, %s, %s)"),
+                         normalizar_sql("SELECT * FROM m WHERE id IN (%s,%s)"))
+        self.assertEqual(normalizar_sql("DELETE FROM m WHERE id IN (1, 2, 3)"), "DELETE FROM m WHERE id IN (?, ...)")
+
+    def test_espacios(self):
+        self.assertEqual(normalizar_sql("SELECT  *\n  FROM   m\tWHERE id = %s "), "SELECT * FROM m WHERE id = ?")
+
+
+class RegistrarTest(unittest.TestCase):
+
+    def registrar(self, params, varios=False):
+        metricas = MetricasConsultas(umbral_lento_ms=0)
+        metricas.iniciar('prueba')
+        with self.assertLogs('fitgym.slow_query') as logs:
+            metricas.registrar("INSERT INTO asistencias (miembro_id, fecha_hora) VALUES (%s, %s)",
+                               params, 0.001, varios=varios)
+        return json.loads(logs.records[0].getMessage()), metricas.terminar()
+
+    def test_executemany_separa_filas_y_parametros(self):
+        registro, actual = self.registrar([(1, '2024-05-01'), (2, '2024-05-01'), (3, '2024-05-01')], varios=True)
+        self.assertEqual(registro['filas'], 3)
+        self.assertEqual(registro['num_parametros'], 2)
+        self.assertEqual(actual['consultas'], 1)
+        self.assertEqual(actual['filas_lote'], 3)
+
+    def test_consulta_simple(self):
+        registro, actual = self.registrar((1, '2024-05-01'))
+        self.assertEqual(registro['filas'], 1)
+        self.assertEqual(registro['num_parametros'], 2)
+        self.assertEqual(actual['filas_lote'], 0)
+
+    def test_executemany_sin_filas(self):
+        registro, _ = self.registrar([], varios=True)
+        self.assertEqual((registro['filas'], registro['num_parametros']), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import threading
+import time
+import unittest
+
+from mysql.connector import Error
+
+from pool import ConnectionPool, PoolTimeout
+
+
+class ConexionFalsa:
+    """Conexión mínima con la interfaz que usa el pool"""
+
+    def __init__(self):
+        self.in_transaction = False
+        self.cerrada = False
+        self.ping_falla = False
+        self.rollback_falla = False
+
+    def ping(self, reconnect=False):
+        if self.ping_falla:
+            raise Error(msg='conexión perdida')
+
+    def rollback(self):
+        if self.rollback_falla:
+            raise Error(msg='conexión perdida')
+        self.in_transaction = False
+
+    def close(self):
+        self.cerrada = True
+
+
+class PoolFalso(ConnectionPool):
+
+    def __init__(self, **kwargs):
+        super().__init__({}, **kwargs)
+        self.creadas = []
+
+    def _new_connection(self):
+        conn = ConexionFalsa()
+        self.creadas.append(conn)
+        return conn
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def test_agotado_espera_y_vence(self):
+        pool = PoolFalso(min_size=0, max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        inicio = time.monotonic()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.05)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.release(conn)
+        self.assertIs(pool.acquire(), conn)
+
+    def test_release_despierta_al_que_espera(self):
+        pool = PoolFalso(min_size=0, max_size=1, timeout=5)
+        conn = pool.acquire()
+        obtenidas = []
+        esperando = threading.Thread(target=lambda: obtenidas.append(pool.acquire()))
+        esperando.start()
+        while pool.stats()['waiting'] == 0:
+            time.sleep(0.001)
+        pool.release(conn)
+        esperando.join(5)
+        self.assertEqual(obtenidas, [conn])
+
+    def test_conexion_rota_se_descarta(self):
+        pool = PoolFalso(min_size=0, max_size=1, timeout=0.05)
+        rota = pool.acquire()
+        pool.release(rota, discard=True)
+        self.assertTrue(rota.cerrada)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertEqual(pool.stats()['discarded'], 1)
+        nueva = pool.acquire()
+        self.assertIsNot(nueva, rota)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_rollback_fallido_descarta_la_conexion(self):
+        pool = PoolFalso(min_size=0, max_size=1, timeout=0.05)
+        conn = pool.acquire()
+        conn.in_transaction = True
+        conn.rollback_falla = True
+        pool.release(conn)
+        self.assertTrue(conn.cerrada)
+        self.assertEqual(pool.stats()['size'], 0)
+        self.assertIsNot(pool.acquire(), conn)
+
+    def test_ping_fallido_al_tomar_una_ociosa(self):
+        pool = PoolFalso(min_size=0, max_size=1, timeout=0.05, ping_interval=0)
+        conn = pool.acquire()
+        pool.release(conn)
+        conn.ping_falla = True
+        nueva = pool.acquire()
+        self.assertIsNot(nueva, conn)
+        self.assertTrue(conn.cerrada)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
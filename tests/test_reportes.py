@@ -0,0 +1,42 @@
+import io
+import unittest
+from datetime import datetime
+
+from reportes import generar_pdfs_logs
+
+
+def logs(cantidad, inicio=1):
+    return [{'id': i, 'fecha_hora': datetime(2024, 5, 1, 10, 0), 'username': 'admin', 'accion': 'UPDATE',
+             'tabla_afectada': 'miembros', 'detalles': f'Cambio {i}', 'ip_address': None}
+            for i in range(inicio, inicio + cantidad)]
+
+
+class GenerarPdfsLogsTest(unittest.TestCase):
+
+    def generar(self, bloques, max_filas):
+        destinos = []
+
+        def nuevo_destino():
+            destinos.append(io.BytesIO())
+            return destinos[-1]
+
+        partes = generar_pdfs_logs(bloques, nuevo_destino, 'Mayo', 'Admin', max_filas)
+        self.assertEqual(len(destinos), len(partes))
+        for destino in destinos:
+            self.assertTrue(destino.getvalue().startswith(b'%PDF'))
+        return partes
+
+    def test_ninguna_parte_supera_el_limite(self):
+        # Bloques que no coinciden con el límite ni con las páginas
+        bloques = [logs(45, 1), logs(30, 46), logs(25, 76)]
+        self.assertEqual(self.generar(bloques, 40), [40, 40, 20])
+
+    def test_exacto_no_abre_una_parte_vacia(self):
+        self.assertEqual(self.generar([logs(40), logs(40, 41)], 40), [40, 40])
+
+    def test_sin_filas_genera_un_pdf(self):
+        self.assertEqual(self.generar([], 40), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
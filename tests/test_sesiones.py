@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime, timedelta
+
+from sesiones import AlmacenSesiones, CacheSesiones
+
+
+class AlmacenEnMemoria(AlmacenSesiones):
+    """Almacén compartido, como la tabla sesiones vista desde varios workers"""
+
+    def __init__(self):
+        self.sesiones = {}
+        self.versiones = {}
+        self.lecturas = 0
+
+    def cargar(self, sid):
+        self.lecturas += 1
+        sesion = self.sesiones.get(sid)
+        if sesion is None or sesion['expira'] <= datetime.now():
+            return None
+        if sesion['usuario_id'] is not None and sesion['version'] != self.versiones.get(sesion['usuario_id']):
+            return None
+        return dict(sesion)
+
+    def guardar(self, sid, usuario_id, datos, expira, version=None):
+        if version is None and usuario_id is not None:
+            version = self.versiones.setdefault(usuario_id, 0)
+        self.sesiones[sid] = {'datos': datos, 'usuario_id': usuario_id, 'expira': expira, 'version': version}
+        return True
+
+    def version_usuario(self, usuario_id):
+        return self.versiones.get(usuario_id)
+
+    def tocar(self, sid, expira):
+        return True
+
+    def eliminar(self, sid):
+        return self.sesiones.pop(sid, None) is not None
+
+    def revocar_usuario(self, usuario_id):
+        self.versiones[usuario_id] = self.versiones.get(usuario_id, 0) + 1
+        sids = [sid for sid, sesion in self.sesiones.items() if sesion['usuario_id'] == usuario_id]
+        for sid in sids:
+            del self.sesiones[sid]
+        return len(sids)
+
+    def purgar_expiradas(self):
+        return 0
+
+
+class RevocacionEntreWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.almacen = AlmacenEnMemoria()
+        self.worker_a = CacheSesiones(self.almacen, ttl=60)
+        self.worker_b = CacheSesiones(self.almacen, ttl=60)
+        self.expira = datetime.now() + timedelta(hours=1)
+        self.almacen.guardar('s1', 7, '{}', self.expira)
+        self.almacen.guardar('anonima', None, '{}', self.expira)
+
+    def test_revocar_en_un_worker_invalida_la_cache_del_otro(self):
+        self.assertIsNotNone(self.worker_b.cargar('s1'))
+        self.assertIsNotNone(self.worker_b.cargar('s1'))
+        self.assertEqual(self.worker_b.aciertos, 1)
+
+        self.assertEqual(self.worker_a.revocar_usuario(7), 1)
+        self.assertIsNone(self.worker_b.cargar('s1'))
+        self.assertIsNone(self.worker_a.cargar('s1'))
+
+    def test_sesion_reescrita_tras_revocar_sigue_revocada(self):
+        # Una petición que empezó antes de la revocación guarda su sesión al terminar
+        sesion = self.worker_b.cargar('s1')
+        self.worker_a.revocar_usuario(7)
+        self.worker_b.guardar('s1', 7, '{"x": 1}', self.expira, sesion['version'])
+        self.assertIsNone(self.worker_b.cargar('s1'))
+        self.assertIsNone(self.worker_a.cargar('s1'))
+
+    def test_login_despues_de_revocar(self):
+        self.worker_a.revocar_usuario(7)
+        self.worker_b.guardar('s2', 7, '{}', self.expira)
+        self.assertIsNotNone(self.worker_a.cargar('s2'))
+        self.assertIsNotNone(self.worker_b.cargar('s2'))
+
+    def test_sesion_anonima_no_consulta_la_version(self):
+        self.worker_a.cargar('anonima')
+        lecturas = self.almacen.lecturas
+        self.assertIsNotNone(self.worker_a.cargar('anonima'))
+        self.assertEqual(self.almacen.lecturas, lecturas)
+        self.assertEqual(self.worker_a.aciertos, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from mysql.connector import Error
+
+
+class BarredorVencimientos:
+    """Vence en segundo plano las membresías cuyo fecha_fin ya pasó.
+
+    Un hilo ejecuta ``Database.expirar_membresias_vencidas`` cada ``intervalo``
+    segundos. Con varios workers de gunicorn cada uno tiene su barredor, pero un
+    candado de MySQL (GET_LOCK) hace que solo uno barra a la vez; los demás
+    se saltan esa vuelta.
+    """
+
+    CANDADO = 'gimnasio_barrido_vencimientos'
+
+    def __init__(self, db, intervalo=3600, lote=500):
+        self.db = db
+        self.intervalo = intervalo
+        self.lote = lote
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._atexit = False
+        self.ultima_ejecucion = None
+        self.vencidas = 0
+        self.omitidas = 0
+
+    def start(self):
+        # Se llama en cada petición: se arranca en el primer uso, ya dentro del
+        # worker, porque los hilos no sobreviven al fork
+        if self.intervalo <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='barrido-vencimientos', daemon=True)
+                self._thread.start()
+                if not self._atexit:
+                    atexit.register(self.stop)
+                    self._atexit = True
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.ejecutar()
+            self._stopping.wait(self.intervalo)
+
+    def ejecutar(self):
+        """Hace un barrido si ningún otro proceso lo está haciendo.
+
+        Devuelve cuántas membresías venció, o None si otro proceso tenía el
+        candado o hubo un error.
+        """
+        try:
+            conn = self.db.pool.acquire()
+        except Error as e:
+            print(f"Error en el barrido de vencimientos: {e}")
+            return None
+        roto = False
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (self.CANDADO,))
+            (obtenido,) = cursor.fetchone()
+            if not obtenido:
+                self.omitidas += 1
+                return None
+            try:
+                inicio = time.perf_counter()
+                vencidas = self.db.expirar_membresias_vencidas(self.lote)
+                if vencidas:
+                    self.vencidas += vencidas
+                    print(f"Barrido de vencimientos: {vencidas} membresías vencidas "
+                          f"en {time.perf_counter() - inicio:.2f}s")
+                self.ultima_ejecucion = datetime.now()
+                return vencidas
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (self.CANDADO,))
+                cursor.fetchone()
+        except Error as e:
+            print(f"Error en el barrido de vencimientos: {e}")
+            roto = not conn.is_connected()
+            return None
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Error:
+                    roto = True
+            self.db.pool.release(conn, discard=roto)
+
+    def stats(self):
+        return {
+            'intervalo': self.intervalo,
+            'activo': self._thread is not None and self._thread.is_alive(),
+            'ultima_ejecucion': self.ultima_ejecucion.isoformat(timespec='seconds') if self.ultima_ejecucion else None,
+            'vencidas': self.vencidas,
+            'omitidas': self.omitidas,
+        }